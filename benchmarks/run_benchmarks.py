@@ -0,0 +1,242 @@
+"""
+Offline benchmarks for the portfolio hot paths.
+
+Builds synthetic portfolios (with price history) in a temporary SQLite
+database and times the core operations. Runs headless and without network:
+any HTTP request made during a run raises.
+
+    python benchmarks/run_benchmarks.py                        # 1k, 10k and 100k items
+    python benchmarks/run_benchmarks.py --sizes 1000 --save    # record a run in the history
+    python benchmarks/run_benchmarks.py --check                # exit 1 on a regression
+
+Results are appended to benchmarks/results.jsonl (one JSON object per run).
+--check compares every timing with the best of the last runs recorded on the
+same machine and fails when it is more than --threshold times slower.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import requests
+import core
+
+RESULTS_FILE = os.path.join(REPO_ROOT, "benchmarks", "results.jsonl")
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+HISTORY_DAYS = 30
+# Price history is capped at this many rows per portfolio (days shrink for big portfolios)
+MAX_HISTORY_ROWS = 3_000_000
+# Runs compared against in --check, and timings too small to judge (seconds)
+BASELINE_RUNS = 5
+NOISE_FLOOR = 0.005
+
+PARSE_SAMPLES = ["$1,234.56", "12,34€", "0.03 USD", "1 234,56 pуб.", "$0.99", "", "abc", "€7,5"]
+PARSE_CALLS = 100_000
+ADD_CALLS = 200
+
+
+def _no_network(*args, **kwargs):
+    raise RuntimeError("Benchmarks must not touch the network")
+
+requests.Session.request = _no_network
+
+
+# --------------- Synthetic data ---------------
+def synthetic_rows(count, seed=42):
+    """(market_name, display_name, qty, buy_price, current_price, price_updated_at) rows."""
+    rng = random.Random(seed)
+    now = int(time.time())
+    wears = ("Factory New", "Minimal Wear", "Field-Tested", "Well-Worn", "Battle-Scarred")
+    rows = []
+    for i in range(count):
+        name = f"Synthetic Item {i:06d} ({wears[i % len(wears)]})"
+        buy = round(rng.uniform(0.03, 500.0), 2)
+        rows.append((name, name, rng.randint(1, 50), buy, round(buy * rng.uniform(0.5, 1.5), 2),
+                     now - rng.randint(0, 7200)))
+    return rows
+
+def build_database(path, count, history_days, seed=42):
+    """Creates a portfolio of `count` items with up to `history_days` daily prices each."""
+    core.DB = path
+    core.init_db()
+    rows = synthetic_rows(count, seed)
+    days = max(1, min(history_days, MAX_HISTORY_ROWS // max(count, 1)))
+    rng = random.Random(seed + 1)
+    start = (int(time.time()) // 86400 - days) * 86400
+
+    def history():
+        for name, _, _, _, price, _ in rows:
+            p = price
+            for d in range(days):
+                p = max(0.03, p * (1.0 + rng.gauss(0.0, 0.03)))
+                yield (name, start + d * 86400 + 43200, round(p, 2))
+
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany("""
+            INSERT INTO items (market_name, display_name, qty, buy_price, current_price, price_updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+        conn.executemany("INSERT INTO price_history (market_name, ts, price) VALUES (?, ?, ?)", history())
+    conn.close()
+    core.portfolio.load()
+    core.alert_engine.load()
+    return len(rows) * days
+
+
+# --------------- Timing ---------------
+def best_of(repeat, fn, setup=None):
+    """Best wall time of `repeat` runs of fn(); setup() runs untimed before each one."""
+    best = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def bench_parse(repeat):
+    samples = (PARSE_SAMPLES * (PARSE_CALLS // len(PARSE_SAMPLES) + 1))[:PARSE_CALLS]
+    return best_of(repeat, lambda: [core.parse_price_str(s) for s in samples])
+
+def bench_portfolio(count, history_days, repeat, workdir):
+    """Times every operation on one synthetic portfolio. Returns {operation: seconds}."""
+    db_path = os.path.join(workdir, f"bench_{count}.db")
+    t0 = time.perf_counter()
+    history_rows = build_database(db_path, count, history_days)
+    print(f"  built {count} items / {history_rows} history rows in {time.perf_counter() - t0:.1f}s")
+
+    results = {}
+    results["get_items"] = best_of(repeat, core.get_items)
+    results["portfolio_load"] = best_of(repeat, core.portfolio.load)
+
+    # Table refresh: totals plus one formatted page per sortable column, first and last page
+    def table_refresh():
+        now = time.time()
+        item_count, _, _ = core.portfolio.totals()
+        last_offset = max(0, (item_count - 1) // core.PAGE_SIZE * core.PAGE_SIZE)
+        for column in core.SORT_COLUMNS.values():
+            for offset in (0, last_offset):
+                core.table_rows(core.get_page_positions(column, True, core.PAGE_SIZE, offset), now)
+    results["table_refresh"] = best_of(repeat, table_refresh)
+
+    # Half the calls merge into existing items, half add new ones
+    rng = random.Random(7)
+    existing = [pos.market_name for pos in core.portfolio.positions()]
+    def add_items():
+        for i in range(ADD_CALLS):
+            name = rng.choice(existing) if i % 2 else f"Benchmark New Item {rng.random():.12f}"
+            core.add_or_update_item(name, name, 1, 1.0, 2.0)
+    results[f"add_or_update_item x{ADD_CALLS}"] = best_of(repeat, add_items)
+
+    csv_path = os.path.join(workdir, f"export_{count}.csv")
+    html_path = os.path.join(workdir, f"export_{count}.html")
+    results["export_csv"] = best_of(repeat, lambda: core.export_csv(csv_path))
+    results["export_html"] = best_of(repeat, lambda: core.export_html(html_path))
+    results["risk_report"] = best_of(repeat, core.get_risk_report)
+
+    # CSV import into an empty database (all inserts)
+    import_db = os.path.join(workdir, f"import_{count}.db")
+    def fresh_import_db():
+        if os.path.exists(import_db):
+            os.remove(import_db)
+        core.DB = import_db
+        core.init_db()
+    results["import_items_from_csv"] = best_of(repeat, lambda: core.import_items_from_csv(csv_path), fresh_import_db)
+    core.DB = db_path
+    return results
+
+
+# --------------- History & regression check ---------------
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def baselines(history, machine, runs=BASELINE_RUNS):
+    """Best timing per (size, operation) over the last `runs` runs on this machine."""
+    best = {}
+    for run in [r for r in history if r.get("machine") == machine][-runs:]:
+        for size, ops in run["results"].items():
+            for op, seconds in ops.items():
+                key = (size, op)
+                best[key] = min(best.get(key, seconds), seconds)
+    return best
+
+def report(results, baseline, threshold):
+    """Prints the timings next to their baseline. Returns the regressions found."""
+    regressions = []
+    print(f"\n{'size':>8}  {'operation':<28}{'seconds':>10}{'baseline':>10}{'ratio':>8}")
+    for size, ops in results.items():
+        for op, seconds in ops.items():
+            base = baseline.get((size, op))
+            ratio = seconds / base if base else None
+            flag = ""
+            if ratio and ratio > threshold and seconds - base > NOISE_FLOOR:
+                regressions.append((size, op, seconds, base))
+                flag = "  << REGRESSION"
+            print(f"{size:>8}  {op:<28}{seconds:>10.4f}{base if base is not None else float('nan'):>10.4f}"
+                  f"{ratio if ratio else float('nan'):>8.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the portfolio hot paths.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated portfolio sizes (default: %(default)s)")
+    parser.add_argument("--days", type=int, default=HISTORY_DAYS, help="days of price history per item")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per operation, the best one counts")
+    parser.add_argument("--results", default=RESULTS_FILE, help="JSON-lines file with earlier runs")
+    parser.add_argument("--save", action="store_true", help="append this run to the results file")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 when an operation regressed")
+    parser.add_argument("--threshold", type=float, default=1.3,
+                        help="slowdown factor counted as a regression (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    results = {"-": {f"parse_price_str x{PARSE_CALLS // 1000}k": bench_parse(args.repeat)}}
+    with tempfile.TemporaryDirectory(prefix="portfolio-bench-") as workdir:
+        for count in sizes:
+            print(f"Portfolio of {count} items:")
+            results[str(count)] = bench_portfolio(count, args.days, args.repeat, workdir)
+
+    machine = platform.node()
+    history = load_history(args.results)
+    regressions = report(results, baselines(history, machine), args.threshold)
+
+    if args.save:
+        run = {"ts": int(time.time()), "commit": git_commit(), "machine": machine,
+               "python": platform.python_version(), "sqlite": sqlite3.sqlite_version, "results": results}
+        os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+        with open(args.results, "a", encoding="utf-8") as f:
+            f.write(json.dumps(run) + "\n")
+        print(f"\nSaved to {args.results}")
+
+    if regressions:
+        print(f"\n{len(regressions)} operation(s) slower than {args.threshold}x their baseline")
+        if args.check:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
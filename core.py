@@ -0,0 +1,2631 @@
+"""
+Portfolio storage, Steam pricing and background updates, without any GUI.
+
+main.py builds the Tkinter app on top of this module; scripts (benchmarks,
+the HTTP API) import it directly and never need a display.
+"""
+import sqlite3
+import requests
+import re
+import csv
+import json
+import time
+import threading
+import queue
+import atexit
+import itertools
+import bisect
+import statistics
+import urllib.parse
+import math
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+import os 
+from datetime import datetime
+import numpy as np
+import risk
+
+# --- OPTIONAL: PARQUET SUPPORT ---
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # Parquet import/export is disabled without pyarrow
+    pa = None
+    pq = None
+
+# Colours of the HTML report (the same neon theme as the GUI palette in main.py)
+REPORT_COLORS = {
+    "bg": "#0F1626",
+    "text": "#E0E0E0",
+    "dim": "#808080",
+    "accent": "#00FFFF",
+    "accent2": "#FF00FF",
+    "border": "#8A2BE2",
+    "cell_border": "#2C3E50",
+    "heading_bg": "#141E46",
+    "row_bg": "#053B50",
+    "good": "#00FFFF",
+    "bad": "#FF3333",
+}
+
+DB = "portfolio.db"
+STEAM_APP = 730 # CS2 / CSGO app id
+STEAM_CURRENCY = 1 # 1 = USD
+# Prices are fetched and stored in this currency; every other currency is converted for display
+BASE_CURRENCY = "USD"
+# Safe delay to prevent Steam blocking
+STEAM_API_DELAY = 3.0 
+STEAM_BASE_URL = "https://steamcommunity.com"
+# Optional list of egress routes (proxies / mirrors), each with its own delay.
+# Without the file all traffic goes directly to STEAM_BASE_URL.
+EGRESS_CONFIG_FILE = "egress_routes.json"
+# A route answering 429/5xx rests ROUTE_COOLDOWN_SECONDS (doubling per repeat)
+# and is taken out of the pool after ROUTE_MAX_FAILURES failures in a row. A
+# route out of the pool gets one probe request every ROUTE_PROBE_SECONDS and
+# rejoins when it succeeds. The last route in the pool is never taken out.
+ROUTE_COOLDOWN_SECONDS = 60
+ROUTE_MAX_FAILURES = 5
+ROUTE_PROBE_SECONDS = 15 * 60
+# Routes tried per price request before giving up
+ROUTE_ATTEMPTS = 2
+# The manual Fetch waits at most this long for a free route, then reports when to try again
+FETCH_MAX_WAIT = 5.0
+# Optional price source config (see load_price_sources); without it Steam priceoverview is the only source
+PRICE_SOURCES_FILE = "price_sources.json"
+# Default per-source quote cache (seconds, at most PRICE_CACHE_MAX_ENTRIES items per source)
+# and how long one item waits for all sources
+PRICE_CACHE_TTL = 60
+PRICE_CACHE_MAX_ENTRIES = 10_000
+PRICE_SOURCE_TIMEOUT = 60
+# Prices older than this are refreshed in the background
+STALE_AFTER_SECONDS = 30 * 60
+# After a failed background fetch (delisted item, no price) the item is left out of the
+# stale refresh for PRICE_RETRY_BASE_SECONDS, doubling per failure in a row up to PRICE_RETRY_MAX_SECONDS
+PRICE_RETRY_BASE_SECONDS = 5 * 60
+PRICE_RETRY_MAX_SECONDS = 24 * 3600
+# How often the GUI looks for stale prices / collects background results (ms)
+STALE_CHECK_MS = 60_000
+UPDATER_POLL_MS = 500
+
+# Table paging
+PAGE_SIZE = 100
+# Rows per batch when streaming Parquet files in and out
+PARQUET_CHUNK_ROWS = 50_000
+
+# Valuation rollups: bucket size in seconds per resolution
+ROLLUP_RESOLUTIONS = {"hour": 3600, "day": 86400, "week": 7 * 86400}
+# Rollup scope used for the whole portfolio (items use their market_name)
+PORTFOLIO_SCOPE = "__portfolio__"
+# Long-range charts pick the finest resolution that stays under this many points
+MAX_CHART_POINTS = 500
+# Rollup rows older than this (seconds) are deleted; None = kept forever. Every sample is
+# folded into all resolutions, so dropped hourly rows are still covered by the daily ones.
+ROLLUP_RETENTION = {"hour": 60 * 86400, "day": 3 * 365 * 86400, "week": None}
+# Snapshots are taken when an Update All run finishes or the update queue drains (at most
+# once per SNAPSHOT_MIN_INTERVAL), and every SNAPSHOT_MAX_INTERVAL while the queue stays busy
+SNAPSHOT_MIN_INTERVAL = 60
+SNAPSHOT_MAX_INTERVAL = 3600
+
+# Fired price alerts are appended here as JSON lines (for scripts / local webhooks)
+ALERT_LOG_FILE = "alerts.jsonl"
+# How long an alert notification stays on screen (ms)
+ALERT_TOAST_MS = 8000
+
+# Display currencies (code -> symbol). Rates against BASE_CURRENCY come from one
+# request to FX_RATES_URL, or from FX_RATES_FILE ({"EUR": 0.92, ...}) when it exists
+CURRENCY_SYMBOLS = {"USD": "$", "EUR": "€", "GBP": "£", "RUB": "₽", "UAH": "₴", "KZT": "₸",
+                    "PLN": "zł", "CNY": "¥", "BRL": "R$", "TRY": "₺"}
+FX_RATES_URL = "https://open.er-api.com/v6/latest/USD"
+FX_RATES_FILE = "fx_rates.json"
+FX_TTL_SECONDS = 12 * 3600
+# After a failed rate refresh, cached rates are used for this long before trying again
+FX_RETRY_SECONDS = 300
+
+# Fetched prices are written to the DB in batches of this many, or at least this often (ms)
+PRICE_WRITE_BATCH = 200
+PRICE_WRITE_INTERVAL_MS = 1000
+
+# Update All runs: failed items are retried this many times before they are marked failed
+JOB_MAX_ATTEMPTS = 3
+# How often the GUI checks for scheduled (repeating) runs that are due (ms)
+JOB_CHECK_MS = 30_000
+# Repeat choices for Update All (label -> seconds, None = run once)
+JOB_REPEAT_CHOICES = {"Once": None, "Every 1h": 3600, "Every 6h": 6 * 3600, "Every 24h": 24 * 3600}
+
+# --------------- DB -----------------
+GENERATED_COLUMNS = {
+    "total_buy": "COALESCE(qty, 0) * COALESCE(buy_price, 0)",
+    "total_value": "COALESCE(qty, 0) * COALESCE(current_price, 0)",
+    "profit": "COALESCE(qty, 0) * (COALESCE(current_price, 0) - COALESCE(buy_price, 0))",
+}
+
+# Whitelist of columns the table may be sorted by (heading -> SQL column)
+SORT_COLUMNS = {
+    "ID": "id",
+    "Name": "market_name",
+    "Qty": "qty",
+    "BuyPrice": "buy_price",
+    "SteamPrice": "current_price",
+    "TotalBuy": "total_buy",
+    "TotalSteam": "total_value",
+    "ProfitSteam": "profit",
+}
+
+def init_db():
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        market_name TEXT UNIQUE,
+        display_name TEXT,
+        qty INTEGER,
+        buy_price REAL,
+        current_price REAL
+    )
+    """)
+
+    # One row per fetched price, keyed by market_name so history survives re-adding an item
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS price_history (
+        market_name TEXT NOT NULL,
+        ts INTEGER NOT NULL,
+        price REAL NOT NULL,
+        PRIMARY KEY (market_name, ts)
+    ) WITHOUT ROWID
+    """)
+
+    # Portfolio value after each update cycle
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS portfolio_snapshots (
+        ts INTEGER PRIMARY KEY,
+        item_count INTEGER,
+        total_buy REAL,
+        total_value REAL
+    )
+    """)
+
+    # Pre-aggregated OHLC per scope (item market_name or PORTFOLIO_SCOPE) and resolution
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS ohlc_rollups (
+        scope TEXT NOT NULL,
+        resolution TEXT NOT NULL,
+        bucket_start INTEGER NOT NULL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        open_ts INTEGER,
+        close_ts INTEGER,
+        samples INTEGER,
+        PRIMARY KEY (scope, resolution, bucket_start)
+    ) WITHOUT ROWID
+    """)
+    # Retention pruning deletes by age across all scopes
+    c.execute("CREATE INDEX IF NOT EXISTS idx_ohlc_rollups_age ON ohlc_rollups(resolution, bucket_start)")
+
+    # Time of the last successful price fetch (NULL = never fetched / imported)
+    existing = {row[1] for row in c.execute("PRAGMA table_xinfo(items)")}
+    if "price_updated_at" not in existing:
+        c.execute("ALTER TABLE items ADD COLUMN price_updated_at INTEGER")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_items_price_updated_at ON items(price_updated_at)")
+    # Failed background fetches in a row and when the stale refresh may try the item again
+    if "price_failures" not in existing:
+        c.execute("ALTER TABLE items ADD COLUMN price_failures INTEGER NOT NULL DEFAULT 0")
+    if "price_retry_at" not in existing:
+        c.execute("ALTER TABLE items ADD COLUMN price_retry_at INTEGER")
+
+    # User-defined price alerts (kind: above / below / move_pct / profit)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS alerts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        market_name TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        threshold REAL NOT NULL,
+        ref_price REAL,
+        active INTEGER NOT NULL DEFAULT 1,
+        created_at INTEGER,
+        fired_at INTEGER,
+        fired_price REAL
+    )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_alerts_active ON alerts(active, market_name)")
+    # Alerts left behind by items deleted before delete_items removed them too
+    c.execute("DELETE FROM alerts WHERE market_name NOT IN (SELECT market_name FROM items)")
+
+    # Update All runs, checkpointed per item so an interrupted run can resume
+    # (job status: running / done; repeat_interval in seconds, NULL = run once)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS update_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        status TEXT NOT NULL DEFAULT 'running',
+        created_at INTEGER,
+        finished_at INTEGER,
+        repeat_interval INTEGER,
+        next_run_at INTEGER
+    )
+    """)
+    # Item status: pending / done / retry / failed
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS update_job_items (
+        job_id INTEGER NOT NULL,
+        item_id INTEGER NOT NULL,
+        market_name TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        updated_at INTEGER,
+        PRIMARY KEY (job_id, item_id)
+    ) WITHOUT ROWID
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_update_job_items_status ON update_job_items(job_id, status)")
+
+    # Exchange rates: units of `currency` per 1 BASE_CURRENCY
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS fx_rates (
+        currency TEXT PRIMARY KEY,
+        rate REAL NOT NULL,
+        fetched_at INTEGER NOT NULL,
+        source TEXT
+    )
+    """)
+
+    # Computed columns for sorting (added to old databases as well).
+    # VIRTUAL columns cost no storage and can still be indexed.
+    existing = {row[1] for row in c.execute("PRAGMA table_xinfo(items)")}
+    for col_name, expr in GENERATED_COLUMNS.items():
+        if col_name not in existing:
+            c.execute(f"ALTER TABLE items ADD COLUMN {col_name} REAL GENERATED ALWAYS AS ({expr}) VIRTUAL")
+
+    # One index per sortable column, so ORDER BY ... LIMIT reads the index
+    # instead of sorting the whole table
+    for col_name in ("qty", "buy_price", "current_price", "total_buy", "total_value", "profit"):
+        c.execute(f"CREATE INDEX IF NOT EXISTS idx_items_{col_name} ON items({col_name})")
+
+    conn.commit()
+    conn.close()
+
+def add_or_update_item(market_name, display_name, new_qty, new_buy_price, current_price): 
+    """
+    Adds a new item or updates an existing one, ADDING the new quantity 
+    and CALCULATING the new average buy price.
+    """
+    # current_price comes from a fresh fetch; 0.0 means the fetch failed
+    price_updated_at = int(time.time()) if current_price and current_price > 0 else None
+
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    
+    # 1. Check for existence and get old data
+    c.execute("SELECT qty, buy_price FROM items WHERE market_name=?", (market_name,))
+    r = c.fetchone()
+    
+    if r:
+        # Item exists - Calculate new average price and total quantity
+        old_qty, old_buy_price = r
+        
+        # Ensure values are float/int for calculation (DB stores them as such, but good practice)
+        old_qty = old_qty or 0
+        old_buy_price = old_buy_price or 0.0
+        
+        # Total cost of old items
+        old_total_cost = old_qty * old_buy_price
+        
+        # Total cost of new items (the ones just bought)
+        new_total_cost = new_qty * new_buy_price
+        
+        # Calculate new totals
+        total_qty = old_qty + new_qty
+        total_cost = old_total_cost + new_total_cost
+        
+        # Calculate new average buy price
+        if total_qty > 0:
+            avg_buy_price = round(total_cost / total_qty, 6)
+        else:
+            # Should not happen if new_qty > 0, but safety first
+            avg_buy_price = 0.0 
+
+        # Update
+        c.execute("""
+            UPDATE items 
+            SET display_name=?, qty=?, buy_price=?, current_price=?, price_updated_at=? 
+            WHERE market_name=?
+        """, (display_name, total_qty, avg_buy_price, current_price, price_updated_at, market_name))
+        
+        message = f"Item updated! Total QTY: {total_qty}, Avg Buy Price: {avg_buy_price:.2f}"
+    else:
+        # Item does not exist - Insert
+        c.execute("""
+            INSERT INTO items (market_name, display_name, qty, buy_price, current_price, price_updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (market_name, display_name, new_qty, new_buy_price, current_price, price_updated_at))
+        
+        message = "New item added to portfolio."
+
+    add_price_history(c, market_name, current_price)
+        
+    conn.commit()
+    conn.close()
+    portfolio.reload_names([market_name])
+
+    # Profit targets depend on qty/buy price, then the new price is checked
+    alert_engine.reindex_item(market_name)
+    if price_updated_at:
+        alert_engine.check(market_name, current_price)
+    return message
+
+def add_price_history(c, market_name, price, ts=None):
+    """Appends a price sample using an open cursor. Failed fetches (0.0) are not recorded."""
+    if not price or price <= 0:
+        return
+    if ts is None:
+        ts = int(time.time())
+    c.execute("INSERT OR REPLACE INTO price_history (market_name, ts, price) VALUES (?, ?, ?)",
+              (market_name, ts, price))
+
+ITEM_COLUMNS = "id, market_name, display_name, qty, buy_price, current_price, price_updated_at"
+
+def get_items():
+    """Full table read; the GUI uses the in-memory `portfolio` model instead."""
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    c.execute(f"SELECT {ITEM_COLUMNS} FROM items")
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+def get_page_ids(order_by="id", descending=False, limit=PAGE_SIZE, offset=0):
+    """
+    Returns the item ids of one table page, sorted in SQLite. order_by must be
+    one of the SORT_COLUMNS values; id is used as a tie-breaker in the same
+    direction so the whole ORDER BY (and the id itself) comes from the column index.
+    """
+    if order_by not in SORT_COLUMNS.values():
+        raise ValueError(f"Unsupported sort column: {order_by}")
+    direction = "DESC" if descending else "ASC"
+
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    c.execute(f"""
+        SELECT id FROM items
+        ORDER BY {order_by} {direction}, id {direction}
+        LIMIT ? OFFSET ?
+    """, (limit, offset))
+    ids = [row[0] for row in c.fetchall()]
+    conn.close()
+    return ids
+
+def get_stale_items(max_age=STALE_AFTER_SECONDS):
+    """
+    Returns [(id, market_name), ...] for items whose price is older than max_age
+    seconds (or was never fetched). Never-fetched items come first, the rest are
+    grouped by how many max_age periods old they are (oldest group first) and
+    each group runs from the most valuable position down. Items still backing
+    off after failed fetches (price_retry_at in the future) are left out.
+    """
+    now = int(time.time())
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    c.execute("""
+        SELECT id, market_name FROM items
+        WHERE (price_updated_at IS NULL OR price_updated_at < ?)
+          AND (price_retry_at IS NULL OR price_retry_at <= ?)
+        ORDER BY price_updated_at IS NOT NULL, (? - price_updated_at) / ? DESC, total_value DESC
+    """, (now - max_age, now, now, max(1, int(max_age))))
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+def delete_items(item_ids):
+    """Deletes several items and their alerts in one transaction."""
+    item_ids = list(item_ids)
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    c.execute("DELETE FROM items WHERE id IN (SELECT value FROM json_each(?)) RETURNING market_name",
+              (json.dumps(item_ids),))
+    names = [name for (name,) in c.fetchall()]
+    c.execute("DELETE FROM alerts WHERE market_name IN (SELECT value FROM json_each(?))", (json.dumps(names),))
+    conn.commit()
+    conn.close()
+    for item_id in item_ids:
+        portfolio.remove(item_id)
+    for name in names:
+        alert_engine.reindex_item(name)
+
+def bulk_edit_items(item_ids, qty=None, buy_price=None):
+    """
+    Sets qty and/or buy_price (None = leave unchanged) on several items in one
+    transaction and re-indexes their alerts (profit targets depend on both).
+    Returns the number of rows changed.
+    """
+    item_ids = list(item_ids)
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    c.execute("""
+        UPDATE items SET qty=COALESCE(?, qty), buy_price=COALESCE(?, buy_price)
+        WHERE id IN (SELECT value FROM json_each(?))
+        RETURNING market_name
+    """, (qty, buy_price, json.dumps(item_ids)))
+    names = [name for (name,) in c.fetchall()]
+    c.execute("SELECT DISTINCT market_name FROM alerts WHERE active=1 AND market_name IN (SELECT value FROM json_each(?))",
+              (json.dumps(names),))
+    alerted = [name for (name,) in c.fetchall()]
+    conn.commit()
+    conn.close()
+    portfolio.reload_ids(item_ids)
+    for name in alerted:
+        alert_engine.reindex_item(name)
+    return len(names)
+
+def sync_imported_items(market_names):
+    """Re-reads imported items into `portfolio` and re-indexes their alerts (profit targets)."""
+    market_names = list(market_names)
+    portfolio.reload_names(market_names)
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    c.execute("SELECT DISTINCT market_name FROM alerts WHERE active=1 AND market_name IN (SELECT value FROM json_each(?))",
+              (json.dumps(market_names),))
+    alerted = [name for (name,) in c.fetchall()]
+    conn.close()
+    for name in alerted:
+        alert_engine.reindex_item(name)
+
+def import_items_from_csv(file_path):
+    """
+    Imports items from a CSV file. 
+    Expects CSV with columns: market_name, display_name, qty, buy_price, current_price
+    NOTE: CSV Import logic is simplified; it OVERWRITES qty and buy_price 
+    if the item exists, based on the CSV data.
+    Read errors (missing file, bad encoding) propagate and nothing is committed.
+    """
+    imported_count = 0
+    updated_count = 0
+    names = set()
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+
+    try:
+        with open(file_path, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None) # Skip header
+
+            # Indices corresponding to export order
+            COL_MARKET_NAME = 0
+            COL_DISPLAY_NAME = 1
+            COL_QTY = 2
+            COL_BUY_PRICE = 3
+            COL_CURRENT_PRICE = 4
+            
+            for i, row in enumerate(reader):
+                if len(row) < 5:
+                    log_message(f"Skipping row {i+2}: not enough columns", "WARNING")
+                    continue
+                
+                # Parsing and cleaning data
+                market_name = row[COL_MARKET_NAME].strip()
+                display_name = row[COL_DISPLAY_NAME].strip()
+                
+                try:
+                    qty = int(row[COL_QTY].strip())
+                    buy_price = parse_price_str(row[COL_BUY_PRICE])
+                    current_price = parse_price_str(row[COL_CURRENT_PRICE])
+                except ValueError as e:
+                    log_message(f"Skipping row {i+2} ({market_name}): invalid number format - {e}", "ERROR")
+                    continue
+                
+                if not market_name:
+                    log_message(f"Skipping row {i+2}: empty market_name", "WARNING")
+                    continue
+
+                # Check for existence and update/insert
+                c.execute("SELECT id FROM items WHERE market_name=?", (market_name,))
+                if c.fetchone():
+                    # Update (Overwrite, as CSV typically contains the desired final state)
+                    c.execute("""
+                        UPDATE items SET display_name=?, qty=?, buy_price=?, current_price=? WHERE market_name=?
+                    """, (display_name, qty, buy_price, current_price, market_name))
+                    updated_count += 1
+                else:
+                    # Insert
+                    c.execute("""
+                        INSERT INTO items (market_name, display_name, qty, buy_price, current_price)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, (market_name, display_name, qty, buy_price, current_price))
+                    imported_count += 1
+                names.add(market_name)
+
+        conn.commit()
+    finally:
+        conn.close()
+    sync_imported_items(names)
+    return imported_count, updated_count
+
+def read_steam_inventory(file_path):
+    """
+    Reads a saved Steam inventory JSON (the /inventory/<steamid>/730/2 response
+    with "assets" + "descriptions", or the older "rgInventory" + "rgDescriptions").
+    Returns (quantities, display_names, skipped) where quantities counts marketable
+    assets of STEAM_APP per market_hash_name and skipped counts everything else.
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    if "assets" in data:
+        assets = data.get("assets") or []
+        descriptions = data.get("descriptions") or []
+    else:
+        assets = list((data.get("rgInventory") or {}).values())
+        descriptions = list((data.get("rgDescriptions") or {}).values())
+
+    by_class = {(str(d.get("classid")), str(d.get("instanceid", "0"))): d for d in descriptions}
+
+    quantities = Counter()
+    display_names = {}
+    skipped = 0
+    for asset in assets:
+        amount = int(asset.get("amount", 1) or 1)
+        desc = by_class.get((str(asset.get("classid")), str(asset.get("instanceid", "0"))))
+        if (not desc or not desc.get("marketable") or not desc.get("market_hash_name")
+                or int(desc.get("appid", STEAM_APP)) != STEAM_APP):
+            skipped += amount
+            continue
+        name = desc["market_hash_name"]
+        quantities[name] += amount
+        display_names.setdefault(name, desc.get("name") or name)
+    return quantities, display_names, skipped
+
+def import_steam_inventory(file_path):
+    """
+    Imports a saved Steam inventory. Quantities are SET to the inventory count
+    (one transaction); new items start with buy price 0.0 and no price until
+    the background updater fetches one. Returns (imported, updated, skipped, names).
+    """
+    quantities, display_names, skipped = read_steam_inventory(file_path)
+    rows = [(name, display_names[name], qty) for name, qty in quantities.items()]
+
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    count_before = c.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+    c.executemany("""
+        INSERT INTO items (market_name, display_name, qty, buy_price, current_price)
+        VALUES (?, ?, ?, 0.0, 0.0)
+        ON CONFLICT(market_name) DO UPDATE SET qty=excluded.qty
+    """, rows)
+    count_after = c.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+    conn.commit()
+    conn.close()
+    sync_imported_items(quantities)
+
+    imported = count_after - count_before
+    return imported, len(rows) - imported, skipped, list(quantities)
+
+def queue_unpriced(market_names):
+    """
+    Hands each name whose cached price is missing or stale to the background
+    updater once (an inventory lists every copy of an item). Returns how many were queued.
+    """
+    cutoff = time.time() - STALE_AFTER_SECONDS
+    to_price = [
+        (pos.id, pos.market_name)
+        for pos in map(portfolio.get_by_name, dict.fromkeys(market_names))
+        if pos and (pos.price_updated_at is None or pos.price_updated_at < cutoff)
+    ]
+    return price_updater.enqueue(to_price, PRIORITY_STALE)
+
+
+# --------------- In-memory portfolio model ---------------
+
+class Position:
+    """One portfolio row. __slots__ keeps large portfolios compact in memory."""
+    __slots__ = ("id", "market_name", "display_name", "qty", "buy_price", "current_price", "price_updated_at")
+
+    def __init__(self, id, market_name, display_name, qty, buy_price, current_price, price_updated_at):
+        self.id = id
+        self.market_name = market_name
+        self.display_name = display_name
+        self.qty = qty or 0
+        self.buy_price = buy_price or 0.0
+        self.current_price = current_price or 0.0
+        self.price_updated_at = price_updated_at
+
+    @property
+    def total_buy(self):
+        return self.buy_price * self.qty
+
+    @property
+    def total_value(self):
+        return self.current_price * self.qty
+
+    @property
+    def profit(self):
+        return self.total_value - self.total_buy
+
+def _micros(amount):
+    """Money as integer millionths, so running totals add and subtract exactly."""
+    return round(amount * 1_000_000)
+
+class PortfolioModel:
+    """
+    The items table loaded once and kept in sync by the DB write functions.
+    Table, totals, charts and exports read from here instead of re-querying.
+    Running totals are kept in integer millionths (exact, so no float drift
+    however many updates land) and positions in a list kept in id order, so
+    neither totals() nor positions() needs a scan or a sort.
+    `version` goes up with every change, so readers can cache what they derive.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._by_id = {}
+        self._id_by_name = {}
+        self._ids = []       # sorted item ids
+        self._positions = [] # Position per id in self._ids
+        self._buy_micros = 0
+        self._value_micros = 0
+        self.version = 0
+
+    @property
+    def total_buy(self):
+        return self._buy_micros / 1_000_000
+
+    @property
+    def total_value(self):
+        return self._value_micros / 1_000_000
+
+    def load(self):
+        """Full (re)load, used at startup and after bulk imports."""
+        rows = get_items()
+        with self._lock:
+            positions = sorted((Position(*row) for row in rows), key=lambda p: p.id)
+            self._positions = positions
+            self._ids = [p.id for p in positions]
+            self._by_id = {p.id: p for p in positions}
+            self._id_by_name = {p.market_name: p.id for p in positions}
+            self._buy_micros = sum(_micros(p.total_buy) for p in positions)
+            self._value_micros = sum(_micros(p.total_value) for p in positions)
+            self.version += 1
+
+    def reload_names(self, market_names):
+        """Re-reads the given items from the DB (after inserts or position edits)."""
+        self._reload("market_name", list(market_names))
+
+    def reload_ids(self, item_ids):
+        self._reload("id", list(item_ids))
+
+    def _reload(self, column, keys):
+        conn = sqlite3.connect(DB)
+        c = conn.cursor()
+        rows = []
+        for i in range(0, len(keys), 500): # stay under SQLite's variable limit
+            chunk = keys[i:i + 500]
+            c.execute(f"SELECT {ITEM_COLUMNS} FROM items WHERE {column} IN ({','.join('?' * len(chunk))})", chunk)
+            rows.extend(c.fetchall())
+        conn.close()
+        with self._lock:
+            for row in rows:
+                self._put(Position(*row))
+
+    def _put(self, pos):
+        old = self._by_id.get(pos.id)
+        i = bisect.bisect_left(self._ids, pos.id)
+        if old is not None:
+            self._buy_micros -= _micros(old.total_buy)
+            self._value_micros -= _micros(old.total_value)
+            if old.market_name != pos.market_name:
+                self._id_by_name.pop(old.market_name, None)
+            self._positions[i] = pos
+        else:
+            self._ids.insert(i, pos.id)
+            self._positions.insert(i, pos)
+        self._by_id[pos.id] = pos
+        self._id_by_name[pos.market_name] = pos.id
+        self._buy_micros += _micros(pos.total_buy)
+        self._value_micros += _micros(pos.total_value)
+        self.version += 1
+
+    def set_price(self, item_id, price, display_name, updated_at=None):
+        with self._lock:
+            pos = self._by_id.get(item_id)
+            if pos is None:
+                return
+            self._value_micros -= _micros(pos.total_value)
+            pos.current_price = price or 0.0
+            pos.display_name = display_name
+            if updated_at is not None:
+                pos.price_updated_at = updated_at
+            self._value_micros += _micros(pos.total_value)
+            self.version += 1
+
+    def remove(self, item_id):
+        with self._lock:
+            pos = self._by_id.pop(item_id, None)
+            if pos is not None:
+                i = bisect.bisect_left(self._ids, item_id)
+                del self._ids[i]
+                del self._positions[i]
+                self._id_by_name.pop(pos.market_name, None)
+                self._buy_micros -= _micros(pos.total_buy)
+                self._value_micros -= _micros(pos.total_value)
+                self.version += 1
+
+    def get(self, item_id):
+        with self._lock:
+            return self._by_id.get(item_id)
+
+    def get_by_name(self, market_name):
+        with self._lock:
+            item_id = self._id_by_name.get(market_name)
+            return self._by_id.get(item_id) if item_id is not None else None
+
+    def positions(self):
+        """All positions in id order (a list copy, safe to iterate while updates land)."""
+        with self._lock:
+            return list(self._positions)
+
+    def totals(self):
+        """(item_count, total_buy, total_value) from the running sums."""
+        with self._lock:
+            return len(self._by_id), self.total_buy, self.total_value
+
+portfolio = PortfolioModel()
+
+
+# --------------- Valuation snapshots & OHLC rollups ---------------
+
+def bucket_start(ts, resolution):
+    """Start of the UTC bucket containing ts. Weeks start on Monday."""
+    size = ROLLUP_RESOLUTIONS[resolution]
+    if resolution == "week":
+        monday = 4 * 86400 # 1970-01-05 was a Monday
+        return (ts - monday) // size * size + monday
+    return ts // size * size
+
+def _add_rollup_samples(c, samples, ts):
+    """Folds (scope, value) samples taken at ts into every rollup resolution."""
+    rows = [
+        (scope, resolution, bucket_start(ts, resolution), value, value, value, value, ts, ts)
+        for resolution in ROLLUP_RESOLUTIONS
+        for scope, value in samples
+    ]
+    # Existing values on the right-hand side are the pre-update ones, so a late
+    # sample only replaces open/close when it is really the earliest/latest.
+    c.executemany("""
+        INSERT INTO ohlc_rollups (scope, resolution, bucket_start, open, high, low, close, open_ts, close_ts, samples)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+        ON CONFLICT(scope, resolution, bucket_start) DO UPDATE SET
+            open = CASE WHEN excluded.open_ts < open_ts THEN excluded.open ELSE open END,
+            open_ts = MIN(open_ts, excluded.open_ts),
+            high = MAX(high, excluded.high),
+            low = MIN(low, excluded.low),
+            close = CASE WHEN excluded.close_ts >= close_ts THEN excluded.close ELSE close END,
+            close_ts = MAX(close_ts, excluded.close_ts),
+            samples = samples + 1
+    """, rows)
+
+def _prune_rollups(c, ts):
+    """Deletes rollup rows past their resolution's ROLLUP_RETENTION."""
+    for resolution, keep in ROLLUP_RETENTION.items():
+        if keep is not None:
+            c.execute("DELETE FROM ohlc_rollups WHERE resolution=? AND bucket_start < ?",
+                      (resolution, bucket_start(ts - keep, resolution)))
+
+def record_portfolio_snapshot(ts=None):
+    """
+    Stores the current portfolio value and folds it, together with every
+    priced item, into the hourly/daily/weekly rollups (expired rows are
+    pruned). Meant to run once after each update cycle.
+    """
+    if ts is None:
+        ts = int(time.time())
+    item_count, total_buy, total_value = portfolio.totals()
+    samples = [(p.market_name, p.current_price) for p in portfolio.positions() if p.current_price > 0]
+    samples.append((PORTFOLIO_SCOPE, total_value))
+
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    c.execute("INSERT OR REPLACE INTO portfolio_snapshots (ts, item_count, total_buy, total_value) VALUES (?, ?, ?, ?)",
+              (ts, item_count, total_buy, total_value))
+    _add_rollup_samples(c, samples, ts)
+    _prune_rollups(c, ts)
+
+    conn.commit()
+    conn.close()
+    log_message(f"Portfolio snapshot: {item_count} items, value {total_value:.2f}")
+
+_snapshot_lock = threading.Lock()
+_last_snapshot_at = None # time.monotonic() of the last update snapshot
+_snapshot_clock_start = time.monotonic()
+
+def snapshot_after_update(min_interval=SNAPSHOT_MIN_INTERVAL):
+    """
+    record_portfolio_snapshot() for the update engine, skipped if one was taken
+    less than min_interval seconds ago. Returns True if a snapshot was stored.
+    """
+    global _last_snapshot_at
+    with _snapshot_lock:
+        now = time.monotonic()
+        if _last_snapshot_at is not None and now - _last_snapshot_at < min_interval:
+            return False
+        try:
+            record_portfolio_snapshot()
+        except sqlite3.Error as e:
+            log_message(f"Snapshot failed: {e}", "ERROR")
+            return False
+        _last_snapshot_at = now
+        return True
+
+def snapshot_age():
+    """Seconds since the last update snapshot (or since start, before the first one)."""
+    return time.monotonic() - (_last_snapshot_at if _last_snapshot_at is not None else _snapshot_clock_start)
+
+def pick_rollup_resolution(span_seconds, max_points=MAX_CHART_POINTS):
+    """Finest resolution that covers span_seconds in at most max_points buckets."""
+    for resolution, size in ROLLUP_RESOLUTIONS.items():
+        if span_seconds / size <= max_points:
+            return resolution
+    return "week"
+
+def get_ohlc(scope, resolution=None):
+    """
+    Returns (resolution, rows) with rows = [(bucket_start, open, high, low, close), ...]
+    for one scope. Without an explicit resolution, one is chosen from the span of data.
+    """
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    if resolution is None:
+        # Daily rows span the longest history that the finer resolutions could need
+        c.execute("SELECT MIN(bucket_start), MAX(bucket_start) FROM ohlc_rollups WHERE scope=? AND resolution='day'", (scope,))
+        first, last = c.fetchone()
+        resolution = pick_rollup_resolution((last - first) if first is not None else 0)
+    c.execute("""
+        SELECT bucket_start, open, high, low, close FROM ohlc_rollups
+        WHERE scope=? AND resolution=?
+        ORDER BY bucket_start
+    """, (scope, resolution))
+    rows = c.fetchall()
+    conn.close()
+    return resolution, rows
+
+def get_price_history(market_name, since=None):
+    """Returns [(ts, price), ...] for one item, oldest first (optionally only from `since` on)."""
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    c.execute("SELECT ts, price FROM price_history WHERE market_name=? AND ts >= ? ORDER BY ts",
+              (market_name, since or 0))
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+
+# --------------- Risk analytics ---------------
+
+def load_history_columns(market_name=None):
+    """
+    The price history as numpy columns, grouped by item: (item_names, counts,
+    ts, prices), where the first counts[0] rows belong to item_names[0] and so
+    on (see risk.grouped_price_matrix). SQLite hands every item over as one
+    comma-separated string per column instead of a Python tuple per sample;
+    prices travel as integer micros, which is exact for market prices.
+    """
+    where, params = ("WHERE market_name=?", (market_name,)) if market_name is not None else ("", ())
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    # GROUP BY market_name walks the (market_name, ts) primary key, no temp sort
+    c.execute(f"""
+        SELECT market_name, COUNT(*), group_concat(ts), group_concat(CAST(round(price * 1000000) AS INTEGER))
+        FROM price_history {where}
+        GROUP BY market_name
+    """, params)
+    rows = c.fetchall()
+    conn.close()
+    if not rows:
+        return [], np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    names = [name for name, *_ in rows]
+    counts = np.array([count for _, count, _, _ in rows], dtype=np.int64)
+    ts = np.fromstring(",".join(row[2] for row in rows), dtype=np.int64, sep=",")
+    prices = np.fromstring(",".join(row[3] for row in rows), dtype=np.int64, sep=",") / 1e6
+    return names, counts, ts, prices
+
+def get_risk_report(market_name=None):
+    """
+    Loads the price history and positions and runs the risk analytics over them.
+    With market_name only that item's history is read (an index range scan);
+    its own figures and weight are exact, the portfolio figures are not.
+    """
+    names, counts, ts, prices = load_history_columns(market_name)
+    positions = {p.market_name: (p.qty, p.current_price) for p in portfolio.positions()}
+    item_names, _, matrix = risk.grouped_price_matrix(names, counts, ts, prices)
+    return risk.risk_report(item_names, matrix, positions)
+
+def format_pct(value, signed=False):
+    """Percentage for display, 'n/a' when the figure could not be computed."""
+    if value is None or value != value: # NaN
+        return "n/a"
+    return f"{value * 100:+.1f}%" if signed else f"{value * 100:.1f}%"
+
+
+# --------------- Parquet import/export ---------------
+
+def parquet_positions_schema():
+    return pa.schema([
+        ("market_name", pa.string()),
+        ("display_name", pa.string()),
+        ("qty", pa.int64()),
+        ("buy_price", pa.float64()),
+        ("current_price", pa.float64()),
+    ])
+
+def parquet_history_schema():
+    return pa.schema([
+        ("market_name", pa.string()),
+        ("ts", pa.timestamp("s", tz="UTC")),
+        ("price", pa.float64()),
+    ])
+
+def _write_query_to_parquet(c, query, schema, path):
+    """Streams a query result into a Parquet file, PARQUET_CHUNK_ROWS rows per row group."""
+    row_count = 0
+    c.execute(query)
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        while True:
+            rows = c.fetchmany(PARQUET_CHUNK_ROWS)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            arrays = []
+            for values, field in zip(columns, schema):
+                if pa.types.is_timestamp(field.type):
+                    # Stored as unix seconds in SQLite
+                    arrays.append(pa.array(values, type=pa.int64()).cast(field.type))
+                else:
+                    arrays.append(pa.array(values, type=field.type))
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            row_count += len(rows)
+    return row_count
+
+def export_positions_parquet(path):
+    """Exports all positions to a Parquet file. Returns the number of rows written."""
+    conn = sqlite3.connect(DB)
+    try:
+        return _write_query_to_parquet(
+            conn.cursor(),
+            "SELECT market_name, display_name, qty, buy_price, current_price FROM items ORDER BY id",
+            parquet_positions_schema(),
+            path,
+        )
+    finally:
+        conn.close()
+
+def export_history_parquet(path):
+    """Exports the full price history to a Parquet file. Returns the number of rows written."""
+    conn = sqlite3.connect(DB)
+    try:
+        return _write_query_to_parquet(
+            conn.cursor(),
+            "SELECT market_name, ts, price FROM price_history ORDER BY market_name, ts",
+            parquet_history_schema(),
+            path,
+        )
+    finally:
+        conn.close()
+
+def import_positions_parquet(path):
+    """
+    Imports positions from a Parquet file written by export_positions_parquet.
+    Like the CSV import, existing items are OVERWRITTEN with the file data.
+    Returns (imported_count, updated_count, skipped_count): rows that added a new item,
+    rows that overwrote one (a name repeated in the file counts once as imported, then
+    as updated), and rows without a market name.
+    """
+    pf = pq.ParquetFile(path)
+    columns = [f.name for f in parquet_positions_schema()]
+
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    imported_count = updated_count = skipped_count = 0
+    names = set()
+    try:
+        for batch in pf.iter_batches(batch_size=PARQUET_CHUNK_ROWS, columns=columns):
+            data = batch.to_pydict()
+            rows = [
+                (name.strip(), (dname or name).strip(), qty or 0, buy or 0.0, cur or 0.0)
+                for name, dname, qty, buy, cur in zip(*(data[col] for col in columns))
+                if name and name.strip()
+            ]
+            skipped_count += batch.num_rows - len(rows)
+
+            # Names already stored (including earlier rows of this file) are updates
+            c.execute("SELECT market_name FROM items WHERE market_name IN (SELECT value FROM json_each(?))",
+                      (json.dumps(sorted({r[0] for r in rows})),))
+            existing = {name for (name,) in c.fetchall()}
+            names.update(r[0] for r in rows)
+            for row in rows:
+                if row[0] in existing:
+                    updated_count += 1
+                else:
+                    existing.add(row[0])
+                    imported_count += 1
+
+            c.executemany("""
+                INSERT INTO items (market_name, display_name, qty, buy_price, current_price)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(market_name) DO UPDATE SET
+                    display_name=excluded.display_name,
+                    qty=excluded.qty,
+                    buy_price=excluded.buy_price,
+                    current_price=excluded.current_price
+            """, rows)
+        conn.commit()
+    finally:
+        conn.close()
+    sync_imported_items(names)
+    return imported_count, updated_count, skipped_count
+
+def import_history_parquet(path):
+    """Imports price history rows from a Parquet file. Returns the number of rows read."""
+    pf = pq.ParquetFile(path)
+
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    try:
+        row_count = 0
+        for batch in pf.iter_batches(batch_size=PARQUET_CHUNK_ROWS, columns=["market_name", "ts", "price"]):
+            ts = batch.column(1)
+            if pa.types.is_timestamp(ts.type):
+                ts = ts.cast(pa.timestamp("s", tz="UTC")).cast(pa.int64())
+            rows = zip(batch.column(0).to_pylist(), ts.to_pylist(), batch.column(2).to_pylist())
+            c.executemany("INSERT OR REPLACE INTO price_history (market_name, ts, price) VALUES (?, ?, ?)",
+                          [r for r in rows if r[0] and r[1] is not None and r[2] is not None])
+            row_count += batch.num_rows
+        conn.commit()
+    finally:
+        conn.close()
+    return row_count
+
+def is_history_parquet(path):
+    """True if the file holds price history rather than positions."""
+    return "ts" in pq.ParquetFile(path).schema_arrow.names
+
+
+# --------------- Helpers (Steam only) ---------------
+
+HEADERS = {"User-Agent": "Mozilla/50.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"}
+
+def log_message(message, level="INFO"):
+    """Logs messages with a timestamp."""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [{level}] {message}")
+
+def parse_price_str(price_str):
+    if not price_str:
+        return 0.0
+    s = price_str
+    s = re.sub(r'[^\d\.,]', '', s) 
+    if s.count(',') > 0 and s.count('.') > 0:
+        s = s.replace(',', '')
+    elif s.count(',') > 0 and s.count('.') == 0:
+        s = s.replace(',', '.')
+    
+    try:
+        # If the string contains only a number
+        return round(float(s), 6) 
+    except:
+        return 0.0
+
+def parse_volume(value):
+    """Traded / listed count from an int or a string such as '1,234' (digits only; 0 if none)."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    return int(re.sub(r'\D', '', value or "") or 0)
+
+class RateLimited(Exception):
+    """No route or source budget frees up within the caller's max_wait; retry_after is in seconds."""
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"Rate limited, try again in {math.ceil(retry_after)}s")
+
+class RateLimiter:
+    """Spaces calls at least `interval` seconds apart across all threads."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def ready_in(self):
+        """Seconds until the next call may go out (0 if now)."""
+        with self._lock:
+            return max(0.0, self._next_at - time.monotonic())
+
+    def reserve(self):
+        """Books the next slot and returns how long to sleep before using it."""
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        return max(0.0, delay)
+
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+class EgressRoute:
+    """One way out to the market (direct, via HTTP proxy, or a mirror base URL) with its own rate budget."""
+
+    def __init__(self, name, base_url=STEAM_BASE_URL, proxy=None, delay=STEAM_API_DELAY):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.proxies = {"http": proxy, "https": proxy} if proxy else None
+        self.limiter = RateLimiter(delay)
+        self.failures = 0
+        self.cooldown_until = 0.0
+        self.disabled = False # out of the pool; probed again from cooldown_until on
+
+    def is_available(self, now):
+        """True if a request may go out now (for a disabled route: its next probe)."""
+        return now >= self.cooldown_until
+
+    def start_probe(self, now):
+        """Books the probe of a disabled route; a probe that never reports is retried after ROUTE_PROBE_SECONDS."""
+        self.cooldown_until = now + ROUTE_PROBE_SECONDS
+        log_message(f"Probing egress route '{self.name}'", "WARNING")
+
+    def record_success(self):
+        if self.disabled:
+            self.disabled = False
+            log_message(f"Egress route '{self.name}' is back in the pool")
+        self.failures = 0
+        self.cooldown_until = 0.0
+
+    def record_failure(self, reason, can_disable=True):
+        """Rests the route; past ROUTE_MAX_FAILURES it leaves the pool unless can_disable is False."""
+        self.failures += 1
+        now = time.monotonic()
+        if self.disabled:
+            self.cooldown_until = now + ROUTE_PROBE_SECONDS
+            log_message(f"Egress route '{self.name}' probe failed, next probe in {ROUTE_PROBE_SECONDS}s ({reason})", "WARNING")
+        elif self.failures >= ROUTE_MAX_FAILURES and can_disable:
+            self.disabled = True
+            self.cooldown_until = now + ROUTE_PROBE_SECONDS
+            log_message(f"Egress route '{self.name}' removed from pool after {self.failures} failures, "
+                        f"probing again in {ROUTE_PROBE_SECONDS}s ({reason})", "ERROR")
+        else:
+            cooldown = min(ROUTE_COOLDOWN_SECONDS * 2 ** (self.failures - 1), ROUTE_PROBE_SECONDS)
+            self.cooldown_until = now + cooldown
+            log_message(f"Egress route '{self.name}' cooling down {cooldown}s ({reason})", "WARNING")
+
+class EgressPool:
+    """
+    Spreads requests over the configured routes: each request takes the
+    healthy route whose rate budget frees up first, so throughput grows with
+    the number of routes. Routes returning 429/5xx are rested, then taken
+    out of the pool until a probe request succeeds (half-open).
+    """
+
+    def __init__(self, routes):
+        self.routes = routes
+        self._lock = threading.Lock()
+
+    def healthy_count(self):
+        return sum(1 for r in self.routes if not r.disabled)
+
+    def acquire(self, exclude=(), max_wait=None):
+        """
+        Blocks until a route may send and returns it (None if every route left
+        is in `exclude`). Interactive callers pass max_wait (seconds) and get
+        RateLimited instead of waiting longer than that.
+        """
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                candidates = [r for r in self.routes if r.is_available(now) and r not in exclude]
+                if candidates:
+                    # A due probe goes first (one request per ROUTE_PROBE_SECONDS), then the freest route
+                    route = min(candidates, key=lambda r: (not r.disabled, r.limiter.ready_in()))
+                    if deadline is not None and now + route.limiter.ready_in() > deadline:
+                        raise RateLimited(route.limiter.ready_in())
+                    if route.disabled:
+                        route.start_probe(now)
+                    delay = route.limiter.reserve()
+                    break
+                waiting = [r for r in self.routes if r not in exclude]
+                if not waiting:
+                    return None
+                # With other routes tried already, only wait for healthy ones
+                if exclude and all(r.disabled for r in waiting):
+                    return None
+                pause = min(r.cooldown_until for r in waiting) - now
+                if deadline is not None and now + pause > deadline:
+                    raise RateLimited(pause)
+            time.sleep(max(0.1, min(pause, 5.0)))
+        if delay > 0:
+            time.sleep(delay)
+        return route
+
+    def report(self, route, status_code=None, error=None):
+        """Feeds a request outcome back into the route's health."""
+        with self._lock:
+            # The last route still in the pool stays in it, resting instead
+            can_disable = any(not r.disabled for r in self.routes if r is not route)
+            if error is not None:
+                route.record_failure(str(error), can_disable)
+            elif status_code == 429 or status_code >= 500:
+                route.record_failure(f"HTTP {status_code}", can_disable)
+            else:
+                route.record_success()
+
+def load_egress_routes(path=EGRESS_CONFIG_FILE):
+    """
+    Reads the route list from a JSON file, e.g.
+    [{"name": "direct"},
+     {"name": "proxy-1", "proxy": "http://127.0.0.1:8081"},
+     {"name": "mirror", "base_url": "http://127.0.0.1:9000", "delay": 1.5}]
+    Falls back to a single direct route.
+    """
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+            routes = [
+                EgressRoute(
+                    entry.get("name") or f"route-{i+1}",
+                    base_url=entry.get("base_url") or STEAM_BASE_URL,
+                    proxy=entry.get("proxy"),
+                    delay=float(entry.get("delay", STEAM_API_DELAY)),
+                )
+                for i, entry in enumerate(config)
+            ]
+            if routes:
+                log_message(f"Loaded {len(routes)} egress route(s) from {path}")
+                return routes
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            log_message(f"Invalid egress config {path}: {e}. Using direct route.", "ERROR")
+    return [EgressRoute("direct")]
+
+# Shared by the manual fetch, Update All and the background refresher
+EGRESS_POOL = EgressPool(load_egress_routes())
+
+class _InFlightCall:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one: the first caller
+    runs the function, everyone arriving while it runs waits and gets the
+    same result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _InFlightCall()
+
+        if not leader:
+            log_message(f"Joining in-flight request for {key[-1]}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+# One shared instance so every caller (fetch button, Update All, background refresh) is coalesced
+price_requests = SingleFlight()
+
+def get_steam_price_and_name(market_hash_name, fresh=False, max_wait=None):
+    """
+    Returns (price, display_name) for an item from the configured price
+    sources (Steam priceoverview by default). Concurrent requests for the
+    same item are coalesced into one round of source requests. fresh=True
+    (an explicit single-item fetch) skips the sources' quote caches but still
+    joins a request already in flight, whose result is live anyway. With
+    max_wait, raises RateLimited rather than wait longer for a rate budget.
+    """
+    key = (STEAM_APP, STEAM_CURRENCY, market_hash_name)
+    return price_requests.do(key, PRICE_SOURCES.price_and_name, market_hash_name, fresh, max_wait)
+
+def clean_display_name(market_hash_name):
+    """'AK-47 | Redline (Field-Tested)' -> 'Redline'; other names are kept as they are."""
+    if ' | ' not in market_hash_name:
+        return market_hash_name
+    d = market_hash_name.split(' | ')[-1]
+    return re.sub(r'\s*\([^)]+\)$', '', d).strip()
+
+def _request_steam_price(market_hash_name, max_wait=None):
+    """
+    Fetches price, name and 24h volume from Steam API through the egress pool.
+    A route failure (429/5xx/network) is retried once on another route.
+    max_wait is passed on to EgressPool.acquire.
+    """
+    price = 0.0
+    volume = 0
+    display_name = market_hash_name 
+    
+    params = {
+        "appid": STEAM_APP,
+        "currency": STEAM_CURRENCY,
+        "market_hash_name": market_hash_name
+    }
+
+    tried = []
+    for attempt in range(ROUTE_ATTEMPTS):
+        route = EGRESS_POOL.acquire(exclude=tried, max_wait=max_wait)
+        if route is None:
+            if not tried:
+                log_message(f"No healthy egress route for {market_hash_name}", "ERROR")
+            break
+        tried.append(route)
+        ok, price, display_name, volume = _request_price_via(route, market_hash_name, params)
+        if ok:
+            break
+
+    # Return price, name and volume
+    return price, display_name, volume
+
+def _request_price_via(route, market_hash_name, params):
+    """One priceoverview request over one route. Returns (route_ok, price, display_name, volume)."""
+    price = 0.0
+    volume = 0
+    display_name = market_hash_name
+    url_price = f"{route.base_url}/market/priceoverview/"
+
+    log_message(f"START PRICE REQUEST: {market_hash_name} (via {route.name})")
+
+    try:
+        r = requests.get(url_price, params=params, headers=HEADERS, timeout=15, proxies=route.proxies)
+        EGRESS_POOL.report(route, status_code=r.status_code)
+        
+        if r.status_code == 200:
+            data = r.json()
+            if data.get('success'): 
+                price_str = data.get("lowest_price") or data.get("median_price") or None
+                price = parse_price_str(price_str) if price_str else 0.0
+                volume = parse_volume(data.get("volume"))
+            
+                display_name = clean_display_name(market_hash_name)
+                     
+        elif r.status_code == 429:
+             log_message(f"RATE LIMIT EXCEEDED (429) for {market_hash_name} via {route.name}. Increase STEAM_API_DELAY!", "ERROR")
+             return False, price, display_name, volume
+        else:
+             log_message(f"HTTP Error {r.status_code} for {market_hash_name} via {route.name}", "ERROR")
+             return r.status_code < 500, price, display_name, volume
+
+    except requests.exceptions.RequestException as e:
+        EGRESS_POOL.report(route, error=e)
+        log_message(f"Price request FAILED for {market_hash_name} via {route.name}: {e}", "ERROR")
+        return False, price, display_name, volume
+    except Exception as e:
+        log_message(f"General error in price request for {market_hash_name}: {e}", "CRITICAL")
+
+    return True, price, display_name, volume
+
+
+# --------------- Price sources ---------------
+# One answer from one source; volume is 0 when the source does not report it
+Quote = namedtuple("Quote", "source price volume display_name")
+
+class PriceSource:
+    """
+    A place prices come from. Subclasses implement quote(); fetch() wraps it
+    with the source's own rate limiter and a per-item cache, so slow or
+    strict sources never hold back the others.
+    """
+
+    def __init__(self, name, delay=0.0, cache_ttl=PRICE_CACHE_TTL, cache_size=PRICE_CACHE_MAX_ENTRIES):
+        self.name = name
+        self.limiter = RateLimiter(float(delay))
+        self.cache_ttl = float(cache_ttl)
+        self.cache_size = int(cache_size)
+        # market_name -> (expires_at, Quote), kept in insertion order = expiry order
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def fetch(self, market_name, fresh=False, max_wait=None):
+        """
+        Quote for one item (cached for cache_ttl unless fresh), or None when the
+        source has no price. Raises RateLimited if the source's rate budget (or
+        the egress pool) does not free up within max_wait seconds.
+        """
+        if not fresh:
+            with self._lock:
+                cached = self._cache.get(market_name)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+        if self.limiter.interval > 0:
+            if max_wait is not None and self.limiter.ready_in() > max_wait:
+                raise RateLimited(self.limiter.ready_in())
+            self.limiter.wait()
+        try:
+            quote = self.quote_within(market_name, max_wait)
+        except RateLimited:
+            raise
+        except Exception as e:
+            log_message(f"Price source '{self.name}' failed for {market_name}: {e}", "ERROR")
+            return None
+        if quote is not None and self.cache_ttl > 0:
+            self._remember(market_name, quote)
+        return quote
+
+    def _remember(self, market_name, quote):
+        now = time.monotonic()
+        with self._lock:
+            cache = self._cache
+            cache.pop(market_name, None) # re-inserted at the end, in expiry order
+            # Every entry lives cache_ttl, so expired ones are at the front; past the size cap the oldest go too
+            while cache:
+                oldest = next(iter(cache))
+                if cache[oldest][0] > now and len(cache) < self.cache_size:
+                    break
+                del cache[oldest]
+            cache[market_name] = (now + self.cache_ttl, quote)
+
+    def quote_within(self, market_name, max_wait):
+        """quote() for callers that wait at most max_wait seconds; sources waiting on the egress pool override it."""
+        return self.quote(market_name)
+
+    def quote(self, market_name):
+        raise NotImplementedError
+
+class SteamPriceOverviewSource(PriceSource):
+    """Steam's priceoverview endpoint, sent over the egress pool (whose routes carry the rate limits)."""
+
+    def __init__(self, name="steam", cache_ttl=PRICE_CACHE_TTL):
+        super().__init__(name, 0.0, cache_ttl)
+
+    def quote_within(self, market_name, max_wait):
+        price, display_name, volume = _request_steam_price(market_name, max_wait)
+        return Quote(self.name, price, volume, display_name) if price > 0 else None
+
+    def quote(self, market_name):
+        return self.quote_within(market_name, None)
+
+class SteamListingSource(PriceSource):
+    """
+    Cheapest offer on the item's market listing page (price + fee, as a buyer
+    pays it). Volume is the number of listings on offer.
+    """
+
+    def __init__(self, name="steam_listings", base_url=STEAM_BASE_URL, proxy=None,
+                 delay=STEAM_API_DELAY, cache_ttl=PRICE_CACHE_TTL, count=10):
+        super().__init__(name, delay, cache_ttl)
+        self.base_url = base_url.rstrip("/")
+        self.proxies = {"http": proxy, "https": proxy} if proxy else None
+        self.count = int(count)
+
+    def quote(self, market_name):
+        url = f"{self.base_url}/market/listings/{STEAM_APP}/{urllib.parse.quote(market_name)}/render/"
+        params = {"start": 0, "count": self.count, "currency": STEAM_CURRENCY, "format": "json"}
+        r = requests.get(url, params=params, headers=HEADERS, timeout=15, proxies=self.proxies)
+        if r.status_code != 200:
+            log_message(f"HTTP Error {r.status_code} for {market_name} via {self.name}", "ERROR")
+            return None
+        data = r.json()
+        listings = (data.get("listinginfo") or {}).values() if data.get("success") else ()
+        # converted_* are cents of the requested currency; price/fee are in the seller's
+        # currency, so listings without the converted fields are left out
+        totals = [
+            l["converted_price"] + l["converted_fee"]
+            for l in listings
+            if l.get("converted_price") and l.get("converted_fee") is not None
+        ]
+        if not totals:
+            return None
+        return Quote(self.name, min(totals) / 100.0, int(data.get("total_count") or len(totals)), None)
+
+class FileFeedSource(PriceSource):
+    """
+    Prices from a local file, re-read whenever it changes: CSV with a
+    market_name,price[,volume] header, or JSON {market_name: price} /
+    {market_name: {"price": ..., "volume": ...}}.
+    """
+
+    def __init__(self, name="file", path="prices.csv", cache_ttl=0):
+        super().__init__(name, 0.0, cache_ttl)
+        self.path = path
+        self._mtime = None
+        self._prices = {}
+
+    def _refresh(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            self._prices, self._mtime = {}, None
+            return
+        if mtime == self._mtime:
+            return
+        prices = {}
+        with open(self.path, "r", newline="", encoding="utf-8") as f:
+            if self.path.lower().endswith(".json"):
+                for market_name, entry in json.load(f).items():
+                    entry = entry if isinstance(entry, dict) else {"price": entry}
+                    prices[market_name] = (float(entry.get("price") or 0), parse_volume(entry.get("volume")))
+            else:
+                for row in csv.DictReader(f):
+                    price = parse_price_str(row.get("price") or "")
+                    prices[(row.get("market_name") or "").strip()] = (price, parse_volume(row.get("volume")))
+        self._prices, self._mtime = prices, mtime
+        log_message(f"Price feed '{self.name}' loaded {len(prices)} price(s) from {self.path}")
+
+    def quote(self, market_name):
+        with self._lock:
+            self._refresh()
+            price, volume = self._prices.get(market_name, (0.0, 0))
+        return Quote(self.name, price, volume, None) if price > 0 else None
+
+class HttpJsonSource(PriceSource):
+    """
+    A marketplace (or a local stand-in for one) answering
+    GET <url>?market_hash_name=...&appid=...&currency=... with JSON such as
+    {"price": 1.23, "volume": 45}; lowest_price / median_price strings work too.
+    """
+
+    def __init__(self, name="http", url="http://127.0.0.1:9100/price", proxy=None,
+                 delay=1.0, cache_ttl=PRICE_CACHE_TTL):
+        super().__init__(name, delay, cache_ttl)
+        self.url = url
+        self.proxies = {"http": proxy, "https": proxy} if proxy else None
+
+    def quote(self, market_name):
+        params = {"market_hash_name": market_name, "appid": STEAM_APP, "currency": STEAM_CURRENCY}
+        r = requests.get(self.url, params=params, headers=HEADERS, timeout=15, proxies=self.proxies)
+        if r.status_code != 200:
+            log_message(f"HTTP Error {r.status_code} for {market_name} via {self.name}", "ERROR")
+            return None
+        data = r.json()
+        price = data.get("price") or data.get("lowest_price") or data.get("median_price") or 0
+        price = parse_price_str(price) if isinstance(price, str) else float(price)
+        volume = parse_volume(data.get("volume"))
+        return Quote(self.name, price, volume, None) if price > 0 else None
+
+PRICE_SOURCE_TYPES = {
+    "steam": SteamPriceOverviewSource,
+    "steam_listings": SteamListingSource,
+    "file": FileFeedSource,
+    "http": HttpJsonSource,
+}
+
+class PriceAggregator:
+    """
+    Asks every source for an item at the same time and combines the quotes:
+    'lowest', 'median' or 'vwap' (volume-weighted; the median when no source
+    reports volume). An item takes as long as its slowest source, not the sum.
+    """
+
+    METHODS = ("lowest", "median", "vwap")
+
+    def __init__(self, sources, method="lowest", timeout=PRICE_SOURCE_TIMEOUT):
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown aggregate method: {method}")
+        self.sources = sources
+        self.method = method
+        self.timeout = timeout
+        # A single source is called on the updater thread itself
+        self._executor = None
+        if len(sources) > 1:
+            self._executor = ThreadPoolExecutor(max_workers=4 * len(sources), thread_name_prefix="price-source")
+
+    def quotes(self, market_name, fresh=False, max_wait=None):
+        """Quotes of every source that has one; RateLimited only if rate limits kept every source from answering."""
+        if self._executor is None:
+            return [q for q in (s.fetch(market_name, fresh, max_wait) for s in self.sources) if q is not None]
+        futures = [self._executor.submit(s.fetch, market_name, fresh, max_wait) for s in self.sources]
+        done, not_done = wait_futures(futures, timeout=self.timeout)
+        if not_done:
+            log_message(f"{len(not_done)} price source(s) timed out for {market_name}", "WARNING")
+        quotes, limited = [], []
+        for f in futures:
+            if f not in done:
+                continue
+            if isinstance(f.exception(), RateLimited):
+                limited.append(f.exception())
+            elif f.result() is not None:
+                quotes.append(f.result())
+        if limited and not quotes:
+            raise min(limited, key=lambda e: e.retry_after)
+        return quotes
+
+    def combine(self, quotes):
+        prices = [q.price for q in quotes]
+        if not prices:
+            return 0.0
+        if self.method == "lowest":
+            return min(prices)
+        if self.method == "vwap":
+            weighted = [(q.price, q.volume) for q in quotes if q.volume > 0]
+            if weighted:
+                return round(sum(p * v for p, v in weighted) / sum(v for _, v in weighted), 6)
+        return round(statistics.median(prices), 6)
+
+    def price_and_name(self, market_name, fresh=False, max_wait=None):
+        """(aggregated price, display name); price is 0.0 when no source had one."""
+        quotes = self.quotes(market_name, fresh, max_wait)
+        display_name = next((q.display_name for q in quotes if q.display_name), None)
+        price = self.combine(quotes)
+        if len(quotes) > 1:
+            detail = ", ".join(f"{q.source}={q.price:.2f}" for q in quotes)
+            log_message(f"{market_name}: {self.method} {price:.2f} from {detail}")
+        return price, display_name or clean_display_name(market_name)
+
+def load_price_sources(path=PRICE_SOURCES_FILE):
+    """
+    Builds the PriceAggregator from a JSON file, e.g.
+    {"aggregate": "median",
+     "sources": [{"type": "steam"},
+                 {"type": "steam_listings", "delay": 3.0},
+                 {"type": "file", "path": "prices.csv"},
+                 {"type": "http", "name": "market-x", "url": "http://127.0.0.1:9100/price", "delay": 0.5}]}
+    Every entry takes the constructor arguments of its type. Falls back to
+    Steam priceoverview alone.
+    """
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+            sources = []
+            for entry in config["sources"]:
+                options = {k: v for k, v in entry.items() if k != "type"}
+                sources.append(PRICE_SOURCE_TYPES[entry["type"]](**options))
+            if sources:
+                aggregator = PriceAggregator(sources, config.get("aggregate", "lowest"),
+                                             float(config.get("timeout", PRICE_SOURCE_TIMEOUT)))
+                log_message(f"Loaded {len(sources)} price source(s) from {path} ({aggregator.method})")
+                return aggregator
+        except (OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+            log_message(f"Invalid price source config {path}: {e}. Using Steam only.", "ERROR")
+    return PriceAggregator([SteamPriceOverviewSource()])
+
+PRICE_SOURCES = load_price_sources()
+
+
+# --------------- Price alerts ---------------
+
+ALERT_KINDS = {
+    "above": "Price above",
+    "below": "Price below",
+    "move_pct": "Move by %",
+    "profit": "Profit target",
+}
+
+def add_alert(market_name, kind, threshold):
+    """Stores a new alert and indexes it. move_pct alerts are relative to the current price."""
+    if kind not in ALERT_KINDS:
+        raise ValueError(f"Unknown alert kind: {kind}")
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    ref_price = None
+    if kind == "move_pct":
+        c.execute("SELECT current_price FROM items WHERE market_name=?", (market_name,))
+        row = c.fetchone()
+        ref_price = row[0] if row else None
+        if not ref_price:
+            conn.close()
+            raise ValueError("A % move alert needs a current price for the item.")
+    c.execute("""
+        INSERT INTO alerts (market_name, kind, threshold, ref_price, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, (market_name, kind, threshold, ref_price, int(time.time())))
+    alert_id = c.lastrowid
+    conn.commit()
+    conn.close()
+    alert_engine.reindex_item(market_name)
+    return alert_id
+
+def delete_alert(alert_id):
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    c.execute("SELECT market_name FROM alerts WHERE id=?", (alert_id,))
+    row = c.fetchone()
+    c.execute("DELETE FROM alerts WHERE id=?", (alert_id,))
+    conn.commit()
+    conn.close()
+    if row:
+        alert_engine.reindex_item(row[0])
+
+def get_alerts(market_name):
+    """Returns [(id, kind, threshold, ref_price, active, fired_at, fired_price), ...] for one item."""
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    c.execute("""
+        SELECT id, kind, threshold, ref_price, active, fired_at, fired_price
+        FROM alerts WHERE market_name=? ORDER BY active DESC, id
+    """, (market_name,))
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+def describe_alert(kind, threshold, ref_price=None):
+    if kind == "above":
+        return f"price >= {threshold:.2f}"
+    if kind == "below":
+        return f"price <= {threshold:.2f}"
+    if kind == "move_pct":
+        return f"moves {threshold:g}% from {ref_price or 0:.2f}"
+    return f"position profit >= {threshold:+.2f}"
+
+class AlertEngine:
+    """
+    Keeps every active alert as price triggers in per-item sorted lists: "up"
+    triggers fire when the price reaches their level, "down" triggers when it
+    falls to it. A price write bisects the item's two lists and touches only
+    the triggers it crossed, so checking costs O(log n) regardless of how
+    many alerts exist. Alerts are one-shot: fired ones are deactivated.
+    """
+
+    def __init__(self):
+        self.events = queue.Queue() # fired alerts for the GUI
+        self._lock = threading.Lock()
+        self._up = {}   # market_name -> sorted [(level, alert_id)]
+        self._down = {} # market_name -> sorted [(level, alert_id)]
+        self._alerts = {} # alert_id -> (market_name, kind, threshold, ref_price)
+
+    def load(self):
+        """(Re)builds the index from all active alerts."""
+        conn = sqlite3.connect(DB)
+        c = conn.cursor()
+        c.execute("""
+            SELECT a.id, a.market_name, a.kind, a.threshold, a.ref_price, i.qty, i.buy_price
+            FROM alerts a LEFT JOIN items i ON i.market_name = a.market_name
+            WHERE a.active = 1
+        """)
+        rows = c.fetchall()
+        conn.close()
+
+        with self._lock:
+            self._up, self._down, self._alerts = {}, {}, {}
+            for row in rows:
+                self._index(*row)
+            for triggers in (self._up, self._down):
+                for lst in triggers.values():
+                    lst.sort()
+
+    def reindex_item(self, market_name):
+        """Rebuilds one item's triggers (after its alerts or its position changed)."""
+        conn = sqlite3.connect(DB)
+        c = conn.cursor()
+        c.execute("""
+            SELECT a.id, a.market_name, a.kind, a.threshold, a.ref_price, i.qty, i.buy_price
+            FROM alerts a LEFT JOIN items i ON i.market_name = a.market_name
+            WHERE a.active = 1 AND a.market_name = ?
+        """, (market_name,))
+        rows = c.fetchall()
+        conn.close()
+
+        with self._lock:
+            for alert_id in [a for a, info in self._alerts.items() if info[0] == market_name]:
+                del self._alerts[alert_id]
+            self._up.pop(market_name, None)
+            self._down.pop(market_name, None)
+            for row in rows:
+                self._index(*row)
+            for triggers in (self._up, self._down):
+                triggers.get(market_name, []).sort()
+
+    def _index(self, alert_id, market_name, kind, threshold, ref_price, qty, buy_price):
+        """Turns one alert into price triggers (caller holds the lock and sorts afterwards)."""
+        up, down = [], []
+        if kind == "above":
+            up.append(threshold)
+        elif kind == "below":
+            down.append(threshold)
+        elif kind == "move_pct" and ref_price:
+            up.append(ref_price * (1 + abs(threshold) / 100))
+            down.append(ref_price * (1 - abs(threshold) / 100))
+        elif kind == "profit" and qty:
+            # (price - buy) * qty >= target  <=>  price >= buy + target / qty
+            up.append((buy_price or 0.0) + threshold / qty)
+        else:
+            return
+
+        self._alerts[alert_id] = (market_name, kind, threshold, ref_price)
+        for level in up:
+            self._up.setdefault(market_name, []).append((level, alert_id))
+        for level in down:
+            self._down.setdefault(market_name, []).append((level, alert_id))
+
+    def check(self, market_name, price):
+        """Fires every alert whose trigger the new price crossed. Returns the fired alert ids."""
+        fired = []
+        with self._lock:
+            up = self._up.get(market_name)
+            if up:
+                i = bisect.bisect_right(up, (price, float("inf")))
+                fired.extend(alert_id for _, alert_id in up[:i])
+                del up[:i]
+            down = self._down.get(market_name)
+            if down:
+                i = bisect.bisect_left(down, (price, float("-inf")))
+                fired.extend(alert_id for _, alert_id in down[i:])
+                del down[i:]
+            if not fired:
+                return []
+
+            fired = list(dict.fromkeys(fired))
+            infos = [(alert_id, self._alerts.pop(alert_id)) for alert_id in fired]
+            # A two-sided (move_pct) alert may still have its other trigger indexed
+            if any(info[1] == "move_pct" for _, info in infos):
+                for triggers in (up, down):
+                    if triggers:
+                        triggers[:] = [t for t in triggers if t[1] not in fired]
+
+        self._fire(infos, price)
+        return fired
+
+    def _fire(self, infos, price):
+        now = int(time.time())
+        conn = sqlite3.connect(DB)
+        c = conn.cursor()
+        c.executemany("UPDATE alerts SET active=0, fired_at=?, fired_price=? WHERE id=?",
+                      [(now, price, alert_id) for alert_id, _ in infos])
+        conn.commit()
+        conn.close()
+
+        for alert_id, (market_name, kind, threshold, ref_price) in infos:
+            text = f"{market_name}: {describe_alert(kind, threshold, ref_price)} (now {price:.2f})"
+            log_message(f"ALERT #{alert_id} {text}", "WARNING")
+            event = {"id": alert_id, "ts": now, "market_name": market_name, "kind": kind,
+                     "threshold": threshold, "price": price, "message": text}
+            try:
+                with open(ALERT_LOG_FILE, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(event) + "\n")
+            except OSError as e:
+                log_message(f"Could not write alert log: {e}", "ERROR")
+            self.events.put(event)
+
+alert_engine = AlertEngine()
+
+
+# --------------- Update jobs (checkpointed Update All runs) ---------------
+def create_update_job(items, repeat_interval=None):
+    """Starts a run over (item_id, market_name) pairs, every item pending. Returns the job id."""
+    now = int(time.time())
+    conn = sqlite3.connect(DB)
+    try:
+        with conn:
+            c = conn.cursor()
+            c.execute("INSERT INTO update_jobs (status, created_at, repeat_interval) VALUES ('running', ?, ?)",
+                      (now, repeat_interval))
+            job_id = c.lastrowid
+            c.executemany("""
+                INSERT OR IGNORE INTO update_job_items (job_id, item_id, market_name, updated_at)
+                VALUES (?, ?, ?, ?)
+            """, ((job_id, item_id, market_name, now) for item_id, market_name in items))
+    finally:
+        conn.close()
+    return job_id
+
+def get_job_items(job_id, statuses=("pending", "retry")):
+    """Returns [(item_id, market_name), ...] of a run's items in the given statuses."""
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    c.execute(f"""
+        SELECT item_id, market_name FROM update_job_items
+        WHERE job_id=? AND status IN ({",".join("?" * len(statuses))})
+        ORDER BY item_id
+    """, (job_id, *statuses))
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+def record_job_result(job_id, item_id, ok, error=None):
+    """
+    Checkpoints one item of a run. A failed item goes to 'retry' until it has
+    used JOB_MAX_ATTEMPTS, then to 'failed'. Returns the new status.
+    """
+    conn = sqlite3.connect(DB)
+    try:
+        with conn:
+            row = conn.execute("""
+                UPDATE update_job_items
+                SET attempts = attempts + 1,
+                    status = CASE WHEN ? THEN 'done' WHEN attempts + 1 >= ? THEN 'failed' ELSE 'retry' END,
+                    last_error = ?,
+                    updated_at = ?
+                WHERE job_id=? AND item_id=?
+                RETURNING status
+            """, (bool(ok), JOB_MAX_ATTEMPTS, None if ok else error, int(time.time()), job_id, item_id)).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+def finish_job_if_complete(job_id):
+    """Marks a run done once nothing is pending or waiting for a retry; schedules its next run if it repeats."""
+    now = int(time.time())
+    conn = sqlite3.connect(DB)
+    try:
+        with conn:
+            c = conn.execute("""
+                UPDATE update_jobs
+                SET status='done', finished_at=?,
+                    next_run_at = CASE WHEN repeat_interval IS NULL THEN NULL ELSE ? + repeat_interval END
+                WHERE id=? AND status='running' AND NOT EXISTS (
+                    SELECT 1 FROM update_job_items WHERE job_id=? AND status IN ('pending', 'retry')
+                )
+            """, (now, now, job_id, job_id))
+            finished = c.rowcount > 0
+    finally:
+        conn.close()
+    return finished
+
+def get_job_progress(job_id):
+    """Returns {status: item count} for one run."""
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    c.execute("SELECT status, COUNT(*) FROM update_job_items WHERE job_id=? GROUP BY status", (job_id,))
+    progress = dict(c.fetchall())
+    conn.close()
+    return progress
+
+def get_running_jobs():
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    c.execute("SELECT id FROM update_jobs WHERE status='running' ORDER BY id")
+    ids = [row[0] for row in c.fetchall()]
+    conn.close()
+    return ids
+
+def get_latest_job():
+    """Returns (id, status, finished_at, repeat_interval, next_run_at) of the newest run, or None."""
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    c.execute("SELECT id, status, finished_at, repeat_interval, next_run_at FROM update_jobs ORDER BY id DESC LIMIT 1")
+    row = c.fetchone()
+    conn.close()
+    return row
+
+def retry_failed_items(job_id):
+    """Puts a run's failed items back to pending with fresh attempts and reopens the run. Returns how many."""
+    conn = sqlite3.connect(DB)
+    try:
+        with conn:
+            c = conn.execute("UPDATE update_job_items SET status='pending', attempts=0 WHERE job_id=? AND status='failed'", (job_id,))
+            count = c.rowcount
+            if count:
+                conn.execute("UPDATE update_jobs SET status='running', finished_at=NULL, next_run_at=NULL WHERE id=?", (job_id,))
+    finally:
+        conn.close()
+    return count
+
+def set_job_repeat(job_id, repeat_interval):
+    """Changes how often a run repeats. A finished run is rescheduled from its finish time."""
+    conn = sqlite3.connect(DB)
+    with conn:
+        conn.execute("""
+            UPDATE update_jobs
+            SET repeat_interval = ?,
+                next_run_at = CASE WHEN ? IS NULL OR status != 'done' THEN NULL ELSE finished_at + ? END
+            WHERE id=?
+        """, (repeat_interval, repeat_interval, repeat_interval, job_id))
+    conn.close()
+
+def start_due_job(now=None):
+    """
+    Starts the next run of a repeating job once it is due, over the current
+    portfolio. Nothing starts while another run is still in progress.
+    Returns the new job id or None. The portfolio is only walked once a run is due.
+    """
+    now = int(now or time.time())
+    if get_running_jobs():
+        return None
+    conn = sqlite3.connect(DB)
+    c = conn.cursor()
+    c.execute("SELECT id, repeat_interval FROM update_jobs WHERE status='done' AND next_run_at <= ? ORDER BY id DESC", (now,))
+    due = c.fetchall()
+    items = [(pos.id, pos.market_name) for pos in portfolio.positions()] if due else []
+    if items:
+        # The new run carries the schedule on
+        with conn:
+            conn.executemany("UPDATE update_jobs SET next_run_at=NULL WHERE id=?", ((job_id,) for job_id, _ in due))
+    conn.close()
+    if not items:
+        return None
+    return create_update_job(items, due[0][1])
+
+
+# --------------- Write-coalescing price writer ---------------
+class PriceWriter:
+    """
+    Buffers fetched prices from the updater threads and writes them in one
+    transaction (items, price_history and update job checkpoints via
+    executemany) every PRICE_WRITE_BATCH results or PRICE_WRITE_INTERVAL_MS,
+    whichever comes first. Failed fetches ride along to back the item off
+    (see PRICE_RETRY_BASE_SECONDS). The in-memory model and alerts are updated
+    at once, so only the disk write is deferred. Anything still buffered is flushed on
+    shutdown; results lost in a crash stay 'pending' in their job and are
+    fetched again when the run resumes.
+    """
+
+    def __init__(self, batch_size=None, interval_ms=None):
+        self.batch_size = batch_size or PRICE_WRITE_BATCH
+        self.interval = (interval_ms or PRICE_WRITE_INTERVAL_MS) / 1000.0
+        self.flushes = 0 # bumped after every committed batch (the GUI repaints on change)
+        self._buffer = [] # (item_id, market_name, price, display_name, ts, job_ids)
+        self._failed = [] # (item_id, ts)
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def write(self, item_id, market_name, price, display_name, job_ids=()):
+        """Queues one successful fetch (price > 0) for the next batch."""
+        now = int(time.time())
+        portfolio.set_price(item_id, price, display_name, now)
+        alert_engine.check(market_name, price)
+        with self._cond:
+            self._buffer.append((item_id, market_name, price, display_name, now, tuple(job_ids)))
+            self._ensure_thread()
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+
+    def write_failure(self, item_id):
+        """Queues one failed fetch; the item is skipped by the stale refresh until its backoff ends."""
+        with self._cond:
+            self._failed.append((item_id, int(time.time())))
+            self._ensure_thread()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="price-writer", daemon=True)
+            self._thread.start()
+
+    def pending(self):
+        with self._cond:
+            return len(self._buffer)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.interval
+                while len(self._buffer) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            self.flush()
+
+    def flush(self):
+        """Writes everything buffered so far in a single transaction. Returns the number of results written."""
+        with self._flush_lock:
+            with self._cond:
+                batch, self._buffer = self._buffer, []
+                failed, self._failed = self._failed, []
+            if not batch and not failed:
+                return 0
+
+            jobs = {job_id for *_, job_ids in batch for job_id in job_ids}
+            conn = sqlite3.connect(DB)
+            try:
+                with conn:
+                    conn.executemany("""
+                        UPDATE items SET current_price=?, display_name=?, price_updated_at=?,
+                                         price_failures=0, price_retry_at=NULL
+                        WHERE id=?
+                    """, ((price, display, ts, item_id) for item_id, _, price, display, ts, _ in batch))
+                    # Backoff from the failures in a row so far: base, 2x base, 4x base, ... up to the max
+                    conn.executemany("""
+                        UPDATE items SET price_failures=price_failures+1,
+                                         price_retry_at=? + MIN(?, ? * (1 << MIN(price_failures, 20)))
+                        WHERE id=?
+                    """, ((ts, PRICE_RETRY_MAX_SECONDS, PRICE_RETRY_BASE_SECONDS, item_id) for item_id, ts in failed))
+                    conn.executemany("INSERT OR REPLACE INTO price_history (market_name, ts, price) VALUES (?, ?, ?)",
+                                     ((name, ts, price) for _, name, price, _, ts, _ in batch))
+                    conn.executemany("""
+                        UPDATE update_job_items SET status='done', attempts=attempts+1, last_error=NULL, updated_at=?
+                        WHERE job_id=? AND item_id=?
+                    """, ((ts, job_id, item_id) for item_id, _, _, _, ts, job_ids in batch for job_id in job_ids))
+            except sqlite3.Error as e:
+                # Keep the batch for the next attempt instead of dropping prices
+                log_message(f"Batch price write failed ({len(batch)} rows), will retry: {e}", "ERROR")
+                with self._cond:
+                    self._buffer[:0] = batch
+                    self._failed[:0] = failed
+                return 0
+            finally:
+                conn.close()
+
+            finished = [job_id for job_id in jobs if finish_job_if_complete(job_id)]
+            self.flushes += 1
+            if finished:
+                snapshot_after_update(0)
+            return len(batch)
+
+    def close(self):
+        """Final flush on shutdown."""
+        written = self.flush()
+        if written:
+            log_message(f"Flushed {written} buffered price(s) on shutdown")
+
+price_writer = PriceWriter()
+atexit.register(price_writer.close)
+
+
+# --------------- Background price refresh ---------------
+
+# Queue priorities (lower runs first)
+PRIORITY_USER = 0
+PRIORITY_RETRY = 5
+PRIORITY_STALE = 10
+
+class PriceUpdater:
+    """
+    Refreshes item prices on background threads, one worker per egress route
+    so every route's rate budget is used. Work comes from a priority queue;
+    each finished item is reported on `results` as (item_id, market_name, price)
+    for the GUI to pick up. Fetched prices go to the DB through `price_writer`
+    in batches, failures are checkpointed into any update job waiting for them.
+    A portfolio snapshot is recorded whenever the queue runs dry.
+    """
+
+    def __init__(self):
+        self.results = queue.Queue()
+        self._queue = queue.PriorityQueue()
+        self._queued = {} # item_id -> best priority it is queued with
+        self._jobs = {} # item_id -> update job ids waiting for its result
+        self._lock = threading.Lock()
+        self._order = itertools.count()
+        self._threads = []
+
+    def enqueue(self, items, priority=PRIORITY_STALE, job_id=None):
+        """
+        Queues (item_id, market_name) pairs. With job_id, each result is also
+        checkpointed into that update job. Returns how many were added or promoted.
+        """
+        added = 0
+        with self._lock:
+            for item_id, market_name in items:
+                if job_id is not None:
+                    self._jobs.setdefault(item_id, set()).add(job_id)
+                queued_priority = self._queued.get(item_id)
+                if queued_priority is not None and queued_priority <= priority:
+                    continue
+                self._queued[item_id] = priority
+                self._queue.put((priority, next(self._order), item_id, market_name))
+                added += 1
+        if added:
+            self.start()
+        return added
+
+    def pending(self):
+        with self._lock:
+            return len(self._queued)
+
+    def start(self):
+        self._threads = [t for t in self._threads if t.is_alive()]
+        for i in range(len(self._threads), max(1, len(EGRESS_POOL.routes))):
+            t = threading.Thread(target=self._run, name=f"price-updater-{i+1}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _run(self):
+        while True:
+            priority, _, item_id, market_name = self._queue.get()
+            with self._lock:
+                # Skip entries that were promoted (re-queued with a better priority) or already done
+                if self._queued.get(item_id) != priority:
+                    continue
+
+            price, display, error = 0.0, market_name, "no price returned"
+            try:
+                price, display = get_steam_price_and_name(market_name)
+            except Exception as e:
+                error = str(e)
+                log_message(f"Background refresh failed for {market_name}: {e}", "ERROR")
+            finally:
+                with self._lock:
+                    self._queued.pop(item_id, None)
+                    jobs = self._jobs.pop(item_id, ())
+
+            if price > 0.0:
+                # Written in batches, together with the job checkpoints
+                price_writer.write(item_id, market_name, price, display, jobs)
+            else:
+                # Keep the cached price when a fetch fails, and back the item off
+                price_writer.write_failure(item_id)
+                for job_id in jobs:
+                    self._checkpoint(job_id, item_id, market_name, False, error)
+            self.results.put((item_id, market_name, price))
+
+            # Snapshot when the queue drains, or periodically if it never does
+            if self.pending() == 0 or snapshot_age() >= SNAPSHOT_MAX_INTERVAL:
+                price_writer.flush()
+                snapshot_after_update()
+
+    def _checkpoint(self, job_id, item_id, market_name, ok, error):
+        """Records one result in its update job; failures go back on the queue until they run out of attempts."""
+        try:
+            status = record_job_result(job_id, item_id, ok, error)
+            if status == "retry":
+                self.enqueue([(item_id, market_name)], PRIORITY_RETRY, job_id)
+            elif finish_job_if_complete(job_id):
+                snapshot_after_update(0)
+        except sqlite3.Error as e:
+            log_message(f"Could not checkpoint update job #{job_id}: {e}", "ERROR")
+
+price_updater = PriceUpdater()
+
+def run_update_job(job_id):
+    """Queues every pending / retry item of a run. Returns how many were queued."""
+    items = get_job_items(job_id)
+    if not items:
+        finish_job_if_complete(job_id)
+        return 0
+    price_updater.enqueue(items, PRIORITY_USER, job_id)
+    return len(items)
+
+def resume_update_jobs():
+    """Picks up runs interrupted by a restart. Returns the ids of the runs that were resumed."""
+    resumed = []
+    for job_id in get_running_jobs():
+        if run_update_job(job_id):
+            resumed.append(job_id)
+    return resumed
+
+def format_age(updated_at, now=None):
+    """Short age label for the table: '45s', '12m', '3h', '2d' or '—' if never fetched."""
+    if updated_at is None:
+        return "—"
+    age = max(0, int((now or time.time()) - updated_at))
+    if age < 60:
+        return f"{age}s"
+    if age < 3600:
+        return f"{age // 60}m"
+    if age < 86400:
+        return f"{age // 3600}h"
+    return f"{age // 86400}d"
+
+
+# --------------- Currency (cached FX rates) ---------------
+class FxRates:
+    """
+    Exchange rates from BASE_CURRENCY, cached in the fx_rates table for
+    FX_TTL_SECONDS. A refresh is a single request for every currency (or a
+    read of FX_RATES_FILE), so switching the display currency never
+    re-fetches item prices. `display` is the currency the views convert to;
+    switching it only reads the cache; refresh_async() fills the cache off
+    the caller's thread (the GUI), ensure() in place (the API's workers).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rates = {BASE_CURRENCY: 1.0}
+        self.fetched_at = 0
+        self._retry_at = 0.0
+        self._refresh_thread = None
+        self.display = BASE_CURRENCY
+        self.version = 0 # bumped when rates or the display currency change
+
+    def load(self):
+        """Reads the cached rates from the DB."""
+        conn = sqlite3.connect(DB)
+        c = conn.cursor()
+        c.execute("SELECT currency, rate, fetched_at FROM fx_rates")
+        rows = c.fetchall()
+        conn.close()
+        with self._lock:
+            self._rates = {BASE_CURRENCY: 1.0, **{cur: rate for cur, rate, _ in rows}}
+            self.fetched_at = min((ts for _, _, ts in rows), default=0)
+            self.version += 1
+
+    def is_stale(self):
+        return time.time() - self.fetched_at > FX_TTL_SECONDS
+
+    def has(self, currency):
+        with self._lock:
+            return currency in self._rates
+
+    def needs_refresh(self, currency=None):
+        """
+        True if `currency` is not cached or the cached rates expired (currency=None:
+        only if any non-base rate is cached at all). After a failed request this waits
+        FX_RETRY_SECONDS, except when the rates come from FX_RATES_FILE.
+        """
+        if currency == BASE_CURRENCY:
+            return False
+        with self._lock:
+            cached = currency in self._rates if currency else len(self._rates) > 1
+        if currency is None and not cached:
+            return False # nothing cached to keep fresh
+        if cached and not self.is_stale():
+            return False
+        return time.monotonic() >= self._retry_at or os.path.exists(FX_RATES_FILE)
+
+    def _read_rates(self):
+        """Returns ({currency: rate}, source) from FX_RATES_FILE if present, else from one request."""
+        if os.path.exists(FX_RATES_FILE):
+            with open(FX_RATES_FILE, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data.get("rates", data), FX_RATES_FILE
+        r = requests.get(FX_RATES_URL, headers=HEADERS, timeout=10)
+        r.raise_for_status()
+        return r.json()["rates"], FX_RATES_URL
+
+    def refresh(self):
+        """Replaces the cached rates. Returns False (keeping the old ones) when they could not be read."""
+        try:
+            rates, source = self._read_rates()
+            rates = {str(cur).upper(): float(rate) for cur, rate in rates.items() if float(rate) > 0}
+        except (OSError, ValueError, TypeError, KeyError, AttributeError, requests.exceptions.RequestException) as e:
+            log_message(f"Could not refresh exchange rates: {e}", "ERROR")
+            self._retry_at = time.monotonic() + FX_RETRY_SECONDS
+            return False
+
+        now = int(time.time())
+        conn = sqlite3.connect(DB)
+        with conn:
+            conn.execute("DELETE FROM fx_rates")
+            conn.executemany("INSERT INTO fx_rates (currency, rate, fetched_at, source) VALUES (?, ?, ?, ?)",
+                             ((cur, rate, now, source) for cur, rate in rates.items()))
+        conn.close()
+        with self._lock:
+            self._rates = {**rates, BASE_CURRENCY: 1.0}
+            self.fetched_at = now
+            self.version += 1
+        log_message(f"Loaded {len(rates)} exchange rate(s) from {source}")
+        return True
+
+    @property
+    def refreshing(self):
+        thread = self._refresh_thread
+        return thread is not None and thread.is_alive()
+
+    def refresh_async(self):
+        """Runs refresh() on a background thread unless one is already running."""
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self.refresh, name="fx-refresh", daemon=True)
+            self._refresh_thread.start()
+
+    def ensure(self, currency):
+        """Refreshes stale or missing rates in place, then returns the rate (blocks; not for the GUI thread)."""
+        if self.needs_refresh(currency):
+            self.refresh()
+        return self.rate(currency)
+
+    def rate(self, currency=None):
+        """Units of `currency` (default: the display currency) per 1 BASE_CURRENCY, from the cache."""
+        currency = currency or self.display
+        with self._lock:
+            rate = self._rates.get(currency)
+        if rate is None:
+            raise ValueError(f"No exchange rate for {currency}")
+        return rate
+
+    def set_display(self, currency):
+        """Switches the display currency from the cached rates (ValueError if none); expired ones refresh in the background."""
+        self.rate(currency)
+        self.display = currency
+        self.version += 1
+        if self.needs_refresh(currency):
+            self.refresh_async()
+
+    def convert(self, values, currency=None):
+        """BASE_CURRENCY amounts (scalar, sequence or nested rows) -> numpy array in `currency`."""
+        return np.asarray(values, dtype=np.float64) * self.rate(currency)
+
+    def symbol(self, currency=None):
+        currency = currency or self.display
+        return CURRENCY_SYMBOLS.get(currency, currency + " ")
+
+fx = FxRates()
+
+def convert_ohlc(rows, rate):
+    """Rollup rows [(bucket_start, open, high, low, close), ...] with the prices multiplied by rate."""
+    if not rows or rate == 1.0:
+        return rows
+    data = np.asarray(rows, dtype=np.float64)
+    data[:, 1:5] *= rate
+    return [(int(row[0]), *row[1:5]) for row in data.tolist()]
+
+
+# --------------- Table rows & exports (CSV / HTML) ---------------
+def get_page_positions(order_by="id", descending=False, limit=PAGE_SIZE, offset=0):
+    """One table page of Positions: sort order comes from the SQLite index, row data from the in-memory model."""
+    page = (portfolio.get(item_id) for item_id in get_page_ids(order_by, descending, limit, offset))
+    return [pos for pos in page if pos is not None]
+
+def money_matrix(positions, rate=1.0):
+    """(n, 5) array of buy_price, current_price, total_buy, total_value, profit, converted by rate."""
+    data = np.array([(p.buy_price, p.current_price, p.total_buy, p.total_value, p.profit) for p in positions],
+                    dtype=np.float64).reshape(-1, 5)
+    return data * rate
+
+def table_rows(page, now, rate=1.0):
+    """Formatted table cells for a page of Positions, money columns converted by rate in one pass."""
+    rows = []
+    for pos, (buy, price, total_buy, total_value, profit) in zip(page, money_matrix(page, rate).tolist()):
+        # Staleness indicator: cached prices past STALE_AFTER_SECONDS get a warning mark
+        updated_at = pos.price_updated_at
+        age = format_age(updated_at, now)
+        if updated_at is None or now - updated_at > STALE_AFTER_SECONDS:
+            age = f"⚠ {age}"
+        
+        rows.append((
+            pos.id, 
+            pos.market_name,  # ИСПОЛЬЗУЕМ ПОЛНЫЙ market_name
+            pos.qty, 
+            f"{buy:.2f}", 
+            f"{price:.2f}", 
+            age,
+            f"{total_buy:.2f}", 
+            f"{total_value:.2f}", 
+            f"{profit:+.2f}"
+        ))
+    return rows
+
+def export_csv(path, rows=None):
+    """Writes positions (default: the whole portfolio) in the CSV import format. Returns the row count."""
+    rows = portfolio.positions() if rows is None else rows
+    with open(path, "w", newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        # Header, corresponding to the import order
+        w.writerow(["market_name", "display_name", "qty", "buy_price", "current_price (Steam)"]) 
+        for pos in rows:
+            w.writerow([pos.market_name, pos.display_name, pos.qty, pos.buy_price, pos.current_price])
+    return len(rows)
+
+def build_html_report(rows, currency=None):
+    """Neon-styled HTML report of the given positions, with risk figures, in `currency` (default: display)."""
+    currency = currency or fx.display
+    money = money_matrix(rows, fx.rate(currency))
+    colors = REPORT_COLORS
+    # CSS for cyberpunk style
+    html_content = f"""
+    <!DOCTYPE html>
+    <html lang="en">
+    <head>
+        <meta charset="UTF-8">
+        <title>Steam Market Portfolio Report</title>
+        <style>
+            body {{
+                font-family: 'Consolas', monospace;
+                background-color: {colors['bg']};
+                color: {colors['text']};
+                padding: 20px;
+            }}
+            .header {{
+                color: {colors['accent']};
+                text-align: center;
+                border-bottom: 2px solid {colors['accent2']};
+                padding-bottom: 10px;
+                margin-bottom: 20px;
+            }}
+            table {{
+                width: 100%;
+                border-collapse: collapse;
+                margin-top: 20px;
+                border: 1px solid {colors['border']};
+            }}
+            th, td {{
+                padding: 12px 15px;
+                text-align: center;
+                border: 1px solid {colors['cell_border']};
+            }}
+            th {{
+                background-color: {colors['heading_bg']};
+                color: {colors['accent']};
+                font-size: 11px;
+            }}
+            tr:nth-child(even) {{
+                background-color: {colors['row_bg']};
+            }}
+            tr:nth-child(odd) {{
+                background-color: #1A2238; /* Slightly lighter dark */
+            }}
+            .profit-good {{ color: {colors['good']}; font-weight: bold; }}
+            .profit-bad {{ color: {colors['bad']}; font-weight: bold; }}
+            .total-row td {{
+                background-color: {colors['heading_bg']} !important;
+                color: {colors['accent2']};
+                font-weight: bold;
+                font-size: 12px;
+            }}
+        </style>
+    </head>
+    <body>
+        <h1 class="header">Steam Market Portfolio Report</h1>
+        <p style="color: {colors['dim']};">Date Created: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}</p>
+        <table>
+            <thead>
+                <tr>
+                    <th>ID</th>
+                    <th>Name</th>
+                    <th>Qty</th>
+                    <th>Buy Price ({currency})</th>
+                    <th>Current Steam Price ({currency})</th>
+                    <th>Total Cost ({currency})</th>
+                    <th>Total Steam Value ({currency})</th>
+                    <th>Profit ({currency})</th>
+                    <th>Volatility ({risk.ROLLING_WINDOW}d, ann.)</th>
+                    <th>Max Drawdown</th>
+                    <th>VaR {risk.VAR_LEVEL:.0%} (1d)</th>
+                    <th>Weight</th>
+                </tr>
+            </thead>
+            <tbody>
+    """
+    
+    # Totals from the converted columns
+    total_buy, total_now_steam = (float(v) for v in money[:, 2:4].sum(axis=0))
+    
+    # All items and the portfolio in one vectorized pass
+    report = get_risk_report()
+    no_risk = {"volatility": float("nan"), "max_drawdown": float("nan"), "var": float("nan"), "weight": float("nan")}
+    
+    for pos, (buy_price, current_price, total_buy_pos, total_now_steam_pos, profit_steam) in zip(rows, money.tolist()):
+        _id, market_name, qty = pos.id, pos.market_name, pos.qty
+        
+        profit_class = "profit-good" if profit_steam >= 0 else "profit-bad"
+        item_risk = report["items"].get(market_name, no_risk)
+        
+        html_content += f"""
+                <tr>
+                    <td>{_id}</td>
+                    <td style="text-align: left;">{market_name}</td> 
+                    <td>{qty}</td>
+                    <td>{buy_price:.2f}</td>
+                    <td>{current_price:.2f}</td>
+                    <td>{total_buy_pos:.2f}</td>
+                    <td>{total_now_steam_pos:.2f}</td>
+                    <td class="{profit_class}">{profit_steam:+.2f}</td>
+                    <td>{format_pct(item_risk["volatility"])}</td>
+                    <td>{format_pct(item_risk["max_drawdown"], signed=True)}</td>
+                    <td>{format_pct(item_risk["var"])}</td>
+                    <td>{format_pct(item_risk["weight"])}</td>
+                </tr>
+        """
+        
+    total_profit = total_now_steam - total_buy
+    port_risk = report["portfolio"]
+
+    html_content += f"""
+                <tr class="total-row">
+                    <td colspan="5" style="text-align: right;">TOTAL:</td>
+                    <td>{total_buy:.2f}</td>
+                    <td>{total_now_steam:.2f}</td>
+                    <td class="{'profit-good' if total_profit >= 0 else 'profit-bad'}">{total_profit:+.2f}</td>
+                    <td>{format_pct(port_risk["volatility"])}</td>
+                    <td>{format_pct(port_risk["max_drawdown"], signed=True)}</td>
+                    <td>{format_pct(port_risk["var"])}</td>
+                    <td>100.0%</td>
+                </tr>
+            </tbody>
+        </table>
+        <p style="color: {colors['dim']};">
+            Concentration (HHI): {port_risk["hhi"]:.4f} &mdash; effective number of positions: {port_risk["effective_n"]:.1f}
+            &mdash; history: {port_risk["days"]} day(s)
+        </p>
+    </body>
+    </html>
+    """
+    return html_content
+
+def export_html(path, rows=None, currency=None):
+    """Writes the HTML report for positions (default: the whole portfolio). Returns the row count."""
+    rows = portfolio.positions() if rows is None else rows
+    html_content = build_html_report(rows, currency)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(html_content)
+    return len(rows)
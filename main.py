@@ -1,21 +1,41 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import sqlite3
-import requests
 import re
-import csv
 import time
+import queue
+import threading
 import urllib.parse
 import os 
 from datetime import datetime
-import pandas as pd
-import numpy as np
 
 # --- IMPORTS FOR CHART ---
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 # ---------------------------
 
+# Storage, pricing and background updates live in core.py (no GUI there)
+import risk
+from core import (
+    # settings
+    ALERT_KINDS, ALERT_TOAST_MS, BASE_CURRENCY, CURRENCY_SYMBOLS, FX_RATES_FILE, JOB_CHECK_MS,
+    JOB_MAX_ATTEMPTS, JOB_REPEAT_CHOICES, PAGE_SIZE, PORTFOLIO_SCOPE, PRIORITY_STALE, PRIORITY_USER,
+    SORT_COLUMNS, STALE_CHECK_MS, STEAM_API_DELAY, UPDATER_POLL_MS, FETCH_MAX_WAIT,
+    # shared state
+    EGRESS_POOL, alert_engine, fx, portfolio, pq, price_updater, price_writer,
+    # storage & pricing
+    init_db, log_message, parse_price_str, format_pct, get_steam_price_and_name, RateLimited,
+    add_or_update_item, bulk_edit_items, delete_items, get_page_positions, get_stale_items, table_rows,
+    get_ohlc, convert_ohlc, get_risk_report,
+    add_alert, delete_alert, describe_alert, get_alerts,
+    # update runs
+    create_update_job, get_job_progress, get_latest_job, resume_update_jobs, retry_failed_items,
+    run_update_job, set_job_repeat, start_due_job,
+    # import / export
+    import_items_from_csv, import_steam_inventory, queue_unpriced, import_positions_parquet,
+    import_history_parquet, is_history_parquet, export_csv, export_html, export_positions_parquet,
+    export_history_parquet,
+)
+
 # --- Cyberpunk Color Palette (Purple-Cyan Neon) ---
 COLOR_BG_DARK = "#0F1626"       
 COLOR_PRIMARY_ACCENT = "#00FFFF" # Cyan Neon
@@ -40,257 +60,18 @@ COLOR_PROFIT_GOOD = "#00FFFF"
 COLOR_TAG_PROFIT_BG = "#001C1C"
 # -------------------------------------------
 
-DB = "portfolio.db"
-STEAM_APP = 730 # CS2 / CSGO app id
-# Safe delay to prevent Steam blocking
-STEAM_API_DELAY = 3.0 
-
-# --------------- DB -----------------
-def init_db():
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS items (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        market_name TEXT UNIQUE,
-        display_name TEXT,
-        qty INTEGER,
-        buy_price REAL,
-        current_price REAL
-    )
-    """)
-    conn.commit()
-    conn.close()
-
-def add_or_update_item(market_name, display_name, new_qty, new_buy_price, current_price): 
-    """
-    Adds a new item or updates an existing one, ADDING the new quantity 
-    and CALCULATING the new average buy price.
-    """
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    
-    # 1. Check for existence and get old data
-    c.execute("SELECT qty, buy_price FROM items WHERE market_name=?", (market_name,))
-    r = c.fetchone()
-    
-    if r:
-        # Item exists - Calculate new average price and total quantity
-        old_qty, old_buy_price = r
-        
-        # Ensure values are float/int for calculation (DB stores them as such, but good practice)
-        old_qty = old_qty or 0
-        old_buy_price = old_buy_price or 0.0
-        
-        # Total cost of old items
-        old_total_cost = old_qty * old_buy_price
-        
-        # Total cost of new items (the ones just bought)
-        new_total_cost = new_qty * new_buy_price
-        
-        # Calculate new totals
-        total_qty = old_qty + new_qty
-        total_cost = old_total_cost + new_total_cost
-        
-        # Calculate new average buy price
-        if total_qty > 0:
-            avg_buy_price = round(total_cost / total_qty, 6)
-        else:
-            # Should not happen if new_qty > 0, but safety first
-            avg_buy_price = 0.0 
-
-        # Update
-        c.execute("""
-            UPDATE items 
-            SET display_name=?, qty=?, buy_price=?, current_price=? 
-            WHERE market_name=?
-        """, (display_name, total_qty, avg_buy_price, current_price, market_name))
-        
-        message = f"Item updated! Total QTY: {total_qty}, Avg Buy Price: {avg_buy_price:.2f}"
-    else:
-        # Item does not exist - Insert
-        c.execute("""
-            INSERT INTO items (market_name, display_name, qty, buy_price, current_price)
-            VALUES (?, ?, ?, ?, ?)
-        """, (market_name, display_name, new_qty, new_buy_price, current_price))
-        
-        message = "New item added to portfolio."
-        
-    conn.commit()
-    conn.close()
-    return message
-
-def get_items():
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("SELECT id, market_name, display_name, qty, buy_price, current_price FROM items")
-    rows = c.fetchall()
-    conn.close()
-    return rows
-
-def get_item_by_id(item_id):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("SELECT market_name, display_name, qty, buy_price, current_price FROM items WHERE id=?", (item_id,))
-    row = c.fetchone()
-    conn.close()
-    return row # (market_name, display_name, qty, buy_price, current_price)
-
-def delete_item(item_id):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("DELETE FROM items WHERE id=?", (item_id,))
-    conn.commit()
-    conn.close()
-
-def import_items_from_csv(file_path):
-    """
-    Imports items from a CSV file. 
-    Expects CSV with columns: market_name, display_name, qty, buy_price, current_price
-    NOTE: CSV Import logic is simplified; it OVERWRITES qty and buy_price 
-    if the item exists, based on the CSV data.
-    """
-    imported_count = 0
-    updated_count = 0
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-
-    try:
-        with open(file_path, 'r', newline='', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            header = next(reader) # Skip header
-
-            # Indices corresponding to export order
-            COL_MARKET_NAME = 0
-            COL_DISPLAY_NAME = 1
-            COL_QTY = 2
-            COL_BUY_PRICE = 3
-            COL_CURRENT_PRICE = 4
-            
-            for i, row in enumerate(reader):
-                if len(row) < 5:
-                    log_message(f"Skipping row {i+2}: not enough columns", "WARNING")
-                    continue
-                
-                # Parsing and cleaning data
-                market_name = row[COL_MARKET_NAME].strip()
-                display_name = row[COL_DISPLAY_NAME].strip()
-                
-                try:
-                    qty = int(row[COL_QTY].strip())
-                    buy_price = parse_price_str(row[COL_BUY_PRICE])
-                    current_price = parse_price_str(row[COL_CURRENT_PRICE])
-                except ValueError as e:
-                    log_message(f"Skipping row {i+2} ({market_name}): invalid number format - {e}", "ERROR")
-                    continue
-                
-                if not market_name:
-                    log_message(f"Skipping row {i+2}: empty market_name", "WARNING")
-                    continue
-
-                # Check for existence and update/insert
-                c.execute("SELECT id FROM items WHERE market_name=?", (market_name,))
-                if c.fetchone():
-                    # Update (Overwrite, as CSV typically contains the desired final state)
-                    c.execute("""
-                        UPDATE items SET display_name=?, qty=?, buy_price=?, current_price=? WHERE market_name=?
-                    """, (display_name, qty, buy_price, current_price, market_name))
-                    updated_count += 1
-                else:
-                    # Insert
-                    c.execute("""
-                        INSERT INTO items (market_name, display_name, qty, buy_price, current_price)
-                        VALUES (?, ?, ?, ?, ?)
-                    """, (market_name, display_name, qty, buy_price, current_price))
-                    imported_count += 1
-
-        conn.commit()
-        return imported_count, updated_count
-        
-    except FileNotFoundError:
-        messagebox.showerror("Import Error", "File not found.")
-        return 0, 0
-    except Exception as e:
-        messagebox.showerror("Import Error", f"An error occurred while reading the file: {e}")
-        return 0, 0
-    finally:
-        conn.close()
-
-
-# --------------- Helpers (Steam only) ---------------
-
-HEADERS = {"User-Agent": "Mozilla/50.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"}
-
-def log_message(message, level="INFO"):
-    """Logs messages with a timestamp."""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{timestamp}] [{level}] {message}")
-
-def parse_price_str(price_str):
-    if not price_str:
-        return 0.0
-    s = price_str
-    s = re.sub(r'[^\d\.,]', '', s) 
-    if s.count(',') > 0 and s.count('.') > 0:
-        s = s.replace(',', '')
-    elif s.count(',') > 0 and s.count('.') == 0:
-        s = s.replace(',', '.')
-    
-    try:
-        # If the string contains only a number
-        return round(float(s), 6) 
-    except:
-        return 0.0
-
-def get_steam_price_and_name(market_hash_name):
-    """Fetches price and name from Steam API."""
-    price = 0.0
-    display_name = market_hash_name 
-    
-    url_price = "https://steamcommunity.com/market/priceoverview/"
-    params = {
-        "appid": STEAM_APP,
-        "currency": 1, # 1 = USD
-        "market_hash_name": market_hash_name
-    }
-    
-    log_message(f"START PRICE REQUEST: {market_hash_name}")
-
-    try:
-        r = requests.get(url_price, params=params, headers=HEADERS, timeout=15)
-        
-        if r.status_code == 200:
-            data = r.json()
-            if data.get('success'): 
-                price_str = data.get("lowest_price") or data.get("median_price") or None
-                price = parse_price_str(price_str) if price_str else 0.0
-            
-                display_name = market_hash_name
-                if ' | ' in market_hash_name:
-                     d = market_hash_name.split(' | ')[-1]
-                     display_name = re.sub(r'\s*\([^)]+\)$', '', d).strip() 
-                     
-        elif r.status_code == 429:
-             log_message(f"RATE LIMIT EXCEEDED (429) for {market_hash_name}. Increase STEAM_API_DELAY!", "ERROR")
-        else:
-             log_message(f"HTTP Error {r.status_code} for {market_hash_name}", "ERROR")
-
-    except requests.exceptions.RequestException as e:
-        log_message(f"Price request FAILED for {market_hash_name}: {e}", "ERROR")
-    except Exception as e:
-        log_message(f"General error in price request for {market_hash_name}: {e}", "CRITICAL")
-          
-    # Return price and name
-    return price, display_name
-
-
-# -----------------------------------------------------------------
-
 
 # ---------------- GUI ----------------
 init_db()
+portfolio.load()
+alert_engine.load()
+fx.load()
+# Stale cached rates refresh off the Tk thread; nothing is requested if none were ever cached
+if fx.needs_refresh():
+    fx.refresh_async()
 root = tk.Tk()
-root.title("Steam Market Portfolio - Cyberpunk Edition")
+APP_TITLE = "Steam Market Portfolio - Cyberpunk Edition"
+root.title(APP_TITLE)
 # Set fixed window size 900x900
 root.geometry("900x900") 
 root.resizable(False, False) # Disable resizing
@@ -429,17 +210,31 @@ btn_show_chart_selected = ttk.Button(frm_chart_button,
                                      width=30, 
                                      style='Graph.TButton') 
 btn_show_chart_selected.grid(row=0, column=0, padx=6, pady=2, sticky='ew')
+
+# BUTTON FOR PORTFOLIO VALUE HISTORY
+frm_chart_button.grid_columnconfigure(1, weight=1)
+btn_show_chart_portfolio = ttk.Button(frm_chart_button,
+                                      text="PORTFOLIO VALUE HISTORY 📈",
+                                      width=30,
+                                      style='Graph.TButton')
+btn_show_chart_portfolio.grid(row=0, column=1, padx=6, pady=2, sticky='ew')
+
+# BUTTON FOR PRICE ALERTS OF SELECTED ITEM
+btn_alerts = ttk.Button(frm_chart_button, text="ALERTS 🔔", width=12, style='Graph.TButton')
+btn_alerts.grid(row=0, column=2, padx=6, pady=2, sticky='ew')
 # =================================================================
 
 
 # TABLE
-cols = ("ID", "Name", "Qty", "BuyPrice", "SteamPrice", "TotalBuy", "TotalSteam", "ProfitSteam")
-tree = ttk.Treeview(root, columns=cols, show='headings', height=15, style='Treeview') 
+cols = ("ID", "Name", "Qty", "BuyPrice", "SteamPrice", "Age", "TotalBuy", "TotalSteam", "ProfitSteam")
+tree = ttk.Treeview(root, columns=cols, show='headings', height=13, style='Treeview') 
 
 for c in cols:
     tree.heading(c, text=c)
     if c == "Name":
-        tree.column(c, anchor='center', width=250)
+        tree.column(c, anchor='center', width=190)
+    elif c == "Age":
+        tree.column(c, anchor='center', width=60)
     elif c in ("BuyPrice", "SteamPrice"):
         tree.column(c, anchor='center', width=100)
     elif c in ("TotalBuy", "TotalSteam", "ProfitSteam"):
@@ -447,7 +242,25 @@ for c in cols:
     else:
         tree.column(c, anchor='center', width=50) 
         
-tree.pack(fill='both', expand=True, padx=8, pady=(10,8))
+tree.pack(fill='both', expand=True, padx=8, pady=(10,0))
+
+# PAGER (table is filled one page at a time)
+pager = ttk.Frame(root, style='TFrame', padding=(10,2,10,2))
+pager.pack(fill='x', padx=8)
+
+btn_prev_page = ttk.Button(pager, text="◀ Prev", width=10, style='C.TButton')
+lbl_page = ttk.Label(pager, text="Page 1/1", style='TLabel')
+lbl_refresh_status = ttk.Label(pager, text="", style='TLabel', foreground=COLOR_TEXT_DIM)
+btn_next_page = ttk.Button(pager, text="Next ▶", width=10, style='C.TButton')
+# Display currency: prices stay in BASE_CURRENCY, the views convert with cached rates
+currency_var = tk.StringVar(value=BASE_CURRENCY)
+cmb_currency = ttk.Combobox(pager, textvariable=currency_var, values=list(CURRENCY_SYMBOLS), state='readonly', width=5)
+
+btn_prev_page.pack(side='left', padx=6)
+lbl_page.pack(side='left', padx=6, expand=True)
+btn_next_page.pack(side='right', padx=6)
+cmb_currency.pack(side='right', padx=6)
+lbl_refresh_status.pack(side='right', padx=6)
 
 tree.tag_configure('profit', background=COLOR_TAG_PROFIT_BG, foreground=COLOR_PROFIT_GOOD)
 tree.tag_configure('loss', background='#201212', foreground=COLOR_PROFIT_BAD)
@@ -456,7 +269,8 @@ tree.tag_configure('loss', background='#201212', foreground=COLOR_PROFIT_BAD)
 bottom = ttk.Frame(root, style='TFrame', padding=(10,5,10,5))
 bottom.pack(fill='x', padx=8, pady=6)
 
-btn_update = ttk.Button(bottom, text="Update All Steam Prices", width=25, style='C.TButton')
+UPDATE_ALL_TEXT = "Update All Steam Prices"
+btn_update = ttk.Button(bottom, text=UPDATE_ALL_TEXT, width=25, style='C.TButton')
 btn_import = ttk.Button(bottom, text="Import from CSV", width=18, style='C.TButton') 
 btn_export_csv = ttk.Button(bottom, text="Export to CSV", width=18, style='C.TButton') 
 btn_export_html = ttk.Button(bottom, text="Export to HTML", width=18, style='C.TButton') 
@@ -469,6 +283,40 @@ btn_export_html.pack(side='left', padx=6)
 # Author button packed last on the right
 btn_author.pack(side='right', padx=6) 
 
+# BOTTOM PANEL, 2nd row (Parquet / inventory import, selection actions)
+bottom_extra = ttk.Frame(root, style='TFrame', padding=(10,0,10,5))
+bottom_extra.pack(fill='x', padx=8, pady=(0,6))
+
+btn_import_parquet = ttk.Button(bottom_extra, text="Import Parquet", width=18, style='C.TButton')
+btn_export_parquet = ttk.Button(bottom_extra, text="Export Parquet", width=18, style='C.TButton')
+
+btn_import_inventory = ttk.Button(bottom_extra, text="Import Inventory", width=18, style='C.TButton')
+
+btn_import_parquet.pack(side='left', padx=6)
+btn_export_parquet.pack(side='left', padx=6)
+btn_import_inventory.pack(side='left', padx=6)
+
+# Actions on the current (multi-)selection
+btn_edit_selected = ttk.Button(bottom_extra, text="Edit Selected", width=16, style='C.TButton')
+btn_refresh_selected = ttk.Button(bottom_extra, text="Refresh Selected", width=18, style='C.TButton')
+
+btn_edit_selected.pack(side='right', padx=6)
+btn_refresh_selected.pack(side='right', padx=6)
+
+# BOTTOM PANEL, 3rd row (Update All runs: retry, schedule, last run status)
+bottom_jobs = ttk.Frame(root, style='TFrame', padding=(10,0,10,5))
+bottom_jobs.pack(fill='x', padx=8, pady=(0,6))
+
+btn_retry_failed = ttk.Button(bottom_jobs, text="Retry Failed", width=18, style='C.TButton')
+repeat_var = tk.StringVar(value="Once")
+cmb_repeat = ttk.Combobox(bottom_jobs, textvariable=repeat_var, values=list(JOB_REPEAT_CHOICES), state='readonly', width=12)
+lbl_job_status = ttk.Label(bottom_jobs, text="", style='TLabel', foreground=COLOR_TEXT_DIM)
+
+btn_retry_failed.pack(side='left', padx=6)
+ttk.Label(bottom_jobs, text="Update All:", style='TLabel').pack(side='left', padx=(12,4))
+cmb_repeat.pack(side='left', padx=(0,6))
+lbl_job_status.pack(side='right', padx=6)
+
 # TOTALS PANEL
 totals_frame = ttk.Frame(root, style='TFrame', padding=(10,10,10,10), relief='solid', borderwidth=1)
 totals_frame.pack(fill='x', padx=8, pady=6)
@@ -487,68 +335,196 @@ lbl_total_profit_steam.pack(side='right', padx=10, fill='x', expand=True)
 fetched_market_name = None
 fetched_steam_price = 0.0
 fetched_display_name = "" 
+# Results of the manual Fetch, which runs on a worker thread: (market, price, display, error)
+fetch_results = queue.Queue()
+
+# Update All run (update job) being tracked, None when idle
+active_job_id = None
+# price_writer batches already reflected in the table
+seen_price_flushes = 0
+# fx.version already reflected in the table
+seen_fx_version = fx.version
+# Currency picked before its rates were loaded, applied once fx.refresh_async() finishes
+pending_currency = None
+
+# table view state
+sort_column = "ID"
+sort_descending = False
+current_page = 0
 
 
 # ------------- GUI FUNCTIONS ---------------
 def refresh_table():
+    global current_page
     for r in tree.get_children():
         tree.delete(r)
 
-    rows = get_items() 
-    total_now_steam = 0.0
-    total_buy = 0.0
+    # Totals cover the whole portfolio, not just the visible page
+    item_count, total_buy, total_now_steam = portfolio.totals()
+    rate, sym = fx.rate(), fx.symbol()
+    total_buy, total_now_steam = (float(v) for v in fx.convert([total_buy, total_now_steam]))
+
+    page_count = max(1, -(-item_count // PAGE_SIZE))
+    current_page = min(current_page, page_count - 1)
+    lbl_page.config(text=f"Page {current_page + 1}/{page_count} ({item_count} items)")
+    btn_prev_page.config(state=tk.NORMAL if current_page > 0 else tk.DISABLED)
+    btn_next_page.config(state=tk.NORMAL if current_page < page_count - 1 else tk.DISABLED)
+
+    page = get_page_positions(SORT_COLUMNS[sort_column], sort_descending, PAGE_SIZE, current_page * PAGE_SIZE)
     
-    for it in rows:
-        _id, market_name, display_name, qty, buy_price, current_price = it 
-        
-        qty = qty or 0
-        buy_price = buy_price or 0.0
-        current_price = current_price or 0.0 
-        
-        total_now_steam_pos = current_price * qty
-        total_buy_pos = buy_price * qty
-        
-        profit_steam = total_now_steam_pos - total_buy_pos
-        
-        total_now_steam += total_now_steam_pos
-        total_buy += total_buy_pos
-        
-        vals = (
-            _id, 
-            market_name,  # ИСПОЛЬЗУЕМ ПОЛНЫЙ market_name
-            qty, 
-            f"{buy_price:.2f}", 
-            f"{current_price:.2f}", 
-            f"{total_buy_pos:.2f}", 
-            f"{total_now_steam_pos:.2f}", 
-            f"{profit_steam:+.2f}"
-        )
-        
+    now = time.time()
+    for pos, values in zip(page, table_rows(page, now, rate)):
+        _id = pos.id
+        profit_steam = pos.profit
         tag = 'profit' if profit_steam > 0 else 'loss' if profit_steam < 0 else ''
         
         item_id_str = f'item_{_id}'
-        tree.insert("", tk.END, iid=item_id_str, values=vals, tags=(tag,))
+        tree.insert("", tk.END, iid=item_id_str, values=values, tags=(tag,))
         
 
     # footer
     total_profit_steam = total_now_steam - total_buy
-    footer_vals = ("", "Totals:", "", "", "", f"{total_buy:.2f}", f"{total_now_steam:.2f}", f"{total_profit_steam:+.2f}")
+    footer_vals = ("", "Totals:", "", "", "", "", f"{total_buy:.2f}", f"{total_now_steam:.2f}", f"{total_profit_steam:+.2f}")
     tree.insert("", tk.END, values=footer_vals, tags=('totals_row',))
     style.configure('Treeview', rowheight=30)
     tree.tag_configure('totals_row', background=COLOR_TABLE_HEADING_BG, foreground=COLOR_PRIMARY_ACCENT, font=('Consolas', 10, 'bold'))
 
     # UPDATE TOTALS LABELS
-    lbl_total_buy.config(text=f"TOTAL COST: ${total_buy:.2f}")
-    lbl_total_now_steam.config(text=f"CURRENT STEAM VALUE: ${total_now_steam:.2f}")
+    lbl_total_buy.config(text=f"TOTAL COST: {sym}{total_buy:.2f}")
+    lbl_total_now_steam.config(text=f"CURRENT STEAM VALUE: {sym}{total_now_steam:.2f}")
     
     if total_profit_steam >= 0:
-        lbl_total_profit_steam.config(text=f"STEAM PROFIT: ${total_profit_steam:+.2f}", foreground=COLOR_PRIMARY_ACCENT)
+        lbl_total_profit_steam.config(text=f"STEAM PROFIT: {sym}{total_profit_steam:+.2f}", foreground=COLOR_PRIMARY_ACCENT)
     else:
-        lbl_total_profit_steam.config(text=f"STEAM PROFIT: ${total_profit_steam:+.2f}", foreground=COLOR_PROFIT_BAD)
+        lbl_total_profit_steam.config(text=f"STEAM PROFIT: {sym}{total_profit_steam:+.2f}", foreground=COLOR_PROFIT_BAD)
 
 
+def on_currency_changed(event=None):
+    """Switches the display currency from cached rates; missing rates load in the background first."""
+    global pending_currency
+    code = currency_var.get()
+    if fx.has(code):
+        pending_currency = None
+        apply_currency(code)
+        return
+    # Keep showing the current currency until the rates arrive (poll_price_updater applies it)
+    pending_currency = code
+    currency_var.set(fx.display)
+    fx.refresh_async()
+
+def apply_currency(code):
+    fx.set_display(code)
+    currency_var.set(code)
+    log_message(f"Display currency: {code} (1 {BASE_CURRENCY} = {fx.rate():.4f} {code})")
+    refresh_table()
+
+def apply_pending_currency():
+    """Finishes a currency switch that waited for the exchange rates."""
+    global pending_currency
+    code, pending_currency = pending_currency, None
+    if fx.has(code):
+        apply_currency(code)
+    else:
+        messagebox.showerror("Currency", f"No exchange rate for {code}. Check the connection or provide {FX_RATES_FILE}.")
+
+
+def poll_price_updater():
+    """Collects background refresh results on the Tk thread and repaints if anything changed."""
+    global seen_price_flushes, seen_fx_version
+    # A committed price batch changes the SQL sort order too
+    changed = price_writer.flushes != seen_price_flushes or fx.version != seen_fx_version
+    seen_price_flushes = price_writer.flushes
+    seen_fx_version = fx.version
+    while True:
+        try:
+            price_updater.results.get_nowait()
+        except queue.Empty:
+            break
+        changed = True
+    if changed:
+        refresh_table()
+
+    if active_job_id is not None:
+        # Progress comes from the job's checkpoints, so a resumed run counts right too
+        progress = get_job_progress(active_job_id)
+        remaining = progress.get("pending", 0) + progress.get("retry", 0)
+        if remaining:
+            total = sum(progress.values())
+            root.title(f"{APP_TITLE} - Updating: {total - remaining}/{total}")
+        else:
+            finish_update_all(progress)
+
+    while True:
+        try:
+            show_alert_toast(alert_engine.events.get_nowait())
+        except queue.Empty:
+            break
+
+    while True:
+        try:
+            apply_fetch_result(*fetch_results.get_nowait())
+        except queue.Empty:
+            break
+
+    if pending_currency is not None and not fx.refreshing:
+        apply_pending_currency()
+
+    pending = price_updater.pending()
+    if pending_currency is not None:
+        lbl_refresh_status.config(text=f"Loading {pending_currency} exchange rate...")
+    else:
+        lbl_refresh_status.config(text=f"Refreshing {pending} stale price(s)..." if pending else "")
+    root.after(UPDATER_POLL_MS, poll_price_updater)
+
+def schedule_update_jobs():
+    """Starts repeating Update All runs when they are due, then re-arms itself."""
+    if active_job_id is None:
+        job_id = start_due_job()
+        if job_id is not None:
+            log_message(f"Scheduled update run #{job_id} started")
+            run_update_job(job_id)
+            track_update_job(job_id)
+    root.after(JOB_CHECK_MS, schedule_update_jobs)
+
+def schedule_stale_refresh():
+    """Queues every stale item for background refresh, then re-arms itself."""
+    stale = get_stale_items()
+    if stale:
+        added = price_updater.enqueue(stale, PRIORITY_STALE)
+        if added:
+            log_message(f"Queued {added} stale item(s) for background refresh")
+    root.after(STALE_CHECK_MS, schedule_stale_refresh)
+
+def update_heading_labels():
+    """Marks the sorted column with an arrow."""
+    for c in cols:
+        arrow = (" ▼" if sort_descending else " ▲") if c == sort_column else ""
+        tree.heading(c, text=c + arrow)
+
+def on_sort(column):
+    """Heading click: sort by column, clicking again flips the direction."""
+    global sort_column, sort_descending, current_page
+    if column == sort_column:
+        sort_descending = not sort_descending
+    else:
+        sort_column = column
+        sort_descending = column not in ("ID", "Name") # numbers: biggest first
+    current_page = 0
+    update_heading_labels()
+    refresh_table()
+
+def on_prev_page():
+    global current_page
+    if current_page > 0:
+        current_page -= 1
+        refresh_table()
+
+def on_next_page():
+    global current_page
+    current_page += 1 # refresh_table clamps to the last page
+    refresh_table()
+
 def on_fetch():
-    global fetched_market_name, fetched_steam_price, fetched_display_name
     text = entry_market.get().strip()
     if not text:
         messagebox.showwarning("Error", "Enter market_hash_name or part of the URL")
@@ -559,9 +535,31 @@ def on_fetch():
         market = urllib.parse.unquote(m.group(1))
     else:
         market = text
-        
-    price, display = get_steam_price_and_name(market)
-    
+
+    # The request may wait for a rate budget, so it runs off the Tk thread;
+    # poll_price_updater hands the result to apply_fetch_result
+    btn_fetch.config(state=tk.DISABLED)
+    threading.Thread(target=fetch_in_background, args=(market,), name="manual-fetch", daemon=True).start()
+
+def fetch_in_background(market):
+    try:
+        # Explicit fetch: no cached quote, and no waiting minutes for a rested route
+        price, display = get_steam_price_and_name(market, fresh=True, max_wait=FETCH_MAX_WAIT)
+        fetch_results.put((market, price, display, None))
+    except Exception as e:
+        fetch_results.put((market, 0.0, market, e))
+
+def apply_fetch_result(market, price, display, error):
+    global fetched_market_name, fetched_steam_price, fetched_display_name
+    btn_fetch.config(state=tk.NORMAL)
+    if isinstance(error, RateLimited):
+        messagebox.showwarning("Rate Limited", f"Steam is rate limiting requests right now.\n{error}.")
+        return
+    if error is not None:
+        log_message(f"Manual fetch failed for {market}: {error}", "ERROR")
+        messagebox.showerror("Error", f"Could not fetch {market}: {error}")
+        return
+
     fetched_market_name = market
     fetched_steam_price = price
     fetched_display_name = display
@@ -572,8 +570,6 @@ def on_fetch():
     entry_buy.delete(0, tk.END)
     entry_buy.insert(0, f"{price:.2f}") 
     
-    time.sleep(STEAM_API_DELAY) 
-    
     if price > 0.0:
         messagebox.showinfo("Done", f"Fetched: {display}\nSteam Price: {price:.2f} USD")
     else:
@@ -616,65 +612,151 @@ def on_add():
     messagebox.showinfo("Operation Complete", message)
 
 def on_update_all():
+    """Starts a checkpointed update run over every item; progress is tracked in poll_price_updater."""
+    if active_job_id is not None:
+        return
     
-    original_btn_text = btn_update.cget("text")
-    btn_update.config(state=tk.DISABLED, text="Updating... ⏳") 
-    root.update()
-    
-    rows = get_items()
+    rows = portfolio.positions()
     if not rows:
         messagebox.showinfo("Update", "No items in the database")
-        btn_update.config(state=tk.NORMAL, text=original_btn_text)
         return
     
-    updated_count = 0
-    total_items = len(rows)
-    log_message(f"STARTING BATCH UPDATE for {total_items} items. Delay per item: {STEAM_API_DELAY}s")
-    
-    for i, it in enumerate(rows):
-        _id, market_name, _, qty, buy_price, current_price = it 
-        
-        root.title(f"Steam Market Portfolio - Updating: {i+1}/{total_items} ({market_name})")
-        
-        if i > 0: 
-            time.sleep(STEAM_API_DELAY) 
-        
-        price, display = get_steam_price_and_name(market_name)
-        
-        conn = sqlite3.connect(DB)
-        c = conn.cursor()
-        # Только обновляем текущую цену и display_name, остальные данные не трогаем
-        c.execute("UPDATE items SET current_price=?, display_name=? WHERE id=?", (price, display, _id))
-        conn.commit()
-        conn.close()
-        
-        if price > 0.0:
-              updated_count += 1
-              
-        refresh_table()
-        root.update_idletasks()
-
-    log_message("BATCH UPDATE FINISHED")
+    job_id = create_update_job(((pos.id, pos.market_name) for pos in rows), JOB_REPEAT_CHOICES[repeat_var.get()])
+    routes = EGRESS_POOL.healthy_count()
+    log_message(f"STARTING BATCH UPDATE #{job_id} for {len(rows)} items over {routes} route(s). Delay per item: {STEAM_API_DELAY}s")
+    run_update_job(job_id)
+    track_update_job(job_id)
+
+def on_retry_failed():
+    """Re-runs only the items that failed in the last update run."""
+    if active_job_id is not None:
+        messagebox.showinfo("Retry Failed", "An update run is still in progress.")
+        return
+    job = get_latest_job()
+    count = retry_failed_items(job[0]) if job else 0
+    if not count:
+        messagebox.showinfo("Retry Failed", "The last update run has no failed items.")
+        return
+    log_message(f"Retrying {count} failed item(s) of update run #{job[0]}")
+    run_update_job(job[0])
+    track_update_job(job[0])
+
+def on_repeat_changed(event=None):
+    """Applies the chosen repeat interval to the latest run (the next Update All uses it too)."""
+    job = get_latest_job()
+    if job:
+        set_job_repeat(job[0], JOB_REPEAT_CHOICES[repeat_var.get()])
+    update_job_status_label()
+
+def track_update_job(job_id):
+    """Follows a queued run's progress in the title bar."""
+    global active_job_id
+    active_job_id = job_id
+    btn_update.config(state=tk.DISABLED, text="Updating... ⏳")
+    btn_retry_failed.config(state=tk.DISABLED)
+    lbl_job_status.config(text=f"Run #{job_id} in progress")
+
+def update_job_status_label():
+    """Shows the outcome of the last run and when the next scheduled one is due."""
+    job = get_latest_job()
+    if job is None:
+        lbl_job_status.config(text="")
+        return
+    job_id, status, finished_at, repeat_interval, next_run_at = job
+    if status == "running":
+        text = f"Run #{job_id} in progress"
+    else:
+        progress = get_job_progress(job_id)
+        text = f"Last run #{job_id}: {progress.get('done', 0)} updated, {progress.get('failed', 0)} failed"
+        if next_run_at:
+            text += f" | next run {datetime.fromtimestamp(next_run_at).strftime('%d.%m %H:%M')}"
+    lbl_job_status.config(text=text)
+
+def finish_update_all(progress):
+    global active_job_id
+    log_message(f"BATCH UPDATE #{active_job_id} FINISHED")
+    active_job_id = None
     
-    root.title("Steam Market Portfolio - Cyberpunk Edition")
-    btn_update.config(state=tk.NORMAL, text=original_btn_text)
+    root.title(APP_TITLE)
+    btn_update.config(state=tk.NORMAL, text=UPDATE_ALL_TEXT)
+    btn_retry_failed.config(state=tk.NORMAL)
+    update_job_status_label()
     refresh_table()
-    messagebox.showinfo("Update", f"Steam prices for all items updated. Successfully updated prices: {updated_count} out of {total_items}.")
+    done, failed = progress.get("done", 0), progress.get("failed", 0)
+    message = f"Steam prices for all items updated. Successfully updated prices: {done} out of {sum(progress.values())}."
+    if failed:
+        message += f"\n{failed} item(s) failed after {JOB_MAX_ATTEMPTS} attempts - use \"Retry Failed\" to try them again."
+    messagebox.showinfo("Update", message)
 
 def on_export_csv():
     """Export to CSV."""
     path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")], title="Save portfolio as CSV")
     if not path:
         return
-    rows = get_items()
-    with open(path, "w", newline='', encoding='utf-8') as f:
-        w = csv.writer(f)
-        # Header, corresponding to the import order
-        w.writerow(["market_name", "display_name", "qty", "buy_price", "current_price (Steam)"]) 
-        for r in rows:
-            _, market_name, display_name, qty, buy_price, current_price = r 
-            w.writerow([market_name, display_name, qty, buy_price, current_price])
-    messagebox.showinfo("Export", f"Exported {len(rows)} rows to {path}")
+    count = export_csv(path)
+    messagebox.showinfo("Export", f"Exported {count} rows to {path}")
+
+def on_export_parquet():
+    """Export positions and price history to Parquet (history goes to <name>_history.parquet)."""
+    if pq is None:
+        messagebox.showerror("Parquet Export", "Parquet support requires pyarrow (pip install pyarrow).")
+        return
+    path = filedialog.asksaveasfilename(defaultextension=".parquet", filetypes=[("Parquet files", "*.parquet")], title="Save portfolio as Parquet")
+    if not path:
+        return
+    history_path = os.path.splitext(path)[0] + "_history.parquet"
+    try:
+        positions = export_positions_parquet(path)
+        history = export_history_parquet(history_path)
+    except Exception as e:
+        messagebox.showerror("Parquet Export", f"Could not export: {e}")
+        return
+    messagebox.showinfo("Parquet Export", f"Exported {positions} positions to {path}\nExported {history} history rows to {history_path}")
+
+def on_import_parquet():
+    """Import a positions or price history Parquet file (detected by its columns)."""
+    if pq is None:
+        messagebox.showerror("Parquet Import", "Parquet support requires pyarrow (pip install pyarrow).")
+        return
+    path = filedialog.askopenfilename(defaultextension=".parquet", filetypes=[("Parquet files", "*.parquet")])
+    if not path:
+        return
+    try:
+        if is_history_parquet(path):
+            rows = import_history_parquet(path)
+            message = f"Price history rows imported: {rows}"
+        else:
+            imported, updated, skipped = import_positions_parquet(path)
+            message = f"New items added: {imported}\nExisting items updated: {updated}"
+            if skipped:
+                message += f"\nRows skipped (no market name): {skipped}"
+    except Exception as e:
+        messagebox.showerror("Parquet Import", f"An error occurred while reading the file: {e}")
+        return
+    refresh_table()
+    messagebox.showinfo("Import Complete", message)
+
+def on_import_inventory():
+    """Import a saved Steam inventory JSON; unique unpriced items go to the background updater."""
+    path = filedialog.askopenfilename(defaultextension=".json", filetypes=[("Steam inventory JSON", "*.json")])
+    if not path:
+        return
+    try:
+        imported, updated, skipped, names = import_steam_inventory(path)
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        messagebox.showerror("Inventory Import", f"Could not read inventory file: {e}")
+        return
+
+    queued = queue_unpriced(names)
+
+    refresh_table()
+    messagebox.showinfo(
+        "Inventory Import",
+        f"New items added: {imported}\n"
+        f"Existing items updated: {updated}\n"
+        f"Skipped (not marketable / other games): {skipped}\n"
+        f"Queued for pricing: {queued}"
+    )
 
 def on_export_html():
     """Export item list to an HTML file."""
@@ -686,134 +768,14 @@ def on_export_html():
     if not path:
         return
 
-    rows = get_items() 
+    rows = portfolio.positions()
     if not rows:
         messagebox.showinfo("HTML Export", "Portfolio is empty. Nothing to export.")
         return
-        
-    # CSS for cyberpunk style
-    html_content = f"""
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <title>Steam Market Portfolio Report</title>
-        <style>
-            body {{
-                font-family: 'Consolas', monospace;
-                background-color: {COLOR_BG_DARK};
-                color: {COLOR_TEXT_LIGHT};
-                padding: 20px;
-            }}
-            .header {{
-                color: {COLOR_PRIMARY_ACCENT};
-                text-align: center;
-                border-bottom: 2px solid {COLOR_SECONDARY_ACCENT};
-                padding-bottom: 10px;
-                margin-bottom: 20px;
-            }}
-            table {{
-                width: 100%;
-                border-collapse: collapse;
-                margin-top: 20px;
-                border: 1px solid {COLOR_BORDER};
-            }}
-            th, td {{
-                padding: 12px 15px;
-                text-align: center;
-                border: 1px solid {COLOR_INPUT_BG};
-            }}
-            th {{
-                background-color: {COLOR_TABLE_HEADING_BG};
-                color: {COLOR_PRIMARY_ACCENT};
-                font-size: 11px;
-            }}
-            tr:nth-child(even) {{
-                background-color: {COLOR_TABLE_BG};
-            }}
-            tr:nth-child(odd) {{
-                background-color: #1A2238; /* Slightly lighter dark */
-            }}
-            .profit-good {{ color: {COLOR_PROFIT_GOOD}; font-weight: bold; }}
-            .profit-bad {{ color: {COLOR_PROFIT_BAD}; font-weight: bold; }}
-            .total-row td {{
-                background-color: {COLOR_TABLE_HEADING_BG} !important;
-                color: {COLOR_SECONDARY_ACCENT};
-                font-weight: bold;
-                font-size: 12px;
-            }}
-        </style>
-    </head>
-    <body>
-        <h1 class="header">Steam Market Portfolio Report</h1>
-        <p style="color: {COLOR_TEXT_DIM};">Date Created: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}</p>
-        <table>
-            <thead>
-                <tr>
-                    <th>ID</th>
-                    <th>Name</th>
-                    <th>Qty</th>
-                    <th>Buy Price ($)</th>
-                    <th>Current Steam Price ($)</th>
-                    <th>Total Cost ($)</th>
-                    <th>Total Steam Value ($)</th>
-                    <th>Profit ($)</th>
-                </tr>
-            </thead>
-            <tbody>
-    """
-    
-    total_buy = 0.0
-    total_now_steam = 0.0
-    
-    for item in rows:
-        _id, market_name, display_name, qty, buy_price, current_price = item
-        
-        qty = qty or 0
-        buy_price = buy_price or 0.0
-        current_price = current_price or 0.0 
-        
-        total_now_steam_pos = current_price * qty
-        total_buy_pos = buy_price * qty
-        profit_steam = total_now_steam_pos - total_buy_pos
-        
-        total_buy += total_buy_pos
-        total_now_steam += total_now_steam_pos
-        
-        profit_class = "profit-good" if profit_steam >= 0 else "profit-bad"
-        
-        html_content += f"""
-                <tr>
-                    <td>{_id}</td>
-                    <td style="text-align: left;">{market_name}</td> 
-                    <td>{qty}</td>
-                    <td>{buy_price:.2f}</td>
-                    <td>{current_price:.2f}</td>
-                    <td>{total_buy_pos:.2f}</td>
-                    <td>{total_now_steam_pos:.2f}</td>
-                    <td class="{profit_class}">{profit_steam:+.2f}</td>
-                </tr>
-        """
-        
-    total_profit = total_now_steam - total_buy
-
-    html_content += f"""
-                <tr class="total-row">
-                    <td colspan="5" style="text-align: right;">TOTAL:</td>
-                    <td>{total_buy:.2f}</td>
-                    <td>{total_now_steam:.2f}</td>
-                    <td class="{'profit-good' if total_profit >= 0 else 'profit-bad'}">{total_profit:+.2f}</td>
-                </tr>
-            </tbody>
-        </table>
-    </body>
-    </html>
-    """
     
     # Save the file
     try:
-        with open(path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+        export_html(path, rows)
             
         messagebox.showinfo("HTML Export", f"Portfolio successfully exported to HTML:\n{path}")
         
@@ -837,13 +799,15 @@ def show_selected_item_chart():
         messagebox.showwarning("Error", "Invalid item ID.")
         return
 
-    # Get data from DB
-    item_data = get_item_by_id(item_id)
-    if not item_data:
+    # Get data from the portfolio model
+    pos = portfolio.get(item_id)
+    if not pos:
         messagebox.showerror("Error", "Data for the selected item not found.")
         return
         
-    market_name, display_name, qty, buy_price, current_price = item_data
+    market_name = pos.market_name
+    buy_price, current_price = fx.convert([pos.buy_price, pos.current_price]).tolist()
+    price_label = f'Price ({fx.display})'
     
     # Prepare data for chart
     labels = ['Buy Price', 'Current Steam Price']
@@ -854,10 +818,18 @@ def show_selected_item_chart():
     # Colors: Buy (magenta), Current (cyan)
     colors = [COLOR_SECONDARY_ACCENT, COLOR_PRIMARY_ACCENT]
     
+    # Long-range price history from the rollups (if any snapshots were taken)
+    resolution, history = get_ohlc(market_name)
+    history = convert_ohlc(history, fx.rate())
+    
     # Matplotlib setup for cyberpunk style
     plt.style.use('dark_background')
     # Use a size that fits the target window
-    fig, ax = plt.subplots(figsize=(6, 5)) 
+    if history:
+        fig, (ax, ax_hist) = plt.subplots(2, 1, figsize=(6, 5), gridspec_kw={'height_ratios': [3, 2]})
+        plot_ohlc(ax_hist, resolution, history, price_label)
+    else:
+        fig, ax = plt.subplots(figsize=(6, 5)) 
     
     # Chart background
     fig.patch.set_facecolor(COLOR_BG_DARK)
@@ -867,7 +839,7 @@ def show_selected_item_chart():
     bars = ax.bar(labels, values, color=colors, alpha=0.8)
 
     # Axis and title settings
-    ax.set_ylabel('Price ($)', color=COLOR_PRIMARY_ACCENT)
+    ax.set_ylabel(price_label, color=COLOR_PRIMARY_ACCENT)
     ax.set_title(f'Price Comparison: {item_name}', color=COLOR_PRIMARY_ACCENT, fontsize=12, wrap=True)
     
     # Axis label colors
@@ -888,7 +860,7 @@ def show_selected_item_chart():
             else:
                 text_color = COLOR_PROFIT_BAD
                 
-        ax.text(bar.get_x() + bar.get_width()/2.0, yval + (max(values)*0.01), f'{yval:.2f}$', 
+        ax.text(bar.get_x() + bar.get_width()/2.0, yval + (max(values)*0.01), f'{yval:.2f}{fx.symbol()}', 
                 ha='center', va='bottom', 
                 color=text_color,
                 fontsize=10,
@@ -914,6 +886,127 @@ def show_selected_item_chart():
 
     fig.tight_layout()
 
+def plot_ohlc(ax, resolution, rows, ylabel):
+    """Draws rollup rows as a close-price line inside a low/high band."""
+    times = [datetime.fromtimestamp(r[0]) for r in rows]
+    highs = [r[2] for r in rows]
+    lows = [r[3] for r in rows]
+    closes = [r[4] for r in rows]
+
+    ax.set_facecolor('#1A2238')
+    ax.fill_between(times, lows, highs, color=COLOR_SECONDARY_ACCENT, alpha=0.25, linewidth=0)
+    ax.plot(times, closes, color=COLOR_PRIMARY_ACCENT, linewidth=1.5, marker='o' if len(rows) < 30 else None, markersize=3)
+
+    ax.set_ylabel(ylabel, color=COLOR_PRIMARY_ACCENT)
+    ax.set_title(f'{resolution.capitalize()} close (band: low-high)', color=COLOR_TEXT_DIM, fontsize=9)
+    ax.tick_params(axis='x', colors=COLOR_TEXT_DIM, labelsize=8)
+    ax.tick_params(axis='y', colors=COLOR_TEXT_DIM)
+    ax.yaxis.grid(True, color=COLOR_INPUT_BG, linestyle='-', linewidth=0.5)
+    ax.figure.autofmt_xdate()
+
+def show_portfolio_value_chart():
+    """Plots total portfolio value over time from the pre-aggregated rollups."""
+    resolution, rows = get_ohlc(PORTFOLIO_SCOPE)
+    if not rows:
+        messagebox.showinfo("Portfolio History", "No snapshots yet. Run \"Update All Steam Prices\" to record one.")
+        return
+
+    plt.style.use('dark_background')
+    fig, ax = plt.subplots(figsize=(7, 5))
+    fig.patch.set_facecolor(COLOR_BG_DARK)
+    plot_ohlc(ax, resolution, convert_ohlc(rows, fx.rate()), f'Portfolio Value ({fx.display})')
+    fig.suptitle('Portfolio Value History', color=COLOR_PRIMARY_ACCENT, fontsize=12)
+
+    chart_window = tk.Toplevel(root)
+    chart_window.title("Portfolio Value History")
+    chart_window.geometry("750x600")
+    chart_window.resizable(False, False)
+    chart_window.configure(bg=COLOR_BG_DARK)
+
+    canvas = FigureCanvasTkAgg(fig, master=chart_window)
+    canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+    fig.tight_layout()
+
+def show_alert_toast(event):
+    """Small always-on-top notification for a fired alert; closes by itself."""
+    toast = tk.Toplevel(root)
+    toast.title("Price Alert")
+    toast.configure(bg=COLOR_BG_DARK)
+    toast.resizable(False, False)
+    try:
+        toast.attributes('-topmost', True)
+    except tk.TclError:
+        pass
+    ttk.Label(toast, text="🔔 PRICE ALERT", font=('Consolas', 11, 'bold'), foreground=COLOR_SECONDARY_ACCENT, background=COLOR_BG_DARK).pack(padx=15, pady=(10, 4))
+    ttk.Label(toast, text=event["message"], wraplength=320, font=('Consolas', 10), foreground=COLOR_PRIMARY_ACCENT, background=COLOR_BG_DARK).pack(padx=15, pady=(0, 10))
+    root.bell()
+    toast.after(ALERT_TOAST_MS, toast.destroy)
+
+def on_alerts():
+    """Alert manager for the selected item: list, add and delete alerts."""
+    sel = tree.selection()
+    if not sel:
+        messagebox.showwarning("Alerts", "Select an item in the table to manage its alerts")
+        return
+    vals = tree.item(sel[0])['values']
+    if not vals or vals[1] == "Totals:":
+        return
+    market_name = str(vals[1])
+
+    win = tk.Toplevel(root)
+    win.title(f"Alerts: {market_name}")
+    win.geometry("480x380")
+    win.resizable(False, False)
+    win.configure(bg=COLOR_BG_DARK)
+
+    frame = ttk.Frame(win, style='TFrame', padding=(15,15,15,15))
+    frame.pack(fill='both', expand=True)
+    ttk.Label(frame, text=market_name, wraplength=440, style='Accent.TLabel').pack(pady=(0, 8))
+
+    listbox = tk.Listbox(frame, height=8, bg=COLOR_TABLE_BG, fg=COLOR_TABLE_TEXT, selectbackground=COLOR_TABLE_SELECT_BG,
+                         selectforeground=COLOR_TABLE_SELECT_TEXT, font=('Consolas', 10), relief='flat')
+    listbox.pack(fill='both', expand=True)
+    alert_ids = []
+
+    def reload():
+        listbox.delete(0, tk.END)
+        alert_ids.clear()
+        for alert_id, kind, threshold, ref_price, active, fired_at, fired_price in get_alerts(market_name):
+            text = describe_alert(kind, threshold, ref_price)
+            if not active:
+                when = datetime.fromtimestamp(fired_at).strftime("%Y-%m-%d %H:%M") if fired_at else "?"
+                text += f"  [fired {when} @ {fired_price or 0:.2f}]"
+            listbox.insert(tk.END, text)
+            alert_ids.append(alert_id)
+
+    form = ttk.Frame(frame, style='TFrame')
+    form.pack(fill='x', pady=(8, 0))
+    kind_var = tk.StringVar(value=ALERT_KINDS["above"])
+    ttk.Combobox(form, textvariable=kind_var, values=list(ALERT_KINDS.values()), state='readonly', width=14).pack(side='left', padx=(0, 6))
+    entry_threshold = ttk.Entry(form, width=10, style='C.TEntry')
+    entry_threshold.pack(side='left', padx=6)
+
+    def add():
+        kind = next(k for k, label in ALERT_KINDS.items() if label == kind_var.get())
+        try:
+            threshold = float(entry_threshold.get().strip().replace(',', '.'))
+            add_alert(market_name, kind, threshold)
+        except ValueError as e:
+            messagebox.showwarning("Alerts", f"Invalid alert: {e}", parent=win)
+            return
+        entry_threshold.delete(0, tk.END)
+        reload()
+
+    def delete():
+        for index in reversed(listbox.curselection()):
+            delete_alert(alert_ids[index])
+        reload()
+
+    ttk.Button(form, text="Add", width=8, style='C.TButton', command=add).pack(side='left', padx=6)
+    ttk.Button(form, text="Delete", width=8, style='C.TButton', command=delete).pack(side='right')
+    reload()
+
 def on_author_info():
     """Displays information about the author."""
     # Create the Author window
@@ -953,7 +1046,14 @@ def on_import():
     if not path:
         return
         
-    imported, updated = import_items_from_csv(path)
+    try:
+        imported, updated = import_items_from_csv(path)
+    except FileNotFoundError:
+        messagebox.showerror("Import Error", "File not found.")
+        return
+    except Exception as e:
+        messagebox.showerror("Import Error", f"An error occurred while reading the file: {e}")
+        return
     
     refresh_table()
     messagebox.showinfo(
@@ -963,22 +1063,80 @@ def on_import():
         f"Existing items updated: {updated}"
     )
 
+def selected_item_ids():
+    """Ids of all selected item rows (the totals row is skipped)."""
+    return [int(iid[len('item_'):]) for iid in tree.selection() if iid.startswith('item_')]
+
 def on_delete():
-    sel = tree.selection()
-    if not sel:
+    item_ids = selected_item_ids()
+    if not item_ids:
         messagebox.showwarning("Delete", "Select a row to delete")
         return
-    vals = tree.item(sel[0])['values']
-    if not vals or vals[1] == "Totals:":
-        return
-    try:
-        item_id = int(vals[0])
-    except ValueError:
-        messagebox.showwarning("Error", "Invalid ID")
+    if len(item_ids) > 1 and not messagebox.askyesno("Delete", f"Delete {len(item_ids)} selected items?"):
         return
-    delete_item(item_id)
+    delete_items(item_ids) # also drops their alerts
     refresh_table()
-    messagebox.showinfo("Deleted", "Item deleted")
+    messagebox.showinfo("Deleted", "Item deleted" if len(item_ids) == 1 else f"{len(item_ids)} items deleted")
+
+def on_refresh_selected():
+    """Queues the selected items at the front of the background updater."""
+    item_ids = selected_item_ids()
+    if not item_ids:
+        messagebox.showwarning("Refresh", "Select the rows to refresh")
+        return
+    items = [(pos.id, pos.market_name) for pos in map(portfolio.get, item_ids) if pos]
+    added = price_updater.enqueue(items, PRIORITY_USER)
+    log_message(f"Queued {added} selected item(s) for price refresh")
+
+def on_edit_selected():
+    """Sets quantity and/or buy price on every selected item at once."""
+    item_ids = selected_item_ids()
+    if not item_ids:
+        messagebox.showwarning("Edit", "Select the rows to edit")
+        return
+
+    win = tk.Toplevel(root)
+    win.title(f"Edit {len(item_ids)} item(s)")
+    win.geometry("380x200")
+    win.resizable(False, False)
+    win.configure(bg=COLOR_BG_DARK)
+
+    frame = ttk.Frame(win, style='TFrame', padding=(15,15,15,15))
+    frame.pack(fill='both', expand=True)
+    ttk.Label(frame, text="Leave a field empty to keep current values.", foreground=COLOR_TEXT_DIM).grid(row=0, column=0, columnspan=2, sticky='w', pady=(0, 8))
+    ttk.Label(frame, text="Quantity:", style='Accent.TLabel').grid(row=1, column=0, sticky='w', pady=2)
+    entry_new_qty = ttk.Entry(frame, width=ENTRY_DATA_WIDTH, style='C.TEntry')
+    entry_new_qty.grid(row=1, column=1, sticky='w', padx=6, pady=2)
+    ttk.Label(frame, text="Buy Price (per unit):", style='Accent.TLabel').grid(row=2, column=0, sticky='w', pady=2)
+    entry_new_buy = ttk.Entry(frame, width=ENTRY_DATA_WIDTH, style='C.TEntry')
+    entry_new_buy.grid(row=2, column=1, sticky='w', padx=6, pady=2)
+
+    def apply():
+        qtxt = entry_new_qty.get().strip()
+        btxt = entry_new_buy.get().strip()
+        try:
+            qty = int(qtxt) if qtxt else None
+        except ValueError:
+            messagebox.showwarning("Error", "Quantity must be an integer", parent=win)
+            return
+        if qty is not None and qty < 0:
+            messagebox.showwarning("Error", "Quantity cannot be negative", parent=win)
+            return
+        buy_price = parse_price_str(btxt) if btxt else None
+        # parse_price_str gives 0.0 for text it cannot read; only an actual zero may set 0
+        if buy_price == 0.0 and re.sub(r'[\s$€£0.,]', '', btxt):
+            messagebox.showwarning("Error", "Buy price must be a number", parent=win)
+            return
+        if qty is None and buy_price is None:
+            win.destroy()
+            return
+
+        changed = bulk_edit_items(item_ids, qty, buy_price) # also re-indexes their profit alerts
+        win.destroy()
+        refresh_table()
+        messagebox.showinfo("Edit", f"Updated {changed} item(s)")
+
+    ttk.Button(frame, text="Apply", width=BUTTON_WIDTH, style='C.TButton', command=apply).grid(row=3, column=0, columnspan=2, pady=(12, 0))
 
 def on_row_double(event):
     sel = tree.selection()
@@ -993,21 +1151,19 @@ def on_row_double(event):
     except ValueError:
         return
 
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("SELECT market_name, display_name, qty, buy_price, current_price FROM items WHERE id=?", (item_id,))
-    r = c.fetchone()
-    conn.close()
-    if not r:
+    pos = portfolio.get(item_id)
+    if not pos:
         return
         
-    mname, dname, qty, buy, cur_steam = r
+    mname, dname, qty = pos.market_name, pos.display_name, pos.qty
+    buy, cur_steam = fx.convert([pos.buy_price, pos.current_price]).tolist()
+    cur = fx.display
     
     # show item details window
     win = tk.Toplevel(root)
     # Используем market_name (mname) для заголовка
     win.title(mname) 
-    win.geometry("400x300") 
+    win.geometry("400x430") 
     win.resizable(False, False) 
     win.configure(bg=COLOR_BG_DARK)
     
@@ -1029,16 +1185,25 @@ def on_row_double(event):
         ttk.Label(info_frame, text=f"CLEAN NAME: {dname}", wraplength=350, font=('Consolas', 9), foreground=COLOR_TEXT_DIM, background=COLOR_BG_DARK).pack(pady=2)
 
     ttk.Label(info_frame, text=f"QUANTITY: {qty}", font=('Consolas', 10), foreground=COLOR_SECONDARY_ACCENT, background=COLOR_BG_DARK).pack(pady=2)
-    ttk.Label(info_frame, text=f"BUY PRICE (per unit AVG): {buy:.2f} USD", font=('Consolas', 10), foreground=COLOR_SECONDARY_ACCENT, background=COLOR_BG_DARK).pack(pady=2)
+    ttk.Label(info_frame, text=f"BUY PRICE (per unit AVG): {buy:.2f} {cur}", font=('Consolas', 10), foreground=COLOR_SECONDARY_ACCENT, background=COLOR_BG_DARK).pack(pady=2)
     
-    ttk.Label(info_frame, text=f"CURRENT STEAM (per unit): {cur_steam:.2f} USD", font=('Consolas', 10), foreground=COLOR_PRIMARY_ACCENT, background=COLOR_BG_DARK).pack(pady=2)
+    ttk.Label(info_frame, text=f"CURRENT STEAM (per unit): {cur_steam:.2f} {cur}", font=('Consolas', 10), foreground=COLOR_PRIMARY_ACCENT, background=COLOR_BG_DARK).pack(pady=2)
 
     profit_val = (cur_steam * qty) - (buy * qty)
-    profit_text = f"TOTAL PROFIT (STEAM): {profit_val:+.2f} USD"
+    profit_text = f"TOTAL PROFIT (STEAM): {profit_val:+.2f} {cur}"
     profit_color = COLOR_PROFIT_GOOD if profit_val >= 0 else COLOR_PROFIT_BAD
     
     ttk.Label(info_frame, text=profit_text, font=('Consolas', 11, 'bold'), foreground=profit_color, background=COLOR_BG_DARK).pack(pady=10)
 
+    # Risk figures from this item's price history
+    item_risk = get_risk_report(mname)["items"].get(mname)
+    if item_risk:
+        ttk.Label(info_frame, text="--- RISK ---", font=('Consolas', 10, 'bold'), foreground=COLOR_PRIMARY_ACCENT, background=COLOR_BG_DARK).pack(pady=(4,2))
+        ttk.Label(info_frame, text=f"VOLATILITY ({risk.ROLLING_WINDOW}d, annualized): {format_pct(item_risk['volatility'])}", font=('Consolas', 9), foreground=COLOR_TEXT_LIGHT, background=COLOR_BG_DARK).pack(pady=1)
+        ttk.Label(info_frame, text=f"MAX DRAWDOWN: {format_pct(item_risk['max_drawdown'], signed=True)}", font=('Consolas', 9), foreground=COLOR_TEXT_LIGHT, background=COLOR_BG_DARK).pack(pady=1)
+        ttk.Label(info_frame, text=f"VaR {risk.VAR_LEVEL:.0%} (1 day): {format_pct(item_risk['var'])}", font=('Consolas', 9), foreground=COLOR_TEXT_LIGHT, background=COLOR_BG_DARK).pack(pady=1)
+        ttk.Label(info_frame, text=f"PORTFOLIO WEIGHT: {format_pct(item_risk['weight'])}", font=('Consolas', 9), foreground=COLOR_TEXT_LIGHT, background=COLOR_BG_DARK).pack(pady=1)
+
 
 # bindings
 btn_fetch.config(command=on_fetch)
@@ -1047,13 +1212,41 @@ btn_update.config(command=on_update_all)
 btn_import.config(command=on_import)      
 btn_export_csv.config(command=on_export_csv) 
 btn_export_html.config(command=on_export_html) 
+btn_import_parquet.config(command=on_import_parquet)
+btn_export_parquet.config(command=on_export_parquet)
+btn_import_inventory.config(command=on_import_inventory)
 btn_show_chart_selected.config(command=show_selected_item_chart) 
+btn_show_chart_portfolio.config(command=show_portfolio_value_chart)
+btn_alerts.config(command=on_alerts)
 btn_author.config(command=on_author_info) 
 btn_delete.config(command=on_delete) 
+btn_refresh_selected.config(command=on_refresh_selected)
+btn_edit_selected.config(command=on_edit_selected)
+btn_retry_failed.config(command=on_retry_failed)
+cmb_repeat.bind("<<ComboboxSelected>>", on_repeat_changed)
+cmb_currency.bind("<<ComboboxSelected>>", on_currency_changed)
 tree.bind("<Double-1>", on_row_double)
+btn_prev_page.config(command=on_prev_page)
+btn_next_page.config(command=on_next_page)
+for c in SORT_COLUMNS:
+    tree.heading(c, command=lambda c=c: on_sort(c))
 
-# initial table population
+# initial table population: paint from the DB right away, freshen stale prices afterwards
+update_heading_labels()
 refresh_table()
+root.after(UPDATER_POLL_MS, poll_price_updater)
+root.after(1000, schedule_stale_refresh)
+
+# Update runs: restore the repeat choice, resume a run cut short by the last exit
+last_job = get_latest_job()
+if last_job and last_job[3] in JOB_REPEAT_CHOICES.values():
+    repeat_var.set(next(label for label, seconds in JOB_REPEAT_CHOICES.items() if seconds == last_job[3]))
+update_job_status_label()
+resumed_jobs = resume_update_jobs()
+if resumed_jobs:
+    log_message(f"Resuming interrupted update run #{resumed_jobs[-1]}")
+    track_update_job(resumed_jobs[-1])
+root.after(JOB_CHECK_MS, schedule_update_jobs)
 
 if __name__ == '__main__':
     root.mainloop()
\ No newline at end of file
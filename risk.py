@@ -0,0 +1,229 @@
+"""
+Risk and volatility analytics over the price history.
+
+Everything works on one (items x days) price matrix so all items, and the
+portfolio built from them, are computed in a single vectorized pass.
+"""
+import numpy as np
+
+DAY = 86400
+# The Steam Market trades every day of the year
+PERIODS_PER_YEAR = 365
+ROLLING_WINDOW = 30
+VAR_LEVEL = 0.95
+
+
+def price_matrix(names, ts, prices, bucket=DAY):
+    """
+    Builds a forward-filled matrix of closing prices.
+
+    names/ts/prices are parallel sequences sorted by (name, ts), as returned by
+    "SELECT market_name, ts, price FROM price_history ORDER BY market_name, ts".
+    Returns (item_names, bucket_starts, matrix) where matrix[i, d] is the last
+    known price of item i at the end of bucket d (NaN before its first sample).
+    """
+    names = np.asarray(names, dtype=object)
+    ts = np.asarray(ts, dtype=np.int64)
+    prices = np.asarray(prices, dtype=np.float64)
+    if ts.size == 0:
+        return np.array([], dtype=object), np.array([], dtype=np.int64), np.empty((0, 0))
+
+    # Sorted input lets items be numbered from name changes instead of a full np.unique sort
+    starts = np.r_[True, names[1:] != names[:-1]]
+    item_idx = np.cumsum(starts) - 1
+    item_names = names[starts]
+    if len(set(item_names)) != len(item_names):
+        item_names, item_idx = np.unique(names, return_inverse=True)
+    return _close_matrix(item_names, item_idx, ts, prices, bucket)
+
+
+def grouped_price_matrix(item_names, counts, ts, prices, bucket=DAY):
+    """
+    price_matrix for history that arrives grouped by item: the first counts[0]
+    rows of ts/prices belong to item_names[0], the next counts[1] to
+    item_names[1], and so on (in any time order), so no per-row names are needed.
+    """
+    ts = np.asarray(ts, dtype=np.int64)
+    prices = np.asarray(prices, dtype=np.float64)
+    if ts.size == 0:
+        return np.array([], dtype=object), np.array([], dtype=np.int64), np.empty((0, 0))
+    item_idx = np.repeat(np.arange(len(counts)), counts)
+    return _close_matrix(np.asarray(item_names, dtype=object), item_idx, ts, prices, bucket)
+
+
+def _close_matrix(item_names, item_idx, ts, prices, bucket):
+    """price_matrix once every row has its item number."""
+    first_bucket = ts.min() // bucket
+    day_idx = ts // bucket - first_bucket
+    n_items, n_days = len(item_names), int(day_idx.max()) + 1
+
+    # With rows in (item, ts) order the last row of every (item, day) run is the close
+    key = item_idx.astype(np.int64) * n_days + day_idx
+    if np.any(key[1:] < key[:-1]) or np.any((key[1:] == key[:-1]) & (ts[1:] < ts[:-1])):
+        order = np.lexsort((ts, key))
+        key, prices = key[order], prices[order]
+    is_close = np.r_[key[1:] != key[:-1], True]
+
+    matrix = np.full(n_items * n_days, np.nan)
+    matrix[key[is_close]] = prices[is_close]
+    matrix = matrix.reshape(n_items, n_days)
+
+    # Forward fill: carry the index of the last observed column along each row
+    observed = ~np.isnan(matrix)
+    last_seen = np.where(observed, np.arange(n_days), 0)
+    np.maximum.accumulate(last_seen, axis=1, out=last_seen)
+    filled = matrix[np.arange(n_items)[:, None], last_seen]
+    filled[np.cumsum(observed, axis=1) == 0] = np.nan
+
+    bucket_starts = (np.arange(n_days) + first_bucket) * bucket
+    return item_names, bucket_starts, filled
+
+
+def simple_returns(matrix):
+    """Period-over-period returns; NaN where either price is missing or zero."""
+    prev, cur = matrix[:, :-1], matrix[:, 1:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = cur / prev - 1.0
+    returns[~np.isfinite(returns)] = np.nan
+    return returns
+
+
+def rolling_volatility(returns, window=ROLLING_WINDOW, periods_per_year=PERIODS_PER_YEAR):
+    """
+    Annualized rolling standard deviation of returns along axis 1, computed
+    from cumulative sums. Windows with fewer than two returns are NaN.
+    """
+    valid = ~np.isnan(returns)
+    r = np.where(valid, returns, 0.0)
+    zero = np.zeros((returns.shape[0], 1))
+    csum = np.concatenate([zero, np.cumsum(r, axis=1)], axis=1)
+    csum2 = np.concatenate([zero, np.cumsum(r * r, axis=1)], axis=1)
+    ccount = np.concatenate([zero, np.cumsum(valid, axis=1)], axis=1)
+
+    lo = np.maximum(np.arange(1, returns.shape[1] + 1) - window, 0)
+    hi = np.arange(1, returns.shape[1] + 1)
+    n = ccount[:, hi] - ccount[:, lo]
+    s = csum[:, hi] - csum[:, lo]
+    s2 = csum2[:, hi] - csum2[:, lo]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        var = (s2 - s * s / n) / (n - 1)
+    var[n < 2] = np.nan
+    return np.sqrt(np.maximum(var, 0.0)) * np.sqrt(periods_per_year)
+
+
+def max_drawdown(matrix):
+    """Largest peak-to-trough fall per row, as a negative fraction (0 = never fell)."""
+    peaks = np.fmax.accumulate(matrix, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdowns = matrix / peaks - 1.0
+    drawdowns[~np.isfinite(drawdowns)] = np.nan
+    result = np.full(matrix.shape[0], np.nan)
+    has_data = ~np.all(np.isnan(drawdowns), axis=1)
+    result[has_data] = np.nanmin(drawdowns[has_data], axis=1)
+    return result
+
+
+def historical_var(returns, level=VAR_LEVEL):
+    """One-period historical Value at Risk per row, as a positive loss fraction."""
+    result = np.full(returns.shape[0], np.nan)
+    counts = np.sum(~np.isnan(returns), axis=1)
+    enough = counts >= 2
+    if enough.any():
+        # np.nanpercentile's linear interpolation from one row-wise sort (NaNs sort last)
+        ordered = np.sort(returns[enough], axis=1)
+        n = counts[enough]
+        pos = (1.0 - level) * (n - 1)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, n - 1)
+        rows = np.arange(len(n))
+        low, high = ordered[rows, lo], ordered[rows, hi]
+        result[enough] = -(low + (high - low) * (pos - lo))
+    return result
+
+
+def herfindahl(values):
+    """Herfindahl-Hirschman concentration of position values (1/n = evenly spread, 1 = one item)."""
+    values = np.asarray(values, dtype=np.float64)
+    total = values.sum()
+    if total <= 0:
+        return np.nan
+    weights = values / total
+    return float(np.sum(weights * weights))
+
+
+def portfolio_returns(matrix, quantities):
+    """
+    Returns of the current holdings over the history. Each period only uses
+    items priced at both ends, so an item entering the history is not a jump.
+    """
+    prev, cur = matrix[:, :-1], matrix[:, 1:]
+    both = ~np.isnan(prev) & ~np.isnan(cur)
+    q = quantities[:, None]
+    start_value = np.where(both, prev, 0.0) * q
+    change = np.where(both, cur - prev, 0.0) * q
+    start_total = start_value.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = change.sum(axis=0) / start_total
+    returns[start_total <= 0] = np.nan
+    return returns
+
+
+def compute_risk(names, ts, prices, positions, window=ROLLING_WINDOW, level=VAR_LEVEL):
+    """
+    Full risk report for every position and for the whole portfolio.
+
+    names/ts/prices are the price history (see price_matrix); positions maps
+    market_name -> (qty, current_price). Returns
+    {"items": {market_name: {"volatility", "max_drawdown", "var", "weight"}},
+     "portfolio": {"volatility", "max_drawdown", "var", "hhi", "effective_n", "days"}}
+    where volatility is the latest annualized rolling volatility, var the
+    one-period historical VaR at `level` and weight the share of current
+    portfolio value. Figures that need more history are NaN.
+    """
+    item_names, _, matrix = price_matrix(names, ts, prices)
+    return risk_report(item_names, matrix, positions, window, level)
+
+
+def risk_report(item_names, matrix, positions, window=ROLLING_WINDOW, level=VAR_LEVEL):
+    """compute_risk over a matrix from price_matrix / grouped_price_matrix."""
+    n_items = len(item_names)
+    qty = np.array([(positions.get(n) or (0, 0))[0] or 0 for n in item_names], dtype=np.float64)
+
+    volatility = np.full(n_items, np.nan)
+    var = np.full(n_items, np.nan)
+    drawdown = np.full(n_items, np.nan)
+    if matrix.shape[1] >= 2:
+        returns = simple_returns(matrix)
+        # Only the latest window is reported
+        volatility = rolling_volatility(returns[:, -window:], window)[:, -1]
+        var = historical_var(returns, level)
+    if matrix.size:
+        drawdown = max_drawdown(matrix)
+
+    # Concentration uses current values of all positions, with or without history
+    position_names = list(positions)
+    values = np.array([(q or 0) * (p or 0) for q, p in positions.values()], dtype=np.float64)
+    total_value = values.sum()
+    weights = values / total_value if total_value > 0 else np.zeros_like(values)
+
+    nan = float("nan")
+    items = {name: {"volatility": nan, "max_drawdown": nan, "var": nan, "weight": float(w)}
+             for name, w in zip(position_names, weights)}
+    for i, name in enumerate(item_names):
+        entry = items.setdefault(name, {"weight": 0.0})
+        entry["volatility"] = float(volatility[i])
+        entry["max_drawdown"] = float(drawdown[i])
+        entry["var"] = float(var[i])
+
+    hhi = herfindahl(values) if values.size else nan
+    portfolio = {"volatility": nan, "max_drawdown": nan, "var": nan, "hhi": hhi,
+                 "effective_n": 1.0 / hhi if hhi > 0 else nan, "days": int(matrix.shape[1])}
+    if matrix.shape[1] >= 2:
+        port_returns = portfolio_returns(matrix, qty)[None, :]
+        growth = np.cumprod(1.0 + np.nan_to_num(port_returns[0]))
+        port_value = np.concatenate([[1.0], growth])[None, :]
+        portfolio["volatility"] = float(rolling_volatility(port_returns, window)[0, -1])
+        portfolio["var"] = float(historical_var(port_returns, level)[0])
+        portfolio["max_drawdown"] = float(max_drawdown(port_value)[0])
+
+    return {"items": items, "portfolio": portfolio}
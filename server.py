@@ -0,0 +1,425 @@
+"""
+Headless HTTP API for the portfolio: python server.py [--port 8765] [--read-only] [--cors-origin ORIGIN]
+
+Serves JSON from the in-memory portfolio model over plain asyncio (no extra
+dependencies). Responses are cached per URL until the data changes and carry
+ETags, so polling dashboards mostly get 304s. Requests never reach Steam.
+Money fields are in core.BASE_CURRENCY unless ?currency=EUR (any cached
+exchange rate) asks for a conversion; the rate table is fetched once per
+core.FX_TTL_SECONDS at most, and only when such a request comes in.
+
+By default the server is also the price-update engine (stale refresh,
+resumed and scheduled Update All runs), exactly like the GUI. With
+--read-only it leaves updates to a GUI running on the same database and
+reloads the model whenever that one commits.
+
+Browsers only let other sites' pages read the API when --cors-origin names
+that site's origin; no Access-Control-Allow-Origin header is sent otherwise.
+
+Endpoints (GET or HEAD):
+    /api/positions?sort=TotalSteam&desc=1&limit=100&offset=0&currency=USD
+    /api/positions/<id>?currency=USD
+    /api/totals?currency=USD
+    /api/history/<market_name>?resolution=raw|hour|day|week&since=<unix time>&currency=USD
+    /api/portfolio/history?resolution=hour|day|week&currency=USD
+    /api/status
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import queue
+import re
+import sqlite3
+import time
+import numpy as np
+from urllib.parse import urlsplit, parse_qsl, unquote
+
+import core
+
+API_HOST = "127.0.0.1"
+API_PORT = 8765
+MAX_PAGE_SIZE = 1000
+# Cached responses live until the data changes, but never longer than this
+CACHE_TTL_SECONDS = 10
+CACHE_MAX_ENTRIES = 1024
+# --read-only: how often to look for commits made by the GUI
+DB_WATCH_SECONDS = 1.0
+MAX_HEADER_BYTES = 16 * 1024
+KEEPALIVE_SECONDS = 30
+
+STATUS_TEXT = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 431: "Request Header Fields Too Large", 500: "Internal Server Error"}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def data_version():
+    """Changes whenever positions, prices, the stored price history or the exchange rates change."""
+    return core.portfolio.version, core.price_writer.flushes, core.fx.version
+
+def int_param(params, name, default, minimum=0, maximum=None):
+    try:
+        value = int(params.get(name, default))
+    except ValueError:
+        raise ApiError(400, f"{name} must be an integer")
+    if value < minimum or (maximum is not None and value > maximum):
+        raise ApiError(400, f"{name} must be between {minimum} and {maximum if maximum is not None else 'any'}")
+    return value
+
+def currency_param(params):
+    """(currency, rate) for ?currency=; refreshes the cached rates first if they expired."""
+    currency = params.get("currency", core.BASE_CURRENCY).upper()
+    try:
+        return currency, core.fx.ensure(currency)
+    except ValueError as e:
+        raise ApiError(400, str(e))
+
+def positions_json(page, rate):
+    """JSON objects for positions, money fields converted by rate in one pass."""
+    return [{
+        "id": pos.id,
+        "market_name": pos.market_name,
+        "display_name": pos.display_name,
+        "qty": pos.qty,
+        "buy_price": buy,
+        "current_price": price,
+        "price_updated_at": pos.price_updated_at,
+        "total_buy": total_buy,
+        "total_value": total_value,
+        "profit": profit,
+    } for pos, (buy, price, total_buy, total_value, profit) in zip(page, core.money_matrix(page, rate).tolist())]
+
+
+# --------------- Endpoints ---------------
+def api_positions(params):
+    """One page of positions; sort takes a table heading (TotalSteam) or a column name (total_value)."""
+    sort = params.get("sort", "ID")
+    order_by = core.SORT_COLUMNS.get(sort, sort)
+    if order_by not in core.SORT_COLUMNS.values():
+        raise ApiError(400, f"Unsupported sort column: {sort}")
+    descending = params.get("desc", "0").lower() in ("1", "true", "yes")
+    limit = int_param(params, "limit", core.PAGE_SIZE, 1, MAX_PAGE_SIZE)
+    offset = int_param(params, "offset", 0)
+    currency, rate = currency_param(params)
+
+    item_count, _, _ = core.portfolio.totals()
+    page = core.get_page_positions(order_by, descending, limit, offset)
+    return {"count": item_count, "offset": offset, "limit": limit, "sort": order_by, "desc": descending,
+            "currency": currency, "items": positions_json(page, rate)}
+
+def api_position(item_id, params):
+    currency, rate = currency_param(params)
+    pos = core.portfolio.get(item_id)
+    if pos is None:
+        raise ApiError(404, f"No item with id {item_id}")
+    return {"currency": currency, **positions_json([pos], rate)[0]}
+
+def api_totals(params):
+    currency, rate = currency_param(params)
+    item_count, total_buy, total_value = core.portfolio.totals()
+    total_buy, total_value = core.fx.convert([total_buy, total_value], currency).tolist()
+    return {"item_count": item_count, "currency": currency, "total_buy": total_buy, "total_value": total_value,
+            "profit": total_value - total_buy}
+
+def ohlc_json(scope, resolution, rate):
+    if resolution is not None and resolution not in core.ROLLUP_RESOLUTIONS:
+        raise ApiError(400, f"resolution must be one of: {', '.join(core.ROLLUP_RESOLUTIONS)}")
+    resolution, rows = core.get_ohlc(scope, resolution)
+    return {"resolution": resolution, "fields": ["bucket_start", "open", "high", "low", "close"],
+            "candles": [list(row) for row in core.convert_ohlc(rows, rate)]}
+
+def api_item_history(market_name, params):
+    """Raw price samples (default) or OHLC candles for one item."""
+    resolution = params.get("resolution", "raw")
+    currency, rate = currency_param(params)
+    if resolution == "raw":
+        points = core.get_price_history(market_name, int_param(params, "since", 0))
+        prices = (np.fromiter((p for _, p in points), dtype=np.float64, count=len(points)) * rate).tolist()
+        payload = {"resolution": "raw", "fields": ["ts", "price"],
+                   "points": [[ts, price] for (ts, _), price in zip(points, prices)]}
+        found = bool(points)
+    else:
+        payload = ohlc_json(market_name, None if resolution == "auto" else resolution, rate)
+        found = bool(payload["candles"])
+    if not found and core.portfolio.get_by_name(market_name) is None:
+        raise ApiError(404, f"Unknown item: {market_name}")
+    return {"market_name": market_name, "currency": currency, **payload}
+
+def api_portfolio_history(params):
+    resolution = params.get("resolution", "auto")
+    currency, rate = currency_param(params)
+    return {"currency": currency,
+            **ohlc_json(core.PORTFOLIO_SCOPE, None if resolution == "auto" else resolution, rate)}
+
+def api_status(params, read_only):
+    """Update engine state: queue sizes, routes and the latest Update All run."""
+    job = core.get_latest_job()
+    update_job = None
+    if job is not None:
+        job_id, status, finished_at, repeat_interval, next_run_at = job
+        update_job = {"id": job_id, "status": status, "finished_at": finished_at,
+                      "repeat_interval": repeat_interval, "next_run_at": next_run_at,
+                      "progress": core.get_job_progress(job_id)}
+    item_count, _, _ = core.portfolio.totals()
+    return {
+        "time": int(time.time()),
+        "mode": "read-only" if read_only else "updating",
+        "items": item_count,
+        "stale_after_seconds": core.STALE_AFTER_SECONDS,
+        "queued": core.price_updater.pending(),
+        "unwritten": core.price_writer.pending(),
+        "routes": {"healthy": core.EGRESS_POOL.healthy_count(), "total": len(core.EGRESS_POOL.routes)},
+        "update_job": update_job,
+    }
+
+def start_scheduled_job():
+    """Starts and queues a due repeating run (see core.start_due_job). Returns its id or None."""
+    job_id = core.start_due_job()
+    if job_id is not None:
+        core.run_update_job(job_id)
+    return job_id
+
+
+class ApiServer:
+    """
+    Minimal HTTP/1.1 server (GET/HEAD, keep-alive) on asyncio streams.
+    Endpoint results are built on worker threads, cached per URL and data
+    version, and a burst of identical requests shares one build.
+    """
+
+    def __init__(self, read_only=False, cors_origin=None):
+        self.read_only = read_only
+        self.cors_origin = cors_origin # browser origin allowed to read responses (None = same-origin only)
+        self._cache = {} # url -> (data version, built at, etag, body)
+        self._building = {} # (url, data version) -> Future of (etag, body)
+        # (pattern, handler(match, params), cacheable)
+        self.routes = [
+            (re.compile(r"/api/positions"), lambda m, q: api_positions(q), True),
+            (re.compile(r"/api/positions/(\d+)"), lambda m, q: api_position(int(m.group(1)), q), True),
+            (re.compile(r"/api/totals"), lambda m, q: api_totals(q), True),
+            (re.compile(r"/api/history/(.+)"), lambda m, q: api_item_history(m.group(1), q), True),
+            (re.compile(r"/api/portfolio/history"), lambda m, q: api_portfolio_history(q), True),
+            (re.compile(r"/api/status"), lambda m, q: api_status(q, self.read_only), False),
+        ]
+
+    async def serve(self, host=API_HOST, port=API_PORT):
+        server = await asyncio.start_server(self.handle_client, host, port, limit=MAX_HEADER_BYTES)
+        mode = "read-only, updates left to the GUI" if self.read_only else "running price updates"
+        core.log_message(f"API server listening on http://{host}:{port} ({mode})")
+        if self.read_only:
+            background = [asyncio.create_task(self.watch_db())]
+        else:
+            background = [asyncio.create_task(self.run_updates())]
+        async with server:
+            try:
+                await server.serve_forever()
+            finally:
+                for task in background:
+                    task.cancel()
+
+    # --- background work ---
+    async def run_updates(self):
+        """
+        The GUI's update loop without the GUI: resume runs, refresh stale prices
+        every STALE_CHECK_MS, start scheduled runs every JOB_CHECK_MS. The
+        database work runs on worker threads so requests are never held up.
+        """
+        loop = asyncio.get_running_loop()
+        resumed = await loop.run_in_executor(None, core.resume_update_jobs)
+        if resumed:
+            core.log_message(f"Resuming interrupted update run #{resumed[-1]}")
+        next_stale_check = next_job_check = 0.0
+        while True:
+            # Nobody shows these here; the model is already up to date
+            for q in (core.price_updater.results, core.alert_engine.events):
+                while True:
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        break
+
+            now = time.monotonic()
+            if now >= next_stale_check:
+                next_stale_check = now + core.STALE_CHECK_MS / 1000
+                stale = await loop.run_in_executor(None, core.get_stale_items)
+                added = core.price_updater.enqueue(stale, core.PRIORITY_STALE)
+                if added:
+                    core.log_message(f"Queued {added} stale item(s) for background refresh")
+            if now >= next_job_check:
+                next_job_check = now + core.JOB_CHECK_MS / 1000
+                job_id = await loop.run_in_executor(None, start_scheduled_job)
+                if job_id is not None:
+                    core.log_message(f"Scheduled update run #{job_id} started")
+            await asyncio.sleep(core.UPDATER_POLL_MS / 1000)
+
+    async def watch_db(self):
+        """--read-only: reload the model whenever another process commits to the database."""
+        loop = asyncio.get_running_loop()
+        conn = sqlite3.connect(core.DB)
+        try:
+            last = conn.execute("PRAGMA data_version").fetchone()[0]
+            while True:
+                await asyncio.sleep(DB_WATCH_SECONDS)
+                current = conn.execute("PRAGMA data_version").fetchone()[0]
+                if current != last:
+                    last = current
+                    await loop.run_in_executor(None, core.portfolio.load)
+        finally:
+            conn.close()
+
+    # --- HTTP ---
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE_SECONDS)
+                except asyncio.LimitOverrunError:
+                    await self._send(writer, 431, *self._error_body(431, "Request headers too large"), keep_alive=False)
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+
+                request_line, *header_lines = head.decode("latin-1").rstrip("\r\n").split("\r\n")
+                parts = request_line.split()
+                if len(parts) != 3:
+                    await self._send(writer, 400, *self._error_body(400, "Malformed request line"), keep_alive=False)
+                    break
+                method, target, version = parts
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+                # No endpoint takes a body; skip one if a client sends it anyway
+                length = headers.get("content-length", "0")
+                if length.isdigit() and int(length):
+                    await reader.readexactly(int(length))
+
+                status, etag, body = await self.respond(method, target)
+                if status == 200 and etag and etag in headers.get("if-none-match", ""):
+                    status, body = 304, b""
+                await self._send(writer, status, etag, body, head_only=method == "HEAD", keep_alive=keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def respond(self, method, target):
+        """Returns (status, etag, body) for one request."""
+        if method not in ("GET", "HEAD"):
+            return (405, *self._error_body(405, "Only GET and HEAD are supported"))
+        url = urlsplit(target)
+        path = unquote(url.path).rstrip("/")
+        params = dict(parse_qsl(url.query))
+        for pattern, handler, cacheable in self.routes:
+            match = pattern.fullmatch(path)
+            if match:
+                break
+        else:
+            return (404, *self._error_body(404, f"No such endpoint: {path}"))
+
+        build = lambda: handler(match, params)
+        try:
+            if cacheable:
+                key = path + "?" + "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+                etag, body = await self._cached(key, build)
+            else:
+                etag, body = await asyncio.get_running_loop().run_in_executor(None, self._render, build)
+        except ApiError as e:
+            return (e.status, *self._error_body(e.status, str(e)))
+        except Exception as e:
+            core.log_message(f"API error on {target}: {e}", "ERROR")
+            return (500, *self._error_body(500, "Internal error"))
+        return 200, etag, body
+
+    async def _cached(self, key, build):
+        version = data_version()
+        entry = self._cache.get(key)
+        if entry and entry[0] == version and time.monotonic() - entry[1] < CACHE_TTL_SECONDS:
+            return entry[2], entry[3]
+
+        # Concurrent misses for the same URL and data wait for a single build
+        pending = self._building.get((key, version))
+        if pending is not None:
+            return await asyncio.shield(pending)
+        loop = asyncio.get_running_loop()
+        pending = loop.create_future()
+        self._building[(key, version)] = pending
+        try:
+            etag, body = await loop.run_in_executor(None, self._render, build)
+        except Exception as e:
+            pending.set_exception(e)
+            pending.exception() # waiters (if any) re-raise it; don't warn when there are none
+            raise
+        finally:
+            del self._building[(key, version)]
+
+        if len(self._cache) >= CACHE_MAX_ENTRIES:
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[key] = (version, time.monotonic(), etag, body)
+        pending.set_result((etag, body))
+        return etag, body
+
+    @staticmethod
+    def _render(build):
+        body = json.dumps(build(), separators=(",", ":")).encode("utf-8")
+        return f'"{hashlib.sha1(body).hexdigest()[:20]}"', body
+
+    @staticmethod
+    def _error_body(status, message):
+        return None, json.dumps({"error": message, "status": status}).encode("utf-8")
+
+    async def _send(self, writer, status, etag, body, head_only=False, keep_alive=True):
+        lines = [
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+            "Content-Type: application/json; charset=utf-8",
+            f"Content-Length: {len(body)}",
+            "Cache-Control: no-cache",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if self.cors_origin:
+            lines.append(f"Access-Control-Allow-Origin: {self.cors_origin}")
+        if etag:
+            lines.append(f"ETag: {etag}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        if not head_only:
+            writer.write(body)
+        await writer.drain()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless JSON API for the Steam portfolio.")
+    parser.add_argument("--host", default=API_HOST, help="address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=API_PORT, help="port to listen on (default: %(default)s)")
+    parser.add_argument("--db", default=core.DB, help="portfolio database (default: %(default)s)")
+    parser.add_argument("--read-only", action="store_true",
+                        help="serve only; leave price updates to a GUI running on the same database")
+    parser.add_argument("--cors-origin", metavar="ORIGIN",
+                        help="let pages from this origin (e.g. http://localhost:3000) read the API; off by default")
+    args = parser.parse_args(argv)
+
+    core.DB = args.db
+    core.init_db()
+    core.portfolio.load()
+    core.alert_engine.load()
+    core.fx.load()
+    try:
+        asyncio.run(ApiServer(read_only=args.read_only, cors_origin=args.cors_origin).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        core.log_message("API server stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Shared fixtures: every test gets its own SQLite database in a temporary
+directory (also the working directory, for the optional JSON/CSV config
+files) and HTTP requests raise unless a test serves them locally.
+"""
+import http.server
+import json
+import os
+import sys
+import threading
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core
+
+_session_request = requests.Session.request
+
+
+def _no_network(self, method, url, *args, **kwargs):
+    if url.startswith(("http://127.0.0.1", "http://localhost")):
+        return _session_request(self, method, url, *args, **kwargs)
+    raise requests.exceptions.ConnectionError(f"Tests must not touch the network: {url}")
+
+
+@pytest.fixture(autouse=True)
+def no_network(monkeypatch):
+    monkeypatch.setattr(requests.Session, "request", _no_network)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh, empty portfolio database; the shared model and alert index are reloaded from it."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(core, "DB", str(tmp_path / "portfolio.db"))
+    core.init_db()
+    core.portfolio.load()
+    core.alert_engine.load()
+    yield core.DB
+    core.price_writer.flush()
+
+
+class StandIn:
+    """
+    Local HTTP server answering every GET with `body` as JSON and `status`;
+    both can be changed while it runs. `paths` records the requested paths.
+    """
+
+    def __init__(self, body, status=200):
+        self.body = body
+        self.status = status
+        self.paths = []
+        stand_in = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                stand_in.paths.append(self.path)
+                payload = json.dumps(stand_in.body).encode()
+                self.send_response(stand_in.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def hits(self):
+        return len(self.paths)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stand_in():
+    """Factory for local stand-in servers: stand_in(body, status=200)."""
+    servers = []
+    yield lambda body, status=200: servers.append(StandIn(body, status)) or servers[-1]
+    for server in servers:
+        server.close()
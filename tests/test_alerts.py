@@ -0,0 +1,36 @@
+"""Alert triggers and their lifetime with the positions they watch."""
+import sqlite3
+
+import core
+
+
+def test_alert_fires_once(db):
+    core.add_or_update_item("Item", "Item", 1, 1.0, 5.0)
+    alert_id = core.add_alert("Item", "above", 6.0)
+    assert core.alert_engine.check("Item", 5.5) == []
+    assert core.alert_engine.check("Item", 6.5) == [alert_id]
+    assert core.alert_engine.check("Item", 7.0) == []
+
+
+def test_deleting_items_deletes_their_alerts(db):
+    core.add_or_update_item("Gone", "Gone", 1, 1.0, 5.0)
+    core.add_or_update_item("Kept", "Kept", 1, 1.0, 5.0)
+    core.add_alert("Gone", "above", 6.0)
+    core.add_alert("Gone", "below", 4.0)
+    kept_id = core.add_alert("Kept", "above", 6.0)
+
+    core.delete_items([core.portfolio.get_by_name("Gone").id])
+
+    assert core.get_alerts("Gone") == []
+    assert core.alert_engine.check("Gone", 100.0) == []
+    assert core.alert_engine.check("Kept", 7.0) == [kept_id]
+
+
+def test_init_db_drops_orphan_alerts(db):
+    conn = sqlite3.connect(db)
+    with conn:
+        conn.execute("INSERT INTO alerts (market_name, kind, threshold) VALUES ('Deleted long ago', 'above', 1.0)")
+    conn.close()
+    core.init_db()
+    core.alert_engine.load()
+    assert core.get_alerts("Deleted long ago") == []
@@ -0,0 +1,66 @@
+"""Multi-row delete and bulk edit: DB rows, the in-memory model and alerts stay in step."""
+import sqlite3
+
+import pytest
+
+import core
+
+
+@pytest.fixture
+def items(db):
+    core.add_or_update_item("A", "A", 2, 10.0, 12.0)
+    core.add_or_update_item("B", "B", 1, 5.0, 4.0)
+    core.add_or_update_item("C", "C", 4, 1.0, 1.5)
+    return {name: core.portfolio.get_by_name(name).id for name in "ABC"}
+
+
+def db_rows(db):
+    conn = sqlite3.connect(db)
+    rows = {name: (qty, buy) for name, qty, buy in conn.execute("SELECT market_name, qty, buy_price FROM items")}
+    conn.close()
+    return rows
+
+
+def test_delete_items(db, items):
+    assert core.portfolio.totals() == (3, 29.0, 34.0)
+    core.delete_items([items["A"], items["C"]])
+
+    assert db_rows(db) == {"B": (1, 5.0)}
+    assert core.portfolio.get(items["A"]) is None
+    assert core.portfolio.get_by_name("C") is None
+    assert [pos.market_name for pos in core.portfolio.positions()] == ["B"]
+    assert core.portfolio.totals() == (1, 5.0, 4.0)
+    # Unknown ids are ignored
+    core.delete_items([items["A"], 999])
+    assert core.portfolio.totals() == (1, 5.0, 4.0)
+
+
+def test_bulk_edit_items(db, items):
+    assert core.bulk_edit_items([items["A"], items["B"]], qty=3) == 2
+    assert core.bulk_edit_items([items["B"], items["C"]], buy_price=2.5) == 2
+    assert core.bulk_edit_items([items["C"]], qty=1, buy_price=0.0) == 1
+    assert core.bulk_edit_items([999], qty=5) == 0
+
+    assert db_rows(db) == {"A": (3, 10.0), "B": (3, 2.5), "C": (1, 0.0)}
+    model = {pos.market_name: (pos.qty, pos.buy_price) for pos in core.portfolio.positions()}
+    assert model == db_rows(db)
+    # 3*10 + 3*2.5 + 0 bought, 3*12 + 3*4 + 1*1.5 worth
+    assert core.portfolio.totals() == (3, 37.5, 49.5)
+
+
+def test_bulk_edit_moves_profit_targets(db, items):
+    # (price - 10) * 2 >= 10  <=>  price >= 15
+    alert_id = core.add_alert("A", "profit", 10.0)
+    untouched = core.add_alert("B", "above", 6.0)
+
+    core.bulk_edit_items([items["A"], items["B"]], buy_price=20.0)
+    # Now (price - 20) * 2 >= 10  <=>  price >= 25, without reloading the whole engine
+    assert core.alert_engine.check("A", 16.0) == []
+    assert core.alert_engine.check("A", 26.0) == [alert_id]
+    assert core.alert_engine.check("B", 7.0) == [untouched]
+
+
+def test_bulk_edit_to_zero_qty_disarms_profit_target(db, items):
+    core.add_alert("C", "profit", 1.0)
+    core.bulk_edit_items([items["C"]], qty=0)
+    assert core.alert_engine.check("C", 1000.0) == []
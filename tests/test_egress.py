@@ -0,0 +1,104 @@
+"""Egress route failover against local stand-in priceoverview servers."""
+import time
+
+import pytest
+
+import core
+
+PRICEOVERVIEW = {"success": True, "lowest_price": "$1.23", "volume": "1,234"}
+
+
+@pytest.fixture
+def stand_ins(stand_in):
+    return lambda status=200: stand_in(PRICEOVERVIEW, status)
+
+
+@pytest.fixture
+def fast_routes(monkeypatch):
+    """No rate limit delay or cooldown waits, so failover runs instantly."""
+    monkeypatch.setattr(core, "ROUTE_COOLDOWN_SECONDS", 0)
+    monkeypatch.setattr(core, "ROUTE_PROBE_SECONDS", 0)
+
+    def use(*servers):
+        pool = core.EgressPool([core.EgressRoute(f"route-{i}", base_url=s.url, delay=0) for i, s in enumerate(servers)])
+        monkeypatch.setattr(core, "EGRESS_POOL", pool)
+        return pool
+    return use
+
+
+def test_failing_route_fails_over(stand_ins, fast_routes):
+    bad, good = stand_ins(status=429), stand_ins()
+    pool = fast_routes(bad, good)
+
+    for _ in range(core.ROUTE_MAX_FAILURES + 2):
+        assert core._request_steam_price("Item")[0] == 1.23
+
+    assert pool.routes[0].disabled
+    assert pool.healthy_count() == 1
+    assert bad.hits >= core.ROUTE_MAX_FAILURES
+
+
+def test_disabled_route_rejoins_after_successful_probe(stand_ins, fast_routes):
+    flaky, good = stand_ins(status=503), stand_ins()
+    pool = fast_routes(flaky, good)
+    for _ in range(core.ROUTE_MAX_FAILURES + 2):
+        core._request_steam_price("Item")
+    assert pool.routes[0].disabled
+
+    flaky.status = 200
+    hits = flaky.hits
+    assert core._request_steam_price("Item") == (1.23, "Item", 1234)
+    assert flaky.hits == hits + 1
+    assert not pool.routes[0].disabled
+    assert pool.healthy_count() == 2
+
+
+def test_last_route_is_never_disabled(stand_ins, fast_routes):
+    only = stand_ins(status=429)
+    pool = fast_routes(only)
+    for _ in range(core.ROUTE_MAX_FAILURES * 2):
+        assert core._request_steam_price("Item")[0] == 0.0
+    assert not pool.routes[0].disabled
+
+    only.status = 200
+    assert core._request_steam_price("Item")[0] == 1.23
+    assert pool.routes[0].failures == 0
+
+
+def test_probe_waits_for_its_interval(stand_ins, fast_routes, monkeypatch):
+    bad, good = stand_ins(status=500), stand_ins()
+    pool = fast_routes(bad, good)
+    for _ in range(core.ROUTE_MAX_FAILURES + 2):
+        core._request_steam_price("Item")
+    assert pool.routes[0].disabled
+
+    # A failed probe books the next one ROUTE_PROBE_SECONDS later; until then only the good route is used
+    monkeypatch.setattr(core, "ROUTE_PROBE_SECONDS", 3600)
+    core._request_steam_price("Item")
+    hits = bad.hits
+    for _ in range(5):
+        assert core._request_steam_price("Item")[0] == 1.23
+    assert bad.hits == hits
+
+
+def test_interactive_caller_is_told_when_to_retry(stand_ins, monkeypatch):
+    only = stand_ins(status=429)
+    pool = core.EgressPool([core.EgressRoute("only", base_url=only.url, delay=0)])
+    monkeypatch.setattr(core, "EGRESS_POOL", pool)
+    assert core._request_steam_price("Item")[0] == 0.0 # rests the route for ROUTE_COOLDOWN_SECONDS
+
+    started = time.monotonic()
+    with pytest.raises(core.RateLimited) as e:
+        core.get_steam_price_and_name("Item", fresh=True, max_wait=0.5)
+    assert time.monotonic() - started < 0.5
+    assert core.ROUTE_COOLDOWN_SECONDS - 5 < e.value.retry_after <= core.ROUTE_COOLDOWN_SECONDS
+    assert only.hits == 1
+
+
+def test_max_wait_covers_the_rate_budget(stand_ins, monkeypatch):
+    server = stand_ins()
+    pool = core.EgressPool([core.EgressRoute("slow", base_url=server.url, delay=30)])
+    monkeypatch.setattr(core, "EGRESS_POOL", pool)
+    assert pool.acquire(max_wait=1) is pool.routes[0] # first slot is free
+    with pytest.raises(core.RateLimited):
+        pool.acquire(max_wait=1)
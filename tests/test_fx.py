@@ -0,0 +1,74 @@
+"""Exchange rates: switching the display currency only reads the cache."""
+import json
+import time
+
+import pytest
+
+import core
+
+
+@pytest.fixture
+def fx(db, monkeypatch):
+    rates = core.FxRates()
+    rates.load()
+    monkeypatch.setattr(core, "fx", rates)
+    return rates
+
+
+@pytest.fixture
+def no_fx_request(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("exchange rates must not be requested here")
+    monkeypatch.setattr(core.requests, "get", fail)
+
+
+def write_rates_file(rates):
+    with open(core.FX_RATES_FILE, "w", encoding="utf-8") as f:
+        json.dump({"rates": rates}, f)
+
+
+def wait_for_refresh(fx, timeout=5):
+    deadline = time.monotonic() + timeout
+    while fx.refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not fx.refreshing
+
+
+def test_set_display_without_cached_rate_raises_without_request(fx, no_fx_request):
+    with pytest.raises(ValueError):
+        fx.set_display("EUR")
+    assert fx.display == core.BASE_CURRENCY
+    assert not fx.refreshing
+    assert not fx.needs_refresh() # nothing cached: no request at startup either
+
+
+def test_background_refresh_then_instant_switch(fx, no_fx_request):
+    write_rates_file({"USD": 1, "EUR": 0.5})
+    fx.refresh_async()
+    wait_for_refresh(fx)
+    assert fx.has("EUR")
+
+    version = fx.version
+    fx.set_display("EUR")
+    assert not fx.refreshing
+    assert fx.version == version + 1
+    assert fx.convert([10.0, 3.0]).tolist() == [5.0, 1.5]
+    assert core.convert_ohlc([(0, 2.0, 4.0, 1.0, 3.0)], fx.rate()) == [(0, 1.0, 2.0, 0.5, 1.5)]
+
+    reloaded = core.FxRates()
+    reloaded.load()
+    assert reloaded.rate("EUR") == 0.5
+
+
+def test_stale_rates_switch_immediately_and_refresh_in_background(fx, no_fx_request):
+    write_rates_file({"EUR": 0.5})
+    assert fx.refresh()
+    fx.fetched_at -= core.FX_TTL_SECONDS + 1
+    assert fx.needs_refresh()
+
+    write_rates_file({"EUR": 0.8})
+    fx.set_display("EUR")
+    assert fx.display == "EUR"
+    wait_for_refresh(fx)
+    assert fx.rate() == 0.8
+    assert not fx.is_stale()
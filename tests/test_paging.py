@@ -0,0 +1,76 @@
+"""Table sorting and paging in SQLite (get_page_ids / get_page_positions)."""
+import sqlite3
+
+import pytest
+
+import core
+
+# market_name, qty, buy_price, current_price -> total_value, profit
+ITEMS = [
+    ("Item C", 2, 5.0, 4.0),    #  8.0, -2.0
+    ("Item A", 1, 1.0, 10.0),   # 10.0, +9.0
+    ("Item E", 4, 2.0, 2.0),    #  8.0,  0.0
+    ("Item B", 10, 0.5, 0.1),   #  1.0, -4.0
+    ("Item D", 3, 1.0, 5.0),    # 15.0, +12.0
+]
+
+
+@pytest.fixture
+def items(db):
+    for name, qty, buy, price in ITEMS:
+        core.add_or_update_item(name, name, qty, buy, price)
+    return {pos.market_name: pos.id for pos in core.portfolio.positions()}
+
+
+def all_pages(order_by, descending, page_size=2):
+    pages = []
+    while True:
+        page = core.get_page_ids(order_by, descending, page_size, len(pages) * page_size)
+        if not page:
+            return pages
+        pages.append(page)
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("order_by, key", [
+    ("market_name", lambda pos: pos.market_name),
+    ("total_value", lambda pos: pos.total_value),
+    ("profit", lambda pos: pos.profit),
+])
+def test_pages_follow_sort_order(items, order_by, key, descending):
+    positions = core.portfolio.positions()
+    # Ties fall back to id in the same direction
+    expected = [pos.id for pos in sorted(positions, key=lambda pos: (key(pos), pos.id), reverse=descending)]
+
+    pages = all_pages(order_by, descending)
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [item_id for page in pages for item_id in page] == expected
+
+
+def test_tie_breaks_on_id(items):
+    # Item C and Item E are both worth 8.0
+    first, second = items["Item C"], items["Item E"]
+    assert core.get_page_ids("total_value", False, 2, 1) == [first, second]
+    assert core.get_page_ids("total_value", True, 2, 2) == [second, first]
+
+
+def test_page_positions_come_from_the_model(items):
+    page = core.get_page_positions("profit", True, 2, 0)
+    assert [pos.market_name for pos in page] == ["Item D", "Item A"]
+    assert page[0] is core.portfolio.get(items["Item D"])
+    assert core.get_page_positions("profit", True, 2, 10) == []
+
+
+def test_generated_columns_sort_from_their_index(db):
+    conn = sqlite3.connect(db)
+    for column in ("total_value", "profit"):
+        plan = " ".join(row[-1] for row in conn.execute(
+            f"EXPLAIN QUERY PLAN SELECT id FROM items ORDER BY {column} DESC, id DESC LIMIT 100"))
+        assert f"idx_items_{column}" in plan
+        assert "TEMP B-TREE" not in plan
+    conn.close()
+
+
+def test_unknown_sort_column_is_rejected(db):
+    with pytest.raises(ValueError):
+        core.get_page_ids("qty; DROP TABLE items")
@@ -0,0 +1,38 @@
+"""Parquet import counts (requires pyarrow)."""
+import pytest
+
+import core
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def write_positions(path, rows):
+    names = ["market_name", "display_name", "qty", "buy_price", "current_price"]
+    table = pa.Table.from_pylist([dict(zip(names, r)) for r in rows], schema=core.parquet_positions_schema())
+    pq.write_table(table, path)
+
+
+def test_import_counts_duplicates_and_skipped_rows(db, tmp_path):
+    core.add_or_update_item("Existing", "Existing", 1, 1.0, 1.0)
+    path = str(tmp_path / "positions.parquet")
+    write_positions(path, [
+        ("Existing", "Existing", 5, 2.0, 3.0),
+        ("New", "New", 1, 1.0, 1.0),
+        ("New", "New", 2, 1.0, 1.0),
+        (None, "no name", 1, 1.0, 1.0),
+        ("  ", "blank", 1, 1.0, 1.0),
+    ])
+
+    assert core.import_positions_parquet(path) == (1, 2, 2)
+    assert core.portfolio.totals()[0] == 2
+    assert core.portfolio.get_by_name("New").qty == 2
+    assert core.portfolio.get_by_name("Existing").qty == 5
+
+
+def test_export_import_round_trip(db, tmp_path):
+    core.add_or_update_item("A", "A", 2, 1.5, 2.0)
+    core.add_or_update_item("B", "B", 3, 4.0, 5.0)
+    path = str(tmp_path / "positions.parquet")
+    assert core.export_positions_parquet(path) == 2
+    assert core.import_positions_parquet(path) == (0, 2, 0)
@@ -0,0 +1,72 @@
+"""PortfolioModel: incremental totals and id order stay in line with the items table."""
+import math
+import random
+import sqlite3
+
+import core
+
+
+def add_items(count, seed=1):
+    rng = random.Random(seed)
+    for i in range(count):
+        name = f"Item {i:04d}"
+        core.add_or_update_item(name, name, rng.randint(1, 20), round(rng.uniform(0.03, 900), 2),
+                                round(rng.uniform(0.03, 900), 2))
+
+
+def sql_totals(db):
+    conn = sqlite3.connect(db)
+    row = conn.execute("SELECT COUNT(*), SUM(total_buy), SUM(total_value) FROM items").fetchone()
+    conn.close()
+    return row
+
+
+def test_totals_match_sql_sum(db):
+    add_items(50)
+    count, total_buy, total_value = core.portfolio.totals()
+    sql_count, sql_buy, sql_value = sql_totals(db)
+    assert count == sql_count
+    assert math.isclose(total_buy, sql_buy, abs_tol=1e-6)
+    assert math.isclose(total_value, sql_value, abs_tol=1e-6)
+
+
+def test_totals_do_not_drift(db):
+    add_items(50)
+    model = core.portfolio
+    start = model.totals()
+    original = {p.id: p.current_price for p in model.positions()}
+
+    rng = random.Random(2)
+    ids = list(original)
+    for _ in range(20_000):
+        model.set_price(rng.choice(ids), rng.uniform(0.01, 1e5) / 3, "x")
+    assert math.isclose(model.total_value, math.fsum(p.total_value for p in model.positions()), abs_tol=1e-4)
+
+    for item_id, price in original.items():
+        model.set_price(item_id, price, "x")
+    assert model.totals() == start
+
+
+def test_positions_stay_in_id_order(db):
+    add_items(30)
+    ids = [p.id for p in core.portfolio.positions()]
+    assert ids == sorted(ids)
+
+    core.delete_items(ids[5:10])
+    core.add_or_update_item("Late", "Late", 1, 1.0, 1.0)
+    core.bulk_edit_items(ids[:3], qty=7)
+
+    positions = core.portfolio.positions()
+    assert [p.id for p in positions] == sorted(p.id for p in positions)
+    assert len(positions) == 26
+    assert [p.qty for p in positions[:3]] == [7, 7, 7]
+    assert core.portfolio.totals()[0] == sql_totals(db)[0]
+    assert math.isclose(core.portfolio.total_buy, sql_totals(db)[1], abs_tol=1e-6)
+
+
+def test_positions_is_a_snapshot(db):
+    add_items(3)
+    positions = core.portfolio.positions()
+    core.delete_items([positions[0].id])
+    assert len(positions) == 3
+    assert len(core.portfolio.positions()) == 2
@@ -0,0 +1,75 @@
+"""Price source backends, their quote caches and the aggregator."""
+import core
+
+
+def test_listing_source_skips_unconverted_listings(stand_in):
+    server = stand_in({"success": True, "total_count": 3, "listinginfo": {
+        "1": {"converted_price": 200, "converted_fee": 30},
+        "2": {"price": 50, "fee": 7}, # seller currency only
+        "3": {"converted_price": 180, "converted_fee": 27},
+    }})
+    source = core.SteamListingSource(base_url=server.url, delay=0, cache_ttl=0)
+    assert source.fetch("Item") == core.Quote("steam_listings", 2.07, 3, None)
+
+    server.body = {"success": True, "total_count": 1, "listinginfo": {"1": {"price": 50, "fee": 7}}}
+    assert source.fetch("Item") is None
+
+
+def test_file_feed_volumes_weight_vwap(tmp_path):
+    feed = tmp_path / "prices.csv"
+    feed.write_text('market_name,price,volume\nItem,"$10.00","1,234"\n', encoding="utf-8")
+    other = tmp_path / "other.json"
+    other.write_text('{"Item": {"price": 20.0, "volume": "1,234"}}', encoding="utf-8")
+
+    sources = [core.FileFeedSource("a", str(feed)), core.FileFeedSource("b", str(other))]
+    quotes = [s.fetch("Item") for s in sources]
+    assert [q.volume for q in quotes] == [1234, 1234]
+    assert core.PriceAggregator(sources, "vwap").combine(quotes) == 15.0
+
+
+def test_parse_volume():
+    assert core.parse_volume("1,234") == 1234
+    assert core.parse_volume("1 234 567") == 1234567
+    assert core.parse_volume(None) == 0
+    assert core.parse_volume(45) == 45
+
+
+class CountingSource(core.PriceSource):
+    def __init__(self, **kwargs):
+        super().__init__("counting", **kwargs)
+        self.calls = 0
+
+    def quote(self, market_name):
+        self.calls += 1
+        return core.Quote(self.name, float(self.calls), 0, None)
+
+
+def test_cache_is_bounded_and_expires(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(core.time, "monotonic", lambda: clock[0])
+    source = CountingSource(cache_ttl=60, cache_size=3)
+
+    for name in "abcde":
+        source.fetch(name)
+    assert list(source._cache) == ["c", "d", "e"]
+
+    clock[0] += 61
+    source.fetch("f")
+    assert list(source._cache) == ["f"]
+
+
+def test_fresh_fetch_bypasses_the_cache():
+    source = CountingSource(cache_ttl=60)
+    assert source.fetch("a").price == 1.0
+    assert source.fetch("a").price == 1.0
+    assert source.fetch("a", fresh=True).price == 2.0
+    # The fresh quote replaces the cached one
+    assert source.fetch("a").price == 2.0
+
+
+def test_explicit_fetch_skips_cached_quotes(monkeypatch):
+    source = CountingSource(cache_ttl=60)
+    monkeypatch.setattr(core, "PRICE_SOURCES", core.PriceAggregator([source]))
+    assert core.get_steam_price_and_name("Item")[0] == 1.0
+    assert core.get_steam_price_and_name("Item")[0] == 1.0
+    assert core.get_steam_price_and_name("Item", fresh=True)[0] == 2.0
@@ -0,0 +1,108 @@
+"""Risk analytics (risk.py) against hand-computed figures, and the history loader feeding them."""
+import math
+import sqlite3
+
+import numpy as np
+import pytest
+
+import core
+import risk
+
+DAY = risk.DAY
+T0 = 20_000 * DAY # a UTC midnight
+
+
+def history(name, prices, t0=T0):
+    """One sample per day at noon."""
+    return [(name, t0 + d * DAY + DAY // 2, p) for d, p in enumerate(prices)]
+
+
+def test_price_matrix_takes_the_daily_close_and_forward_fills():
+    rows = [("a", T0 + 100, 1.0), ("a", T0 + 200, 2.0), ("a", T0 + 2 * DAY, 3.0), ("b", T0 + DAY, 5.0)]
+    names, buckets, matrix = risk.price_matrix(*zip(*rows))
+    assert list(names) == ["a", "b"]
+    assert list(buckets) == [T0, T0 + DAY, T0 + 2 * DAY]
+    np.testing.assert_array_equal(matrix, [[2.0, 2.0, 3.0], [np.nan, 5.0, 5.0]])
+
+    # The grouped form gives the same matrix, even with samples out of time order
+    grouped = risk.grouped_price_matrix(["a", "b"], [3, 1], [T0 + 2 * DAY, T0 + 200, T0 + 100, T0 + DAY],
+                                        [3.0, 2.0, 1.0, 5.0])
+    np.testing.assert_array_equal(grouped[2], matrix)
+
+
+def test_volatility_is_annualized_sample_std():
+    # Returns +10%, -10%, +10%: mean 1/30, sample variance 0.04/3
+    returns = risk.simple_returns(np.array([[100.0, 110.0, 99.0, 108.9]]))
+    np.testing.assert_allclose(returns, [[0.1, -0.1, 0.1]])
+    expected = math.sqrt(0.04 / 3) * math.sqrt(365)
+    assert risk.rolling_volatility(returns, window=30)[0, -1] == pytest.approx(expected)
+    # A 2-return window only sees the last two
+    assert risk.rolling_volatility(returns, window=2)[0, -1] == pytest.approx(math.sqrt(0.02) * math.sqrt(365))
+
+
+def test_max_drawdown_is_the_worst_fall_from_a_peak():
+    matrix = np.array([[100.0, 120.0, 90.0, 130.0, 110.0], [5.0, 6.0, 7.0, 8.0, 9.0]])
+    np.testing.assert_allclose(risk.max_drawdown(matrix), [-0.25, 0.0])
+
+
+def test_historical_var_interpolates_the_loss_percentile():
+    returns = np.array([[0.2, -0.2, 0.0, 0.1, -0.1], [0.1, np.nan, np.nan, np.nan, np.nan]])
+    var = risk.historical_var(returns, level=0.95)
+    # 5th percentile of 5 sorted returns: index 0.2 between -0.2 and -0.1
+    assert var[0] == pytest.approx(0.18)
+    assert math.isnan(var[1]) # a single return is not enough
+    expected = -np.nanpercentile(returns[:1], 5, axis=1)
+    np.testing.assert_allclose(var[:1], expected)
+
+
+def test_herfindahl_concentration():
+    assert risk.herfindahl([50.0, 30.0, 20.0]) == pytest.approx(0.38)
+    assert risk.herfindahl([10.0, 10.0, 10.0, 10.0]) == pytest.approx(0.25)
+    assert math.isnan(risk.herfindahl([0.0, 0.0]))
+
+
+def test_compute_risk_report():
+    rows = history("a", [100.0, 80.0, 72.0, 72.0, 79.2, 95.04]) + history("b", [10.0, 10.0, 10.0, 10.0, 10.0, 10.0])
+    positions = {"a": (1, 95.04), "b": (0, 10.0), "c": (3, 1.0)}
+    report = risk.compute_risk(*zip(*rows), positions)
+
+    a = report["items"]["a"]
+    # Returns of a: -0.2, -0.1, 0, 0.1, 0.2
+    assert a["var"] == pytest.approx(0.18)
+    assert a["max_drawdown"] == pytest.approx(-0.28)
+    assert a["volatility"] == pytest.approx(math.sqrt(0.1 / 4) * math.sqrt(365))
+    assert a["weight"] == pytest.approx(95.04 / 98.04)
+    assert report["items"]["b"]["volatility"] == 0.0
+    assert math.isnan(report["items"]["c"]["volatility"]) # no history
+
+    port = report["portfolio"]
+    assert port["days"] == 6
+    assert port["hhi"] == pytest.approx((95.04 / 98.04) ** 2 + (3 / 98.04) ** 2)
+    # Only a is held among the items with history, so the portfolio follows it
+    assert port["var"] == pytest.approx(a["var"])
+    assert port["max_drawdown"] == pytest.approx(a["max_drawdown"])
+
+
+def test_risk_report_from_the_database(db):
+    core.add_or_update_item("a", "a", 1, 90.0, 95.04)
+    core.add_or_update_item("b", "b", 2, 1.0, 1.0 / 3)
+    rows = history("a", [100.0, 80.0, 72.0, 72.0, 79.2, 95.04]) + history("b", [1.0 / 3] * 3)
+    conn = sqlite3.connect(db)
+    with conn:
+        conn.execute("DELETE FROM price_history")
+        conn.executemany("INSERT INTO price_history (market_name, ts, price) VALUES (?, ?, ?)", rows)
+    conn.close()
+
+    names, counts, ts, prices = core.load_history_columns()
+    assert names == ["a", "b"] and list(counts) == [6, 3]
+    assert list(ts[:2]) == [rows[0][1], rows[1][1]]
+    assert prices[-1] == pytest.approx(1.0 / 3, abs=1e-6) # integer micros in transit
+
+    positions = {p.market_name: (p.qty, p.current_price) for p in core.portfolio.positions()}
+    expected = risk.compute_risk(*zip(*rows), positions)
+    report = core.get_risk_report()
+    assert report["items"]["a"] == pytest.approx(expected["items"]["a"])
+    assert report["portfolio"]["var"] == pytest.approx(expected["portfolio"]["var"])
+
+    assert set(core.get_risk_report("b")["items"]) == {"a", "b"}
+    assert core.load_history_columns("missing")[0] == []
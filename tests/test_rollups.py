@@ -0,0 +1,45 @@
+"""Portfolio snapshots, OHLC rollups and their retention."""
+import core
+
+DAY = 86400
+
+
+def test_snapshot_folds_into_every_resolution(db):
+    core.add_or_update_item("Item", "Item", 2, 1.0, 5.0)
+    ts = 1_700_000_000
+    core.record_portfolio_snapshot(ts)
+    core.portfolio.set_price(core.portfolio.get_by_name("Item").id, 7.0, "Item")
+    core.record_portfolio_snapshot(ts + 60)
+
+    for resolution in core.ROLLUP_RESOLUTIONS:
+        _, rows = core.get_ohlc(core.PORTFOLIO_SCOPE, resolution)
+        assert [r[1:] for r in rows] == [(10.0, 14.0, 10.0, 14.0)]
+
+
+def test_expired_rollup_rows_are_pruned(db):
+    core.add_or_update_item("Item", "Item", 1, 1.0, 5.0)
+    now = 1_700_000_000
+    old = now - core.ROLLUP_RETENTION["hour"] - 2 * DAY
+    core.record_portfolio_snapshot(old)
+    core.record_portfolio_snapshot(now)
+
+    _, hourly = core.get_ohlc("Item", "hour")
+    _, daily = core.get_ohlc("Item", "day")
+    assert [r[0] for r in hourly] == [core.bucket_start(now, "hour")]
+    assert [r[0] for r in daily] == [core.bucket_start(old, "day"), core.bucket_start(now, "day")]
+
+
+def test_auto_resolution_uses_the_full_history(db):
+    core.add_or_update_item("Item", "Item", 1, 1.0, 5.0)
+    now = 1_700_000_000
+    core.record_portfolio_snapshot(now - 400 * DAY)
+    core.record_portfolio_snapshot(now)
+    # Hourly rows of the old sample are gone, but the span still needs daily candles
+    assert core.get_ohlc("Item")[0] == "day"
+
+
+def test_update_snapshots_are_rate_limited(db):
+    core.add_or_update_item("Item", "Item", 1, 1.0, 5.0)
+    assert core.snapshot_after_update(0)
+    assert not core.snapshot_after_update(3600)
+    assert core.snapshot_after_update(0)
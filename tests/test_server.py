@@ -0,0 +1,121 @@
+"""The JSON API (server.py) over real HTTP on a local port, against the temp database."""
+import asyncio
+import json
+import threading
+
+import pytest
+import requests
+
+import core
+import server
+
+
+class Api:
+    """An ApiServer listening on 127.0.0.1 with its event loop on a background thread."""
+
+    def __init__(self, **kwargs):
+        self.server = server.ApiServer(**kwargs)
+        self.loop = asyncio.new_event_loop()
+        self._listener = self.loop.run_until_complete(
+            asyncio.start_server(self.server.handle_client, "127.0.0.1", 0))
+        self.url = f"http://127.0.0.1:{self._listener.sockets[0].getsockname()[1]}"
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+
+    def get(self, path, **kwargs):
+        return requests.get(self.url + path, timeout=5, **kwargs)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(5)
+        self._listener.close()
+        # Connections still open (keep-alive) are cancelled and allowed to finish
+        tasks = asyncio.all_tasks(self.loop)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            self.loop.run_until_complete(asyncio.wait(tasks))
+        self.loop.run_until_complete(self._listener.wait_closed())
+        self.loop.close()
+
+
+@pytest.fixture
+def api(db, monkeypatch):
+    monkeypatch.setattr(core, "fx", core.FxRates())
+    with open(core.FX_RATES_FILE, "w", encoding="utf-8") as f:
+        json.dump({"rates": {"EUR": 0.5}}, f)
+    assert core.fx.refresh()
+    for name, qty, buy, price in [("Item A", 1, 1.0, 10.0), ("Item B", 2, 5.0, 4.0), ("Item C", 4, 2.0, 2.25)]:
+        core.add_or_update_item(name, name, qty, buy, price)
+    api = Api()
+    yield api
+    api.close()
+
+
+def test_routing(api):
+    item_id = core.portfolio.get_by_name("Item B").id
+    r = api.get(f"/api/positions/{item_id}/")
+    assert r.status_code == 200
+    assert (r.json()["market_name"], r.json()["total_value"]) == ("Item B", 8.0)
+    assert api.get("/api/totals").json() == {"item_count": 3, "currency": "USD", "total_buy": 19.0,
+                                             "total_value": 27.0, "profit": 8.0}
+    assert api.get("/api/history/Item A").json()["points"][0][1] == 10.0
+    assert api.get("/api/status").json()["items"] == 3
+
+    assert api.get("/api/nothing").status_code == 404
+    assert api.get("/api/positions/999").status_code == 404
+    assert api.get("/api/history/Unknown").status_code == 404
+    assert api.get("/api/positions?sort=qty;DROP").status_code == 400
+    assert requests.post(api.url + "/api/totals", timeout=5).status_code == 405
+    r = api.get("/api/positions?limit=abc")
+    assert (r.status_code, r.json()["error"]) == (400, "limit must be an integer")
+
+
+def test_etag_and_304(api):
+    first = api.get("/api/totals")
+    etag = first.headers["ETag"]
+    again = api.get("/api/totals", headers={"If-None-Match": etag})
+    assert (again.status_code, again.content) == (304, b"")
+    assert again.headers["ETag"] == etag
+
+    # A data change gives a new body and a new ETag
+    core.add_or_update_item("Item D", "Item D", 1, 1.0, 1.0)
+    changed = api.get("/api/totals", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()["item_count"] == 4
+
+
+def test_currency_param(api):
+    r = api.get("/api/totals?currency=eur")
+    assert r.json() == {"item_count": 3, "currency": "EUR", "total_buy": 9.5, "total_value": 13.5, "profit": 4.0}
+    item = api.get("/api/positions?sort=Name&limit=1&currency=EUR").json()["items"][0]
+    assert (item["buy_price"], item["current_price"], item["qty"]) == (0.5, 5.0, 1)
+    # Different currencies are cached apart
+    assert api.get("/api/totals").json()["currency"] == "USD"
+
+    r = api.get("/api/totals?currency=XYZ")
+    assert r.status_code == 400
+    assert r.json() == {"error": "No exchange rate for XYZ", "status": 400}
+
+
+def test_pagination(api):
+    def names(query):
+        body = api.get("/api/positions?" + query).json()
+        assert body["count"] == 3
+        return [item["market_name"] for item in body["items"]]
+
+    assert names("sort=TotalSteam&desc=1&limit=2") == ["Item A", "Item C"]
+    assert names("sort=TotalSteam&desc=1&limit=2&offset=2") == ["Item B"]
+    assert names("sort=profit&limit=2&offset=3") == []
+    assert api.get(f"/api/positions?limit={server.MAX_PAGE_SIZE + 1}").status_code == 400
+    assert api.get("/api/positions?offset=-1").status_code == 400
+
+
+def test_cors_header_is_opt_in(db):
+    for kwargs, expected in [({}, None), ({"cors_origin": "http://localhost:3000"}, "http://localhost:3000")]:
+        api = Api(**kwargs)
+        try:
+            assert api.get("/api/status").headers.get("Access-Control-Allow-Origin") == expected
+        finally:
+            api.close()
@@ -0,0 +1,94 @@
+"""Concurrent price requests for the same item share one upstream call."""
+import threading
+import time
+
+import pytest
+
+import core
+
+
+class BlockingSource:
+    """Stands in for PRICE_SOURCES: every call blocks until `release` is set."""
+
+    def __init__(self):
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def price_and_name(self, market_name, fresh=False, max_wait=None):
+        self.calls.append((market_name, fresh))
+        self.started.set()
+        assert self.release.wait(5)
+        return 1.25, market_name
+
+
+def run_concurrently(source, calls):
+    """Starts the first call, lets the others join it, then releases the source."""
+    results = [None] * len(calls)
+
+    def call(i, name, fresh):
+        results[i] = core.get_steam_price_and_name(name, fresh=fresh)
+
+    threads = [threading.Thread(target=call, args=(i, *args)) for i, args in enumerate(calls)]
+    threads[0].start()
+    assert source.started.wait(5)
+    for t in threads[1:]:
+        t.start()
+    time.sleep(0.2) # followers reach the in-flight call
+    source.release.set()
+    for t in threads:
+        t.join(5)
+    return results
+
+
+@pytest.fixture
+def source(monkeypatch):
+    source = BlockingSource()
+    monkeypatch.setattr(core, "PRICE_SOURCES", source)
+    return source
+
+
+def test_concurrent_callers_share_one_request(source):
+    # A manual fetch (fresh=True) joins the background refresh of the same item
+    results = run_concurrently(source, [("Item", False), ("Item", True), ("Item", False), ("Item", True)])
+    assert source.calls == [("Item", False)]
+    assert results == [(1.25, "Item")] * 4
+
+
+def test_different_items_are_not_coalesced(source):
+    source.release.set()
+    core.get_steam_price_and_name("A")
+    core.get_steam_price_and_name("B", fresh=True)
+    assert source.calls == [("A", False), ("B", True)]
+
+
+def test_followers_get_the_leaders_error():
+    flight = core.SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fail():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        raise RuntimeError("HTTP 500")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do(("k",), fail)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    threads[0].start()
+    assert started.wait(5)
+    for t in threads[1:]:
+        t.start()
+    time.sleep(0.2)
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert calls == [1]
+    assert errors == ["HTTP 500"] * 3
@@ -0,0 +1,74 @@
+"""Stale refresh order (never fetched, then by staleness period, most valuable first) and failure backoff."""
+import sqlite3
+import time
+
+import core
+
+
+def test_stale_items_order(db):
+    now = int(time.time())
+    max_age = 3600
+    rows = [
+        # name, qty, price, updated_at
+        ("fresh", 1, 100.0, now - 60),
+        ("cheap 1h", 1, 1.0, now - max_age - 30),
+        ("rich 1h", 1, 50.0, now - max_age - 600),
+        ("rich 3h", 1, 40.0, now - 3 * max_age - 10),
+        ("cheap 3h", 1, 2.0, now - 3 * max_age - 1200),
+        ("never", 1, 0.0, None),
+    ]
+    conn = sqlite3.connect(db)
+    with conn:
+        conn.executemany("""
+            INSERT INTO items (market_name, display_name, qty, buy_price, current_price, price_updated_at)
+            VALUES (?, ?, ?, 1.0, ?, ?)
+        """, [(name, name, qty, price, ts) for name, qty, price, ts in rows])
+    conn.close()
+
+    names = [name for _, name in core.get_stale_items(max_age)]
+    assert names == ["never", "rich 3h", "cheap 3h", "rich 1h", "cheap 1h"]
+
+
+def run_updater(items, priority=core.PRIORITY_STALE):
+    """Queues items and waits until each result (written or failed) is reported, then flushes."""
+    while not core.price_updater.results.empty(): # left over from other tests
+        core.price_updater.results.get_nowait()
+    core.price_updater.enqueue(items, priority)
+    for _ in items:
+        core.price_updater.results.get(timeout=5)
+    core.price_writer.flush()
+
+
+def backoff(db, name):
+    conn = sqlite3.connect(db)
+    row = conn.execute("SELECT price_failures, price_retry_at - ? FROM items WHERE market_name=?",
+                       (int(time.time()), name)).fetchone()
+    conn.close()
+    return row
+
+
+def test_failed_fetches_back_off_from_stale_refresh(db, monkeypatch):
+    prices = {"listed": (2.5, "listed")}
+    monkeypatch.setattr(core, "get_steam_price_and_name", lambda name: prices.get(name, (0.0, name)))
+    for name in ("listed", "delisted"):
+        core.add_or_update_item(name, name, 1, 1.0, 0.0)
+
+    run_updater(core.get_stale_items())
+    assert [name for _, name in core.get_stale_items()] == []
+    failures, retry_in = backoff(db, "delisted")
+    assert failures == 1 and abs(retry_in - core.PRICE_RETRY_BASE_SECONDS) <= 2
+
+    # Once the backoff ends the item is tried again; a repeat failure doubles the wait
+    conn = sqlite3.connect(db)
+    with conn:
+        conn.execute("UPDATE items SET price_retry_at=? WHERE market_name='delisted'", (int(time.time()) - 1,))
+    conn.close()
+    assert [name for _, name in core.get_stale_items()] == ["delisted"]
+    run_updater(core.get_stale_items())
+    failures, retry_in = backoff(db, "delisted")
+    assert failures == 2 and abs(retry_in - 2 * core.PRICE_RETRY_BASE_SECONDS) <= 2
+
+    # A successful fetch (e.g. from Update All) clears the backoff
+    prices["delisted"] = (1.0, "delisted")
+    run_updater([(core.portfolio.get_by_name("delisted").id, "delisted")], core.PRIORITY_USER)
+    assert backoff(db, "delisted") == (0, None)
@@ -0,0 +1,90 @@
+"""Storage and CSV round trips of core.py (the code main.py used to hold)."""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import core
+
+
+def test_core_imports_without_tkinter():
+    code = "import sys, core; assert 'tkinter' not in sys.modules, 'core imported tkinter'"
+    subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(core.__file__)), check=True)
+
+
+def test_add_or_update_item_averages_buy_price(db):
+    core.add_or_update_item("AK-47 | Redline (Field-Tested)", "AK-47 | Redline", 2, 10.0, 12.0)
+    core.add_or_update_item("AK-47 | Redline (Field-Tested)", "AK-47 | Redline", 2, 20.0, 13.0)
+
+    pos = core.portfolio.get_by_name("AK-47 | Redline (Field-Tested)")
+    assert (pos.qty, pos.buy_price, pos.current_price) == (4, 15.0, 13.0)
+    assert core.get_price_history(pos.market_name)[-1][1] == 13.0
+
+
+def test_csv_export_import_round_trip(db, tmp_path):
+    core.add_or_update_item("Item A", "A", 3, 1.5, 2.25)
+    core.add_or_update_item("Item B", "B", 1, 100.0, 80.0)
+    path = tmp_path / "export.csv"
+    assert core.export_csv(str(path)) == 2
+
+    core.bulk_edit_items([core.portfolio.get_by_name("Item A").id], qty=9)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("Item C,C,5,0.10,0.20\nbroken row\n")
+    assert core.import_items_from_csv(str(path)) == (1, 2)
+    assert core.portfolio.get_by_name("Item A").qty == 3
+    assert core.portfolio.get_by_name("Item C").buy_price == 0.10
+    assert core.portfolio.totals()[0] == 3
+
+
+def test_csv_import_errors_propagate(db, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        core.import_items_from_csv(str(tmp_path / "missing.csv"))
+
+
+def inventory_asset(assetid, classid, amount=1):
+    return {"appid": 730, "contextid": "2", "assetid": assetid, "classid": classid, "instanceid": "0",
+            "amount": str(amount)}
+
+
+def inventory_description(classid, name, marketable=1, appid=730):
+    return {"appid": appid, "classid": classid, "instanceid": "0", "marketable": marketable,
+            "market_hash_name": name, "name": name.split(" (")[0]}
+
+
+def test_import_steam_inventory(db, tmp_path, monkeypatch):
+    core.add_or_update_item("Chroma Case", "Chroma Case", 1, 0.5, 1.0) # fresh price, qty gets replaced
+    alert_id = core.add_alert("Chroma Case", "profit", 1.0)
+    inventory = {
+        "assets": [
+            inventory_asset("1", "10"), inventory_asset("2", "10"), inventory_asset("3", "10"), # duplicates
+            inventory_asset("4", "20", amount=4),
+            inventory_asset("5", "30"), # non-marketable
+            inventory_asset("6", "40"), # another game
+        ],
+        "descriptions": [
+            inventory_description("10", "AK-47 | Redline (Field-Tested)"),
+            inventory_description("20", "Chroma Case"),
+            inventory_description("30", "Service Medal", marketable=0),
+            inventory_description("40", "Dota Item", appid=570),
+        ],
+    }
+    path = tmp_path / "inventory.json"
+    path.write_text(json.dumps(inventory), encoding="utf-8")
+
+    imported, updated, skipped, names = core.import_steam_inventory(str(path))
+    assert (imported, updated, skipped) == (1, 1, 2)
+
+    # The model is in step without a reload, and so is the profit target: 0.5 + 1.0 / 4
+    ak = core.portfolio.get_by_name("AK-47 | Redline (Field-Tested)")
+    assert (ak.display_name, ak.qty, ak.buy_price, ak.price_updated_at) == ("AK-47 | Redline", 3, 0.0, None)
+    assert core.portfolio.get_by_name("Chroma Case").qty == 4
+    assert core.portfolio.get_by_name("Service Medal") is None
+    assert core.alert_engine.check("Chroma Case", 0.8) == [alert_id]
+
+    enqueued = []
+    monkeypatch.setattr(core.price_updater, "enqueue", lambda items, priority: enqueued.extend(items) or len(items))
+    # Only the unpriced name is queued, once, however often it is listed
+    assert core.queue_unpriced(names + names) == 1
+    assert enqueued == [(ak.id, ak.market_name)]
@@ -0,0 +1,93 @@
+"""Update All runs: per-item checkpoints, retries, resuming and repeat scheduling."""
+import json
+import time
+
+import pytest
+
+import core
+
+
+def make_items(*names):
+    for name in names:
+        core.add_or_update_item(name, name, 1, 1.0, 0.0)
+    return [(core.portfolio.get_by_name(name).id, name) for name in names]
+
+
+def test_failed_items_retry_until_attempts_run_out(db):
+    (a_id, _), (b_id, _) = items = make_items("A", "B")
+    job_id = core.create_update_job(items)
+
+    assert core.record_job_result(job_id, a_id, True) == "done"
+    for _ in range(core.JOB_MAX_ATTEMPTS - 1):
+        assert core.record_job_result(job_id, b_id, False, "HTTP 429") == "retry"
+        assert not core.finish_job_if_complete(job_id)
+    assert core.record_job_result(job_id, b_id, False, "HTTP 429") == "failed"
+
+    assert core.finish_job_if_complete(job_id)
+    assert core.get_job_progress(job_id) == {"done": 1, "failed": 1}
+    assert core.get_latest_job()[1] == "done"
+
+
+def test_retry_failed_reopens_only_failed_items(db):
+    (a_id, _), (b_id, b_name) = items = make_items("A", "B")
+    job_id = core.create_update_job(items)
+    core.record_job_result(job_id, a_id, True)
+    for _ in range(core.JOB_MAX_ATTEMPTS):
+        core.record_job_result(job_id, b_id, False, "timeout")
+    core.finish_job_if_complete(job_id)
+
+    assert core.retry_failed_items(job_id) == 1
+    assert core.get_running_jobs() == [job_id]
+    assert core.get_job_items(job_id) == [(b_id, b_name)]
+    assert core.retry_failed_items(job_id) == 0
+
+
+def test_interrupted_run_resumes_with_remaining_items(db, monkeypatch):
+    (a_id, _), (b_id, b_name), (c_id, c_name) = items = make_items("A", "B", "C")
+    job_id = core.create_update_job(items)
+    core.record_job_result(job_id, a_id, True)
+    core.record_job_result(job_id, b_id, False, "timeout")
+
+    queued = []
+    monkeypatch.setattr(core.price_updater, "enqueue",
+                        lambda items, priority, job_id=None: queued.append((list(items), job_id)))
+    assert core.resume_update_jobs() == [job_id]
+    assert queued == [([(b_id, b_name), (c_id, c_name)], job_id)]
+
+
+def test_repeating_run_starts_when_due(db, monkeypatch):
+    items = make_items("A")
+    job_id = core.create_update_job(items, repeat_interval=3600)
+    core.record_job_result(job_id, items[0][0], True)
+    assert core.finish_job_if_complete(job_id)
+    next_run_at = core.get_latest_job()[4]
+
+    # Not due yet: the portfolio is not walked
+    with monkeypatch.context() as m:
+        m.setattr(core.portfolio, "positions", lambda: pytest.fail("positions() read before a run was due"))
+        assert core.start_due_job(next_run_at - 1) is None
+    new_job = core.start_due_job(next_run_at)
+    assert new_job is not None and new_job != job_id
+    assert core.get_latest_job()[3] == 3600
+    # The schedule moved to the new run; nothing else is due while it runs
+    assert core.start_due_job(next_run_at + 7200) is None
+
+
+def test_background_run_end_to_end(db, monkeypatch, tmp_path):
+    feed = tmp_path / "prices.json"
+    feed.write_text(json.dumps({"Priced": 2.5}), encoding="utf-8")
+    monkeypatch.setattr(core, "PRICE_SOURCES", core.PriceAggregator([core.FileFeedSource(path=str(feed))]))
+    monkeypatch.setattr(core, "price_updater", core.PriceUpdater())
+
+    items = make_items("Priced", "Missing")
+    job_id = core.create_update_job(items)
+    assert core.run_update_job(job_id) == 2
+
+    deadline = time.monotonic() + 10
+    while core.get_latest_job()[1] != "done" and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert core.get_job_progress(job_id) == {"done": 1, "failed": 1}
+    assert core.portfolio.get_by_name("Priced").current_price == 2.5
+    assert core.get_price_history("Priced")[-1][1] == 2.5
+    assert core.get_ohlc(core.PORTFOLIO_SCOPE, "hour")[1], "finishing the run records a snapshot"